@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+缓存后端基准
+启动进程内的 Redis 协议替身服务器（scripts/redis_standin.py），对比 file / redis 后端的读写与批量读取延迟。
+正确性（读写、TTL、批量读取、按前缀失效、多副本共享命名空间）由 tests/test_cache_redis.py 覆盖。
+
+    python3 scripts/bench_cache.py --entries 500
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from cache_backends import FileCacheBackend, RedisCacheBackend
+from utils import W2FileCache
+from redis_standin import RedisStandIn
+
+
+def bench(label, backend, entries, payload):
+    W2FileCache.set_backend(backend)
+    W2FileCache.reset_stats()
+    keys = [f'qweather_daily_bench{i}_30d' for i in range(entries)]
+
+    started = time.perf_counter()
+    for key in keys:
+        W2FileCache.set_cache(key, payload, 300)
+    write_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for key in keys:
+        W2FileCache.get_cache(key)
+    read_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    W2FileCache.get_many(keys)
+    batch_s = time.perf_counter() - started
+
+    print(f"{label:<8} write {write_s * 1e6 / entries:8.1f}us/key  "
+          f"read {read_s * 1e6 / entries:8.1f}us/key  get_many {batch_s * 1e6 / entries:8.1f}us/key")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='缓存后端基准')
+    parser.add_argument('--entries', type=int, default=500)
+    args = parser.parse_args()
+
+    payload = {'code': '200', 'daily': [{'fxDate': '2024-01-01', 'tempMax': '10', 'tempMin': '1'}] * 30}
+
+    bench('file', FileCacheBackend(tempfile.mkdtemp()), args.entries, payload)
+
+    server = RedisStandIn()
+    url = server.start()
+    bench('redis', RedisCacheBackend(url), args.entries, payload)
+
+    print(f"📊 redis 替身服务器共处理 {server.commands} 条命令")
+    W2FileCache.set_backend(None)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+CalDAV 客户端基准
+对比“下载全部日程后本地过滤”与“服务端 <C:time-range> 过滤”的传输字节数与耗时，
+以及默认开启的增量同步（CALDAV_INCREMENTAL_SYNC）首次同步与日程修改后的同步。
+
+    python3 scripts/bench_caldav.py --events 1000 --calendars 3
+"""
+
+import os
+import sys
+import time
+import tempfile
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from caldav_standin import StandInCalDAVServer, generate_calendar
+from clients.google_caldav_client import GoogleCalDAVClient
+from utils import W2FileCache
+
+
+def run(server, label, window, prepare=None, client=None):
+    """Fetch the window once; a client passed in is reused (and left open) across runs"""
+    owned = client is None
+    if owned:
+        client = GoogleCalDAVClient('bench', 'bench', server.url, incremental_sync=False)
+    if prepare:
+        prepare(client)
+    client.discover_calendars()
+    server.reset_counters()
+    started = time.perf_counter()
+    events = client.get_all_events(*window)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {len(events):>6} 个日程  {server.bytes_sent / 1024:>10.1f} KiB  "
+          f"{server.requests:>3} 次请求  {elapsed * 1000:>8.1f} ms")
+    if owned:
+        client.close()
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CalDAV 时间范围过滤基准')
+    parser.add_argument('--events', type=int, default=1000, help='每个日历的日程数')
+    parser.add_argument('--calendars', type=int, default=3, help='日历数')
+    args = parser.parse_args()
+
+    calendars = [generate_calendar(f'cal{i}', args.events) for i in range(args.calendars)]
+    now = datetime.now()
+    window = ((now - timedelta(hours=2)).strftime('%Y-%m-%d %H:%M:%S'),
+              (now + timedelta(days=2)).strftime('%Y-%m-%d %H:%M:%S'))
+    print(f"📅 {args.calendars} 个日历 × {args.events} 个日程，窗口 {window[0]} ~ {window[1]}")
+
+    server = StandInCalDAVServer(calendars).start()
+
+    def disable_time_range(client):
+        client.time_range_supported = False
+
+    before = run(server, '下载全部 + 本地过滤', window, disable_time_range)
+    after = run(server, '服务端 time-range 过滤', window)
+
+    fallback_server = StandInCalDAVServer(calendars, support_time_range=False).start()
+    fallback = run(fallback_server, '服务端拒绝 → 本地过滤回退', window)
+
+    # The default path: the sync engine keeps a local copy in the cache
+    W2FileCache.CACHE_PATH = tempfile.mkdtemp(prefix='bench_caldav_')
+    incremental = GoogleCalDAVClient('bench', 'bench', server.url)
+    first = run(server, '增量同步：首次', window, client=incremental)
+    for calendar in calendars:
+        calendar.touch(10)
+    touched = run(server, '增量同步：修改 10 个日程后', window, client=incremental)
+    incremental.close()
+
+    results = [[e['UID'] for e in events] for events in (before, after, fallback, first, touched)]
+    same = all(uids == results[0] for uids in results)
+    print("✅ 各方式结果一致" if same else "❌ 结果不一致")
+    server.shutdown()
+    fallback_server.shutdown()
+    sys.exit(0 if same else 1)
+
+
+if __name__ == '__main__':
+    main()
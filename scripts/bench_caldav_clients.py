@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+CalDAV 客户端基准
+在独立进程中启动 CalDAV 替身服务器（可配置延迟），按日历规模测量客户端各种拉取方式的
+耗时、传输字节数、请求数与 iCalendar 解析耗时:
+
+- 服务端 time-range 过滤的全量查询
+- 下载全部 + 本地过滤
+- 增量同步：首次（带 time-range 的 ETag 列表 + multiget）、无变化、修改 10 个日程后
+
+    python3 scripts/bench_caldav_clients.py
+    python3 scripts/bench_caldav_clients.py --events 10 1000 100000 --latency 0.03
+"""
+
+import os
+import sys
+import time
+import tempfile
+import argparse
+import multiprocessing
+from datetime import datetime, timedelta
+from urllib.parse import urljoin
+
+import requests
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from caldav_standin import StandInCalDAVServer, generate_calendar
+import utils
+from clients.google_caldav_client import GoogleCalDAVClient
+
+
+def serve(count, calendars, latency, queue):
+    """Child process, so server CPU and memory stay out of the client's numbers"""
+    server = StandInCalDAVServer([generate_calendar(f'cal{i}', count) for i in range(calendars)], latency=latency)
+    queue.put(server.url)
+    server.serve_forever()
+
+
+class Harness:
+    def __init__(self, url: str, window):
+        self.url = url
+        self.window = window
+        self.session = requests.Session()
+
+    def control(self, method: str, path: str, **params):
+        response = self.session.request(method, urljoin(self.url, f'/_standin/{path}'), params=params, timeout=30)
+        response.raise_for_status()
+        return response.json()
+
+    def client(self, incremental: bool) -> GoogleCalDAVClient:
+        client = GoogleCalDAVClient('bench', 'bench', self.url, incremental_sync=incremental)
+        # Time spent turning calendar-data into events, separate from network and XML
+        client.parse_seconds = 0.0
+        parse = client._parse_ical
+
+        def timed_parse(data):
+            started = time.perf_counter()
+            try:
+                return parse(data)
+            finally:
+                client.parse_seconds += time.perf_counter() - started
+
+        client._parse_ical = timed_parse
+        return client
+
+    def run(self, label: str, client: GoogleCalDAVClient):
+        client.discover_calendars()
+        self.control('POST', 'reset')
+        client.parse_seconds = 0.0
+        started = time.perf_counter()
+        events = client.get_all_events(*self.window)
+        elapsed = time.perf_counter() - started
+        stats = self.control('GET', 'stats')
+        print(f"  {label:<24} {elapsed * 1000:>9.1f}ms {stats['bytes_sent'] / 1024:>11.1f}KiB "
+              f"{stats['requests']:>6} {client.parse_seconds * 1000:>9.1f}ms {len(events):>6}")
+        return events
+
+
+def bench(count: int, calendars: int, latency: float, window) -> bool:
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve, args=(count, calendars, latency, queue), daemon=True)
+    process.start()
+    harness = Harness(queue.get(), window)
+    utils.W2FileCache.CACHE_PATH = tempfile.mkdtemp(prefix='bench_caldav_')
+
+    print(f"\n📅 {calendars} 个日历 × {count} 个日程，延迟 {latency * 1000:.0f}ms")
+    print(f"  {'方式':<22} {'耗时':>11} {'传输':>14} {'请求数':>5} {'解析':>11} {'日程':>6}")
+    try:
+        full = harness.client(False)
+        ranged = harness.run('服务端 time-range 过滤', full)
+        full.time_range_supported = False
+        local = harness.run('下载全部 + 本地过滤', full)
+        full.close()
+
+        incremental = harness.client(True)
+        first = harness.run('增量：首次同步', incremental)
+        unchanged = harness.run('增量：无变化', incremental)
+        for i in range(calendars):
+            harness.control('POST', 'touch', calendar=f'cal{i}', count=10)
+        touched = harness.run('增量：修改 10 个日程后', incremental)
+        incremental.close()
+    finally:
+        process.terminate()
+
+    uids = [[e['UID'] for e in events] for events in (ranged, local, first, unchanged, touched)]
+    return all(u == uids[0] for u in uids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CalDAV 客户端拉取基准（替身服务器）')
+    parser.add_argument('--events', type=int, nargs='+', default=[10, 1000, 100000], help='每个日历的日程数')
+    parser.add_argument('--calendars', type=int, default=1, help='日历数')
+    parser.add_argument('--latency', type=float, default=0.02, help='替身服务器每个请求的延迟（秒）')
+    args = parser.parse_args()
+
+    now = datetime.now()
+    window = ((now - timedelta(hours=2)).strftime('%Y-%m-%d %H:%M:%S'),
+              (now + timedelta(days=2)).strftime('%Y-%m-%d %H:%M:%S'))
+    print(f"窗口 {window[0]} ~ {window[1]}")
+
+    ok = True
+    for count in args.events:
+        ok = bench(count, args.calendars, args.latency, window) and ok
+    print("\n✅ 各方式结果一致" if ok else "\n❌ 结果不一致")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
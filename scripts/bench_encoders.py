@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+输出格式基准
+对同一张已二值化的日历 / 天气走势图，比较各编码器（encoders.ENCODERS）的输出大小与编码耗时。
+
+    python3 scripts/bench_encoders.py
+    python3 scripts/bench_encoders.py --kind weather_chart --rounds 200
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import encoders
+from render_farm import RENDERERS
+from bench_render_farm import fixture_job
+
+
+def main():
+    parser = argparse.ArgumentParser(description='输出格式大小与编码耗时基准')
+    parser.add_argument('--kind', choices=['calendar', 'weather_chart'], default='calendar')
+    parser.add_argument('--rounds', type=int, default=100, help='每种格式的编码次数')
+    args = parser.parse_args()
+
+    image = RENDERERS[args.kind](fixture_job(args.kind))
+    print(f"🖼️ {args.kind} {image.width}x{image.height}，每种格式编码 {args.rounds} 次")
+    print(f"{'格式':<10} {'大小(字节)':>10} {'中位数(ms)':>11} {'p95(ms)':>9}")
+
+    for name, encoder in encoders.ENCODERS.items():
+        encoder.encode(image)  # plugin import and first-call setup out of the timings
+        timings = []
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            data = encoder.encode(image)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f"{name:<10} {len(data):>10} {statistics.median(timings):>11.3f} {p95:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+CalDAV 响应解析内存基准
+对比“整体读入 + ET.fromstring”与流式 XMLPullParser 解析在不同日历规模下的峰值内存。
+
+    python3 scripts/bench_multistatus.py --events 1000 10000 50000
+"""
+
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+import multiprocessing
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+from urllib.parse import urljoin
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from caldav_standin import StandInCalDAVServer, generate_calendar
+from clients.caldav_core import NAMESPACES
+from clients.caldav_utils import filter_events_by_window
+from clients.google_caldav_client import GoogleCalDAVClient
+
+
+QUERY = b'''<?xml version="1.0" encoding="utf-8"?>
+<C:calendar-query xmlns:D="DAV:" xmlns:C="urn:ietf:params:xml:ns:caldav">
+  <D:prop><D:getetag/><C:calendar-data/></D:prop>
+  <C:filter><C:comp-filter name="VCALENDAR"><C:comp-filter name="VEVENT"/></C:comp-filter></C:filter>
+</C:calendar-query>'''
+
+
+def buffered(client, href, window):
+    """The previous approach: whole body as a string, then a full tree"""
+    response = client.session.request('REPORT', urljoin(client.base_url + '/', href), data=QUERY,
+                                      headers={'Depth': '1'}, timeout=client.timeout)
+    root = ET.fromstring(response.text)
+    events = []
+    for item in root.findall('.//d:response', NAMESPACES):
+        data = item.find('.//c:calendar-data', NAMESPACES)
+        if data is not None and data.text:
+            events.extend(filter_events_by_window(client._parse_ical(data.text), *window))
+    return events
+
+
+def streamed(client, href, window):
+    return client.get_events(href, *window)
+
+
+def serve(count, queue):
+    """Run the stand-in in a child process so its response buffers are not measured"""
+    server = StandInCalDAVServer([generate_calendar('big', count)])
+    queue.put(server.url)
+    server.serve_forever()
+
+
+def measure(func, *args):
+    """(result, peak traced bytes, seconds); timed in a separate untraced run"""
+    started = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    result = func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CalDAV multistatus 解析内存基准')
+    parser.add_argument('--events', type=int, nargs='+', default=[1000, 10000, 50000], help='日历日程数')
+    args = parser.parse_args()
+
+    now = datetime.now()
+    window = ((now - timedelta(hours=2)).strftime('%Y-%m-%d %H:%M:%S'),
+              (now + timedelta(days=2)).strftime('%Y-%m-%d %H:%M:%S'))
+    print(f"{'日程数':>8} {'整体解析峰值':>14} {'流式解析峰值':>14} {'整体耗时':>10} {'流式耗时':>10}")
+
+    ok = True
+    for count in args.events:
+        queue = multiprocessing.Queue()
+        server = multiprocessing.Process(target=serve, args=(count, queue), daemon=True)
+        server.start()
+        client = GoogleCalDAVClient('bench', 'bench', queue.get(), incremental_sync=False)
+        # Force a full download so response size grows with the calendar
+        client.time_range_supported = False
+        href = client.discover_calendars()[0]['href']
+
+        before, before_peak, before_time = measure(buffered, client, href, window)
+        after, after_peak, after_time = measure(streamed, client, href, window)
+        ok = ok and [e['UID'] for e in before] == [e['UID'] for e in after]
+        print(f"{count:>8} {before_peak / 1024 / 1024:>12.1f}MB {after_peak / 1024 / 1024:>12.1f}MB "
+              f"{before_time * 1000:>8.0f}ms {after_time * 1000:>8.0f}ms")
+        client.close()
+        server.terminate()
+
+    print("✅ 两种解析结果一致" if ok else "❌ 结果不一致")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+设备推送基准
+在本地启动一个模拟 Dot API（每次请求固定延迟），对比逐台串行推送（每台新建连接、重复 base64 编码）
+与 push_service 的并发推送（编码一次、复用连接池、有界并发）推送 N 台设备的总耗时。
+
+    python3 scripts/bench_push.py --devices 20 --latency 0.2
+    python3 scripts/bench_push.py --devices 50 --concurrency 4 8 16
+"""
+
+import os
+import sys
+import time
+import base64
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import push_service
+
+
+def start_fake_api(latency: float) -> ThreadingHTTPServer:
+    """Dot API stand-in answering every POST with 200 after latency seconds"""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(latency)
+            body = b'{"code": 200}'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def sequential_push(url: str, devices, image: bytes) -> int:
+    """The previous implementation: one fresh requests.post per device, re-encoding the image each time"""
+    import requests
+
+    ok = 0
+    for device in devices:
+        payload = {'deviceId': device, 'image': base64.b64encode(image).decode('utf-8'), 'refreshNow': True,
+                   'border': 0, 'ditherType': 'NONE', 'link': 'https://dot.mindreset.tech'}
+        response = requests.post(url, json=payload, headers={'Authorization': 'Bearer bench'}, timeout=30)
+        ok += response.status_code == 200
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='设备推送串行与并发耗时对比')
+    parser.add_argument('--devices', type=int, default=20, help='设备数')
+    parser.add_argument('--latency', type=float, default=0.2, help='模拟 Dot API 每次请求的延迟（秒）')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[4, 8, 16], help='并发推送数')
+    args = parser.parse_args()
+
+    server = start_fake_api(args.latency)
+    url = f'http://127.0.0.1:{server.server_port}/api/open/image'
+    push_service.DOT_IMAGE_API = url
+    devices = [f'device-{i:03d}' for i in range(args.devices)]
+    image = os.urandom(5624)  # a 296x152 1-bit frame's worth of bytes
+
+    print(f"📡 {args.devices} 台设备，模拟延迟 {args.latency * 1000:.0f} ms")
+    print(f"{'方式':<16} {'总耗时(s)':>10} {'成功':>6}")
+    started = time.perf_counter()
+    ok = sequential_push(url, devices, image)
+    print(f"{'串行':<16} {time.perf_counter() - started:>10.2f} {ok:>6}")
+
+    for workers in args.concurrency:
+        started = time.perf_counter()
+        results = push_service.push(devices, 'bench', image, max_workers=workers)
+        elapsed = time.perf_counter() - started
+        print(f"{f'并发 x{workers}':<16} {elapsed:>10.2f} {sum(r.ok for r in results):>6}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
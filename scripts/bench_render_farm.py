@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+渲染进程池基准
+用固定的天气预报与待办数据，对比单线程、多线程与不同进程数的渲染进程池的吞吐（张/秒），
+验证渲染吞吐随核数近线性增长（线程受 GIL 限制不会）。
+
+    python3 scripts/bench_render_farm.py --jobs 40
+    python3 scripts/bench_render_farm.py --processes 1 2 4 8 --kind weather_chart
+"""
+
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from render_farm import RenderFarm, RenderJob, render_png
+
+
+def fixture_job(kind: str) -> RenderJob:
+    """30 days of forecast and a full todolist, the heaviest layout"""
+    today = datetime.now()
+    icons = ['100', '101', '104', '305', '306', '400']
+    daily = [{
+        'fxDate': (today + timedelta(days=i)).strftime('%Y-%m-%d'),
+        'tempMax': str(20 + i % 7), 'tempMin': str(10 + i % 5),
+        'iconDay': icons[i % len(icons)], 'textDay': '小雨' if i % 6 == 3 else '晴',
+        'iconNight': icons[(i + 2) % len(icons)], 'textNight': '多云',
+    } for i in range(30)]
+    if kind == 'weather_chart':
+        return RenderJob('weather_chart', [dict(day, isHistorical=False, isEstimate=False, source='基准')
+                                           for day in daily[:15]])
+    todolist = ['09:30 项目周会(会议室 3)', '14:00 需求评审', '', '全天 团建', '10:00 面试']
+    return RenderJob('calendar', {'code': '200', 'daily': daily}, todolist)
+
+
+def throughput(label: str, jobs: int, run) -> float:
+    started = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - started
+    rate = jobs / elapsed
+    print(f"{label:<16} {elapsed:>8.2f}s {rate:>9.1f} 张/秒")
+    return rate
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description='渲染进程池吞吐基准')
+    parser.add_argument('--jobs', type=int, default=40, help='每轮渲染的图片数')
+    parser.add_argument('--processes', type=int, nargs='+',
+                        default=sorted({1, 2, 4, cores} & set(range(1, cores + 1))) or [1], help='进程池大小')
+    parser.add_argument('--kind', choices=['calendar', 'weather_chart'], default='calendar')
+    args = parser.parse_args()
+
+    job = fixture_job(args.kind)
+    print(f"🖼️ {args.kind} × {args.jobs}，本机 {cores} 核")
+    # Imports and font loading out of the baseline, as the farm workers do in their initializer
+    render_png(job)
+    baseline = throughput('单线程', args.jobs, lambda: [render_png(job) for _ in range(args.jobs)])
+
+    threads = max(args.processes)
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        rate = throughput(f'{threads} 线程', args.jobs, lambda: list(executor.map(render_png, [job] * args.jobs)))
+    print(f"{'':<16} 加速比 {rate / baseline:.2f}x")
+
+    for processes in args.processes:
+        farm = RenderFarm(processes)
+        farm.warm_up()
+        rate = throughput(f'{processes} 进程', args.jobs,
+                          lambda: [f.result() for f in [farm.submit(job) for _ in range(args.jobs)]])
+        print(f"{'':<16} 加速比 {rate / baseline:.2f}x（理想 {min(processes, cores)}x）")
+        farm.shutdown()
+
+
+if __name__ == '__main__':
+    main()
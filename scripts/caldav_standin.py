@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+进程内 CalDAV 替身服务器
+用于在没有真实钉钉 / iCloud / Google 账户的情况下测试和基准测试 CalDAV 客户端。
+
+支持:
+- PROPFIND (日历发现，含 ctag)
+- REPORT calendar-query (可选 <C:time-range> 过滤)
+- REPORT calendar-multiget
+- REPORT sync-collection (RFC 6578，含失效 sync-token 的 403 响应)
+- 可配置的单次请求延迟，以及 /_standin/ 下的统计、清零与修改日程接口
+
+单独运行:
+
+    python3 scripts/caldav_standin.py --events 1000 --calendars 2 --latency 0.05 --port 8808
+"""
+
+import re
+import json
+import time
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.sax.saxutils import escape, unescape
+
+
+ICS_TEMPLATE = """BEGIN:VCALENDAR\r
+VERSION:2.0\r
+PRODID:-//dot_calendar//standin//EN\r
+BEGIN:VEVENT\r
+UID:{uid}\r
+DTSTAMP:20240101T000000Z\r
+DTSTART:{start}\r
+DTEND:{end}\r
+SUMMARY:{summary}\r
+LOCATION:会议室 {index}\r
+DESCRIPTION:Generated event {index} for CalDAV client benchmarks\r
+END:VEVENT\r
+END:VCALENDAR\r
+"""
+
+SYNC_TOKEN_PREFIX = 'http://standin.invalid/sync/'
+
+
+class StandInCalendar:
+    """A calendar collection holding one VEVENT per resource"""
+
+    def __init__(self, name: str, displayname: str):
+        self.name = name
+        self.displayname = displayname
+        self.resources: Dict[str, Dict] = {}
+        self.ctag = 0
+        # resource name -> revision of its last change / deletion, for sync-collection
+        self.changed: Dict[str, int] = {}
+        self.deleted: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    @property
+    def sync_token(self) -> str:
+        return f'{SYNC_TOKEN_PREFIX}{self.name}/{self.ctag}'
+
+    def put_event(self, uid: str, start: datetime, summary: str, index: int = 0,
+                  duration: timedelta = timedelta(hours=1)) -> None:
+        start_utc = start.astimezone(timezone.utc)
+        self.ctag += 1
+        self.changed[f'{uid}.ics'] = self.ctag
+        self.deleted.pop(f'{uid}.ics', None)
+        self.resources[f'{uid}.ics'] = {
+            'start': start_utc,
+            'end': start_utc + duration,
+            'etag': f'"{uid}-{self.ctag}"',
+            'data': ICS_TEMPLATE.format(
+                uid=uid, index=index, summary=summary,
+                start=start_utc.strftime('%Y%m%dT%H%M%SZ'),
+                end=(start_utc + duration).strftime('%Y%m%dT%H%M%SZ'),
+            ),
+        }
+
+    def delete_event(self, uid: str) -> None:
+        if self.resources.pop(f'{uid}.ics', None) is not None:
+            self.ctag += 1
+            self.changed.pop(f'{uid}.ics', None)
+            self.deleted[f'{uid}.ics'] = self.ctag
+
+    def touch(self, count: int) -> List[str]:
+        """Rename the first count events (new ETags), as if edited in another client"""
+        with self.lock:
+            names = list(self.resources)[:count]
+            for name in names:
+                resource = self.resources[name]
+                uid = name[:-len('.ics')]
+                index = int(uid.rsplit('-', 1)[-1]) if uid.rsplit('-', 1)[-1].isdigit() else 0
+                self.put_event(uid, resource['start'], f'日程 {index} (已修改 {self.ctag + 1})', index=index,
+                               duration=resource['end'] - resource['start'])
+            return names
+
+
+def generate_calendar(name: str, events: int, history_days: int = 3 * 365,
+                      future_days: int = 30) -> StandInCalendar:
+    """Events spread evenly from history_days ago to future_days ahead, like a long-lived account"""
+    calendar = StandInCalendar(name, f'Calendar {name}')
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    span = timedelta(days=history_days + future_days)
+    first = now - timedelta(days=history_days)
+    for i in range(events):
+        start = first + span * (i / max(events - 1, 1))
+        calendar.put_event(f'{name}-{i}', start, f'日程 {i}', index=i)
+    return calendar
+
+
+def _multistatus(body: str) -> bytes:
+    return ('<?xml version="1.0" encoding="utf-8"?>\n'
+            '<d:multistatus xmlns:d="DAV:" xmlns:c="urn:ietf:params:xml:ns:caldav" '
+            'xmlns:cs="http://calendarserver.org/ns/">' + body + '</d:multistatus>').encode('utf-8')
+
+
+class StandInCalDAVServer(ThreadingHTTPServer):
+    """Serves calendars under /dav/<user>/<calendar>/"""
+
+    daemon_threads = True
+
+    def __init__(self, calendars: List[StandInCalendar], user: str = 'bench',
+                 support_time_range: bool = True, support_sync_collection: bool = True,
+                 latency: float = 0.0, address=('127.0.0.1', 0)):
+        super().__init__(address, _CalDAVHandler)
+        self.user = user
+        self.calendars = {c.name: c for c in calendars}
+        self.support_time_range = support_time_range
+        self.support_sync_collection = support_sync_collection
+        # When set, sync-collection answers with this status (e.g. 503), to exercise client fallbacks
+        self.sync_collection_error: Optional[int] = None
+        # Seconds added before every CalDAV response, to mimic a remote server
+        self.latency = latency
+        self.bytes_sent = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def home(self) -> str:
+        return f'/dav/{self.user}/'
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address
+        return f'http://{host}:{port}{self.home}'
+
+    def start(self) -> 'StandInCalDAVServer':
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def reset_counters(self) -> None:
+        with self.lock:
+            self.bytes_sent = 0
+            self.requests = 0
+
+    def calendar_for(self, path: str) -> Optional[StandInCalendar]:
+        if not path.startswith(self.home):
+            return None
+        return self.calendars.get(path[len(self.home):].strip('/').split('/')[0])
+
+
+class _CalDAVHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without TCP_NODELAY delayed ACKs add ~40ms per request
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes = b'', content_type: str = 'application/xml; charset=utf-8',
+              counted: bool = True) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if counted:
+            with self.server.lock:
+                self.server.bytes_sent += len(body)
+                self.server.requests += 1
+
+    def _body(self) -> str:
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length).decode('utf-8') if length else ''
+
+    def _delay(self) -> None:
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+    def do_PROPFIND(self):
+        self._body()
+        self._delay()
+        server = self.server
+        parts = [f'<d:response><d:href>{server.home}</d:href><d:propstat><d:prop>'
+                 f'<d:resourcetype><d:collection/></d:resourcetype></d:prop>'
+                 f'<d:status>HTTP/1.1 200 OK</d:status></d:propstat></d:response>']
+        for calendar in server.calendars.values():
+            parts.append(
+                f'<d:response><d:href>{server.home}{calendar.name}/</d:href><d:propstat><d:prop>'
+                f'<d:resourcetype><d:collection/><c:calendar/></d:resourcetype>'
+                f'<d:displayname>{escape(calendar.displayname)}</d:displayname>'
+                f'<cs:getctag>{calendar.ctag}</cs:getctag>'
+                f'</d:prop><d:status>HTTP/1.1 200 OK</d:status></d:propstat></d:response>'
+            )
+        self._send(207, _multistatus(''.join(parts)))
+
+    def do_REPORT(self):
+        body = self._body()
+        self._delay()
+        calendar = self.server.calendar_for(self.path)
+        if calendar is None:
+            self._send(404)
+            return
+        with calendar.lock:
+            if 'sync-collection' in body:
+                self._sync_collection(calendar, body)
+            elif 'calendar-multiget' in body:
+                self._multiget(calendar, body)
+            elif 'calendar-query' in body:
+                self._calendar_query(calendar, body)
+            else:
+                self._send(501)
+
+    def _response(self, calendar: StandInCalendar, name: str, with_data: bool) -> str:
+        resource = calendar.resources[name]
+        data = f'<c:calendar-data>{escape(resource["data"])}</c:calendar-data>' if with_data else ''
+        return (f'<d:response><d:href>{self.server.home}{calendar.name}/{name}</d:href><d:propstat><d:prop>'
+                f'<d:getetag>{escape(resource["etag"])}</d:getetag>{data}'
+                f'</d:prop><d:status>HTTP/1.1 200 OK</d:status></d:propstat></d:response>')
+
+    def _missing(self, calendar: StandInCalendar, name: str) -> str:
+        return (f'<d:response><d:href>{self.server.home}{calendar.name}/{name}</d:href>'
+                f'<d:status>HTTP/1.1 404 Not Found</d:status></d:response>')
+
+    def _sync_collection(self, calendar: StandInCalendar, body: str) -> None:
+        if not self.server.support_sync_collection:
+            self._send(501)
+            return
+        if self.server.sync_collection_error:
+            self._send(self.server.sync_collection_error)
+            return
+        match = re.search(r'<(?:\w+:)?sync-token>([^<]*)</(?:\w+:)?sync-token>', body)
+        token = unescape(match.group(1)) if match else ''
+        if token:
+            revision = token[len(SYNC_TOKEN_PREFIX + calendar.name) + 1:]
+            if not token.startswith(SYNC_TOKEN_PREFIX + calendar.name + '/') or not revision.isdigit() \
+                    or int(revision) > calendar.ctag:
+                self._send(403, b'<?xml version="1.0" encoding="utf-8"?>\n'
+                                b'<d:error xmlns:d="DAV:"><d:valid-sync-token/></d:error>')
+                return
+            since = int(revision)
+            parts = [self._response(calendar, name, False)
+                     for name, rev in calendar.changed.items() if rev > since and name in calendar.resources]
+            parts += [self._missing(calendar, name) for name, rev in calendar.deleted.items() if rev > since]
+        else:
+            parts = [self._response(calendar, name, False) for name in calendar.resources]
+        parts.append(f'<d:sync-token>{escape(calendar.sync_token)}</d:sync-token>')
+        self._send(207, _multistatus(''.join(parts)))
+
+    def _multiget(self, calendar: StandInCalendar, body: str) -> None:
+        prefix = f'{self.server.home}{calendar.name}/'
+        parts = []
+        for href in re.findall(r'<(?:\w+:)?href>([^<]*)</(?:\w+:)?href>', body):
+            name = unquote(unescape(href))[len(prefix):]
+            parts.append(self._response(calendar, name, True) if name in calendar.resources
+                         else self._missing(calendar, name))
+        self._send(207, _multistatus(''.join(parts)))
+
+    def _calendar_query(self, calendar: StandInCalendar, body: str) -> None:
+
+        match = re.search(r'time-range start="(\w+)" end="(\w+)"', body)
+        if match and not self.server.support_time_range:
+            self._send(501)
+            return
+        window = None
+        if match:
+            window = tuple(datetime.strptime(v, '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc)
+                           for v in match.groups())
+
+        with_data = 'calendar-data' in body
+        parts = []
+        for name, resource in calendar.resources.items():
+            # RFC 4791 9.9: overlap test on [start, end)
+            if window and not (resource['start'] < window[1] and resource['end'] > window[0]):
+                continue
+            parts.append(self._response(calendar, name, with_data))
+        self._send(207, _multistatus(''.join(parts)))
+
+    def _control(self, status: int, payload: Dict) -> None:
+        self._send(status, json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+                   'application/json; charset=utf-8', counted=False)
+
+    def do_GET(self):
+        """GET /_standin/stats: bytes and requests served since the last reset"""
+        if urlparse(self.path).path != '/_standin/stats':
+            self._send(404)
+            return
+        with self.server.lock:
+            self._control(200, {'bytes_sent': self.server.bytes_sent, 'requests': self.server.requests})
+
+    def do_POST(self):
+        """POST /_standin/reset, or /_standin/touch?calendar=<name>&count=<n> to edit events"""
+        self._body()
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == '/_standin/reset':
+            self.server.reset_counters()
+            self._control(200, {'ok': True})
+        elif url.path == '/_standin/touch':
+            calendar = self.server.calendars.get(query.get('calendar', [''])[0])
+            if calendar is None:
+                self._control(404, {'error': 'unknown calendar'})
+                return
+            names = calendar.touch(int(query.get('count', ['1'])[0]))
+            self._control(200, {'touched': len(names), 'ctag': calendar.ctag})
+        else:
+            self._send(404)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CalDAV 替身服务器')
+    parser.add_argument('--events', type=int, nargs='+', default=[1000], help='每个日历的日程数（可按日历分别指定）')
+    parser.add_argument('--calendars', type=int, default=1, help='日历数')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求附加的延迟（秒）')
+    parser.add_argument('--user', default='bench', help='CalDAV 用户名（路径 /dav/<user>/）')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8808)
+    parser.add_argument('--no-time-range', action='store_true', help='拒绝 <C:time-range> 查询')
+    parser.add_argument('--no-sync-collection', action='store_true', help='不支持 sync-collection')
+    args = parser.parse_args()
+
+    sizes = (args.events * args.calendars)[:max(args.calendars, len(args.events))]
+    calendars = [generate_calendar(f'cal{i}', count) for i, count in enumerate(sizes)]
+    server = StandInCalDAVServer(calendars, user=args.user, support_time_range=not args.no_time_range,
+                                 support_sync_collection=not args.no_sync_collection,
+                                 latency=args.latency, address=(args.host, args.port))
+    print(f"📅 {len(calendars)} 个日历（{', '.join(str(n) for n in sizes)} 个日程），延迟 {args.latency * 1000:.0f}ms")
+    print(f"🚀 CalDAV 替身服务器已启动: {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 已停止")
+
+
+if __name__ == '__main__':
+    main()
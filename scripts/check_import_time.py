@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+启动耗时检查
+用 python -X importtime 测量各命令行入口的导入耗时（多次取最小值），
+超出预算或导入了不该在启动时加载的模块（requests、Pillow、CalDAV 客户端等）时以非零状态退出，
+可放在 CI 或部署前运行，防止启动变慢。
+
+    python3 scripts/check_import_time.py
+    python3 scripts/check_import_time.py --runs 10 --scale 2   # 较慢的机器放宽预算
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+# Libraries no command-line entry point needs before it starts working
+HEAVY_MODULES = ('requests', 'PIL', 'fastapi', 'starlette', 'pydantic')
+
+# entry point -> (import budget in ms, modules it must not load at import time)
+ENTRY_POINTS = {
+    'config': (15, HEAVY_MODULES + ('dotenv',)),
+    'main': (60, HEAVY_MODULES + ('sqlite3', 'clients.caldav_core', 'event_store', 'dotenv')),
+    'weather_scheduler': (80, HEAVY_MODULES + ('weather_chart', 'dot_calendar', 'render_farm')),
+    'cache_cli': (60, HEAVY_MODULES),
+    # Draws the chart, so Pillow is expected
+    'weather_chart_cli': (150, tuple(m for m in HEAVY_MODULES if m != 'PIL')),
+}
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def measure(module: str, forbidden) -> tuple:
+    """(cumulative import time in ms, forbidden modules that got loaded) for one fresh interpreter"""
+    code = f"import sys, json; import {module}; print(json.dumps([m for m in {list(forbidden)!r} if m in sys.modules]))"
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=SRC_DIR,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'import failed')
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match and match.group(4) == module and len(match.group(3)) == 1:
+            return int(match.group(2)) / 1000, json.loads(result.stdout.strip().splitlines()[-1])
+    raise RuntimeError(f'no importtime line for {module}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='命令行入口导入耗时检查')
+    parser.add_argument('--runs', type=int, default=5, help='每个入口测量次数（取最小值）')
+    parser.add_argument('--scale', type=float, default=1.0, help='预算倍数')
+    parser.add_argument('modules', nargs='*', help='只检查这些入口（默认全部）')
+    args = parser.parse_args()
+
+    failures = 0
+    print(f"{'入口':<20} {'耗时(ms)':>9} {'预算(ms)':>9}")
+    for module in args.modules or ENTRY_POINTS:
+        budget, forbidden = ENTRY_POINTS.get(module, (float('inf'), ()))
+        budget *= args.scale
+        try:
+            samples = [measure(module, forbidden) for _ in range(max(1, args.runs))]
+        except RuntimeError as e:
+            print(f"❌ {module:<18} 导入失败: {e}")
+            failures += 1
+            continue
+        elapsed = min(ms for ms, _ in samples)
+        loaded = sorted({name for _, names in samples for name in names})
+        ok = elapsed <= budget and not loaded
+        print(f"{'✅' if ok else '❌'} {module:<18} {elapsed:>9.1f} {budget:>9.0f}"
+              + (f"  启动时加载了: {', '.join(loaded)}" if loaded else ''))
+        failures += not ok
+
+    if failures:
+        print(f"\n❌ {failures} 个入口超出启动预算")
+        sys.exit(1)
+    print("\n🎉 所有入口都在启动预算内")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+进程内 Redis 协议替身服务器
+实现缓存后端用到的最小 RESP 命令集，供 tests/ 中的 Redis 后端测试与 scripts/bench_cache.py 基准使用，
+无需真实的 Redis 服务器。
+
+单独运行:
+
+    python3 scripts/redis_standin.py --port 6390
+"""
+
+import time
+import socket
+import fnmatch
+import argparse
+import threading
+import socketserver
+
+
+class RedisStandIn(socketserver.ThreadingTCPServer):
+    """最小的 RESP 服务器：GET/SET(EX)/DEL/EXISTS/SCAN/PING/AUTH/SELECT"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=('127.0.0.1', 0)):
+        super().__init__(address, _RedisHandler)
+        self.data = {}
+        self.expires = {}
+        self.lock = threading.Lock()
+        self.commands = 0
+
+    def start(self) -> str:
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        host, port = self.server_address
+        return f'redis://{host}:{port}/0'
+
+    def _alive(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def execute(self, args):
+        self.commands += 1
+        name = args[0].upper()
+        with self.lock:
+            if name in (b'PING', b'AUTH', b'SELECT'):
+                return b'+OK\r\n' if name != b'PING' else b'+PONG\r\n'
+            if name == b'GET':
+                return _bulk(self.data[args[1]] if self._alive(args[1]) else None)
+            if name == b'SET':
+                self.data[args[1]] = args[2]
+                self.expires.pop(args[1], None)
+                if len(args) >= 5 and args[3].upper() == b'EX':
+                    self.expires[args[1]] = time.time() + int(args[4])
+                return b'+OK\r\n'
+            if name == b'DEL':
+                removed = sum(1 for key in args[1:] if self._alive(key) and self.data.pop(key, None) is not None)
+                return b':%d\r\n' % removed
+            if name == b'EXISTS':
+                return b':%d\r\n' % sum(1 for key in args[1:] if self._alive(key))
+            if name == b'SCAN':
+                pattern = args[args.index(b'MATCH') + 1].decode('utf-8') if b'MATCH' in args else '*'
+                keys = [k for k in list(self.data) if self._alive(k) and fnmatch.fnmatchcase(k.decode('utf-8'), pattern.replace('\\', ''))]
+                return b'*2\r\n' + _bulk(b'0') + b'*%d\r\n' % len(keys) + b''.join(_bulk(k) for k in keys)
+        return b'-ERR unknown command\r\n'
+
+
+def _bulk(value):
+    if value is None:
+        return b'$-1\r\n'
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+class _RedisHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            count = int(line[1:-2])
+            args = []
+            for _ in range(count):
+                length = int(self.rfile.readline()[1:-2])
+                args.append(self.rfile.read(length + 2)[:-2])
+            self.wfile.write(self.server.execute(args))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Redis 协议替身服务器')
+    parser.add_argument('--port', type=int, default=6390)
+    args = parser.parse_args()
+    server = RedisStandIn(('127.0.0.1', args.port))
+    print(f"🧪 Redis 替身服务器: redis://127.0.0.1:{args.port}/0")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,139 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import Response
+from fastapi import BackgroundTasks, FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
 import json
-import io
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Optional, Tuple
 
 import config
 import main as main_mod
-from dot_calendar import DotCalendar
-from weather_chart import WeatherChart
+import event_store
+import fonts
+import metrics
+import tracing
+import warmup
+from render_executor import BoundedExecutor, ExecutorFull
+import render_farm
+import batch_render
+import encoders
+from encoders import Encoder
+from render_farm import RenderJob, format_options
+from dot_calendar import DotCalendar, push_to_devices
+from weather_chart import WeatherChart, forecast_days
+from utils import W2FileCache, CACHE_NAMESPACES
 
-app = FastAPI(title="Dot Calendar API")
+# Blocking render work runs here instead of on the event loop; each thread loads the fonts as it starts
+RENDER_EXECUTOR = BoundedExecutor(config.RENDER_MAX_WORKERS, config.RENDER_MAX_QUEUE, initializer=fonts.preload)
+READINESS = warmup.Readiness()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up in the background while serving; /ready turns 200 once done"""
+    warmup.start_warm_up(READINESS, RENDER_EXECUTOR)
+    yield
+    event_store.stop_background_sync()
+    RENDER_EXECUTOR.shutdown()
+    render_farm.shutdown_render_farm()
+
+
+app = FastAPI(title="Dot Calendar API", lifespan=lifespan)
+
+
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    """In-flight gauge and latency histogram per route"""
+    metrics.REQUESTS_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.REQUESTS_IN_FLIGHT.dec()
+        route = request.scope.get('route')
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method,
+                                        route=getattr(route, 'path', 'unmatched'), status=status)
+
+
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    """Request ID and root tracing span for everything the request runs, including background tasks
+
+    X-Request-ID is taken from the caller when well-formed (else generated) and a W3C
+    traceparent header continues the caller's trace; both are returned on the response.
+    """
+    with tracing.request_scope(request.headers.get('x-request-id'), request.headers.get('traceparent')) as request_id:
+        with tracing.span(f'{request.method} {request.url.path}',
+                          **{'http.method': request.method, 'http.target': request.url.path}) as span:
+            response = await call_next(request)
+            span.set_attribute('http.status_code', response.status_code)
+            response.headers['X-Request-ID'] = request_id
+            if isinstance(span, tracing.Span):
+                response.headers['traceparent'] = span.traceparent()
+            return response
+
+
+@app.exception_handler(ExecutorFull)
+async def executor_full(request, exc: ExecutorFull):
+    return JSONResponse(status_code=503, content={"detail": "Render queue is full, please retry later"},
+                        headers={"Retry-After": str(exc.retry_after)})
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check with weak comparison (RFC 9110 13.1.2)"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in (tag[2:] if tag.startswith('W/') else tag for tag in tags)
+
+
+def _select_encoder(format: Optional[str], accept: Optional[str]) -> Encoder:
+    """Output format from the payload's 'format' field, else negotiated from the Accept header"""
+    if format:
+        try:
+            return encoders.get_encoder(format)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    encoder = encoders.negotiate(accept)
+    if encoder is None:
+        raise HTTPException(status_code=406, detail=f'Supported formats: {", ".join(encoders.ENCODERS)}')
+    return encoder
+
+
+def _conditional_render(job: RenderJob, if_none_match: Optional[str]) -> Tuple[str, Optional[bytes]]:
+    """(ETag, image) for a job; image is None when the client already has it
+
+    The ETag is the hash of the render inputs, so an unchanged image is
+    answered without rendering or encoding, and a cached render is reused.
+    """
+    digest = job.digest()
+    etag = f'"{digest[:32]}"'
+    if _etag_matches(if_none_match, etag):
+        return etag, None
+    return etag, render_farm.render_cached(job, digest)[1]
+
+
+def _image_response(etag: str, body: Optional[bytes], timing, encoder: Encoder) -> Response:
+    """Encoded image, or 304 when body is None, with ETag and queue/render timings"""
+    headers = {'ETag': etag, 'Cache-Control': config.IMAGE_CACHE_CONTROL, 'Server-Timing': timing.server_timing(),
+               'Vary': 'Accept'}
+    if body is None:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=encoder.media_type, headers={**headers, **encoder.headers})
+
+
+async def _render(encoder: Encoder, func, *args) -> Response:
+    """Run a blocking render on RENDER_EXECUTOR and answer with its (ETag, image)"""
+    (etag, body), timing = await RENDER_EXECUTOR.run(func, *args)
+    return _image_response(etag, body, timing, encoder)
+
+
+def _check_token(token) -> None:
+    if not token or token != config.DOT_CALENDAR_TOKEN:
+        raise HTTPException(status_code=403, detail='Forbidden')
 
 
 @app.get("/")
@@ -16,15 +141,79 @@ def root():
     return {"status": "ok"}
 
 
-@app.post("/generate")
-async def generate(payload: dict):
-    token = payload.get('token')
-    if not token or token != config.DOT_CALENDAR_TOKEN:
-        raise HTTPException(status_code=403, detail='Forbidden')
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus 指标：各渲染阶段耗时直方图、缓存命中、上游错误与在途请求数"""
+    return Response(content=metrics.generate_latest(), media_type=metrics.CONTENT_TYPE)
 
-    calendar = payload.get('calendar')
-    dotsync = bool(payload.get('dotsync', False))
 
+@app.get("/ready")
+def ready():
+    """就绪探针：字体、渲染进程、缓存与数据预热完成前返回 503"""
+    return JSONResponse(status_code=200 if READINESS.ready else 503, content=READINESS.info())
+
+
+@app.get("/cache/stats")
+def cache_stats(token: str = ''):
+    """缓存命中率、读写字节数与延迟（按键前缀分组）"""
+    _check_token(token)
+    return {"stats": W2FileCache.get_stats()}
+
+
+@app.get("/cache/keys")
+def cache_keys(token: str = '', prefix: str = ''):
+    """列出缓存键"""
+    _check_token(token)
+    return {"keys": W2FileCache.list_keys(prefix)}
+
+
+@app.get("/cache/keys/{key}")
+def cache_inspect(key: str, token: str = ''):
+    """查看单个缓存项"""
+    _check_token(token)
+    info = W2FileCache.inspect_key(key)
+    if info is None:
+        raise HTTPException(status_code=404, detail='Not Found')
+    return info
+
+
+@app.get("/cache/namespaces")
+def cache_namespaces(token: str = ''):
+    """缓存命名空间的版本与代数"""
+    _check_token(token)
+    return {"namespaces": [ns.info() for ns in CACHE_NAMESPACES.values()]}
+
+
+@app.post("/cache/invalidate")
+def cache_invalidate(payload: dict):
+    """按命名空间（O(1) 代数递增）或按前缀删除缓存"""
+    _check_token(payload.get('token'))
+    namespace = payload.get('namespace')
+    if namespace is not None:
+        if namespace not in CACHE_NAMESPACES:
+            raise HTTPException(status_code=404, detail=f'Unknown namespace: {namespace}')
+        return {"namespace": namespace, "generation": CACHE_NAMESPACES[namespace].bump()}
+
+    prefix = payload.get('prefix')
+    if not isinstance(prefix, str):
+        raise HTTPException(status_code=400, detail='prefix or namespace is required')
+    return {"deleted": W2FileCache.invalidate(prefix)}
+
+
+@app.get("/render/stats")
+def render_stats(token: str = ''):
+    """渲染执行器的排队与运行耗时统计"""
+    _check_token(token)
+    return {"stats": RENDER_EXECUTOR.get_stats()}
+
+
+def _render_calendar(calendar, dotsync: bool, format: str,
+                     if_none_match: Optional[str]) -> Tuple[str, Optional[bytes], Optional[bytes]]:
+    """Todolist and weather fetches for /generate; runs on a render worker thread
+
+    Returns (ETag, response image or None for 304, PNG frame to push or None).
+    With dotsync the frame is always produced, and a PNG response reuses its bytes.
+    """
     # Build todolist
     if calendar:
         if not isinstance(calendar, str):
@@ -44,37 +233,49 @@ async def generate(payload: dict):
         todolist
     )
 
-    # Generate image
-    dot_calendar.load_weather_data()
-    dot_calendar.create_image()
+    # Drawing, binarization and encoding run on the render farm
+    weather = dot_calendar.qweather_get_daily(dot_calendar.location)
+    job = RenderJob('calendar', weather, todolist, format_options(format))
+    if not dotsync:
+        return (*_conditional_render(job, if_none_match), None)
 
-    # Convert to black and white and return PNG bytes
-    bw = dot_calendar.blackwhite_image(dot_calendar.image)
-    buf = io.BytesIO()
-    bw.save(buf, format='PNG')
-    buf.seek(0)
+    etag, frame = _conditional_render(RenderJob('calendar', weather, todolist), None)
+    if job.options:
+        # The Dot API takes PNG; another response format is a second (cached) render
+        return (*_conditional_render(job, if_none_match), frame)
+    return etag, None if _etag_matches(if_none_match, etag) else frame, frame
 
-    # Optionally sync to Dot device (will attempt network calls)
-    if dotsync:
-        try:
-            dot_calendar.output(True)
-        except Exception:
-            # don't fail the request if device sync fails
-            pass
 
-    return Response(content=buf.getvalue(), media_type='image/png')
+def _push_frame(frame: bytes) -> None:
+    """Push an encoded frame to the configured Dot devices; runs after the response is sent"""
+    try:
+        push_to_devices(config.DOT_DEVICE_ID, config.DOT_APP_KEY, frame)
+    except Exception as e:
+        # don't let device sync errors escape the background task
+        print(f"❌ Dot device sync failed: {e}")
 
 
-@app.post("/weather-chart")
-async def weather_chart(payload: dict):
-    """生成天气预报走势图"""
+@app.post("/generate")
+async def generate(payload: dict, background_tasks: BackgroundTasks, if_none_match: Optional[str] = Header(None),
+                   accept: Optional[str] = Header(None)):
     token = payload.get('token')
     if not token or token != config.DOT_CALENDAR_TOKEN:
         raise HTTPException(status_code=403, detail='Forbidden')
 
-    days = payload.get('days', 15)  # 默认15天
-    include_yesterday = payload.get('include_yesterday', True)  # 默认包含昨天数据
-    
+    calendar = payload.get('calendar')
+    dotsync = bool(payload.get('dotsync', False)) and bool(config.DOT_DEVICE_ID and config.DOT_APP_KEY)
+    encoder = _select_encoder(payload.get('format'), accept)
+    (etag, body, frame), timing = await RENDER_EXECUTOR.run(_render_calendar, calendar, dotsync, encoder.name,
+                                                            if_none_match)
+    # The device gets the very bytes the response carries, without holding the response on the Dot API
+    if frame is not None:
+        background_tasks.add_task(_push_frame, frame)
+    return _image_response(etag, body, timing, encoder)
+
+
+def _render_weather_chart(days: int, include_yesterday: bool, format: str,
+                          if_none_match: Optional[str]) -> Tuple[str, Optional[bytes]]:
+    """天气走势图的数据加载（渲染线程）与绘制（渲染进程池）"""
     try:
         chart = WeatherChart(
             location=config.CONFIG_USER_LOCATION,
@@ -85,18 +286,57 @@ async def weather_chart(payload: dict):
         # 加载天气数据
         chart.load_weather_data(days=days, include_yesterday=include_yesterday)
         
-        # 创建图像
-        chart.create_image()
-        
-        # 转换为黑白图像 (适配墨水屏)
-        bw_image = chart.blackwhite_image()
-        
-        # 获取图像字节流
-        buf = io.BytesIO()
-        bw_image.save(buf, format='PNG')
-        buf.seek(0)
-        
-        return Response(content=buf.getvalue(), media_type='image/png')
+        # 绘制并转换为黑白图像 (适配墨水屏)，按所选格式编码，返回 ETag 与图片字节流（数据未变时为 None）
+        return _conditional_render(RenderJob('weather_chart', chart.weather_data, options=format_options(format)),
+                                   if_none_match)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f'生成天气预报走势图失败: {str(e)}')
+
+
+@app.post("/weather-chart")
+async def weather_chart(payload: dict, if_none_match: Optional[str] = Header(None),
+                        accept: Optional[str] = Header(None)):
+    """生成天气预报走势图（格式由 format 字段或 Accept 头选择，默认 PNG）"""
+    token = payload.get('token')
+    if not token or token != config.DOT_CALENDAR_TOKEN:
+        raise HTTPException(status_code=403, detail='Forbidden')
+
+    try:
+        days = forecast_days(payload.get('days', 15))  # 默认15天
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    include_yesterday = payload.get('include_yesterday', True)  # 默认包含昨天数据
+    encoder = _select_encoder(payload.get('format'), accept)
+    return await _render(encoder, _render_weather_chart, days, include_yesterday, encoder.name, if_none_match)
+
+
+@app.post("/generate/batch")
+async def generate_batch(payload: dict):
+    """为多个设备配置一次性生成图片：相同地点的天气、相同的日程来源只拉取一次，相同图片只渲染一次
+
+    delivery: zip（默认，含 manifest.json）、multipart（multipart/mixed）或 push（直接推送到各设备，返回 JSON）
+    """
+    _check_token(payload.get('token'))
+    delivery = payload.get('delivery', 'zip')
+    if delivery not in batch_render.DELIVERIES:
+        raise HTTPException(status_code=400, detail=f'delivery must be one of {", ".join(batch_render.DELIVERIES)}')
+    if delivery == 'push' and not config.DOT_APP_KEY:
+        raise HTTPException(status_code=400, detail='DOT_APP_KEY is not configured')
+    try:
+        profiles = batch_render.parse_profiles(payload.get('profiles'))
+    except batch_render.BatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if delivery == 'push' and any(profile.format != encoders.DEFAULT_FORMAT for profile in profiles):
+        raise HTTPException(status_code=400, detail='push delivers PNG to the Dot API, profiles can not set format')
+
+    (items, stats), timing = await RENDER_EXECUTOR.run(batch_render.render_batch, profiles, delivery == 'push')
+    headers = {'Server-Timing': timing.server_timing(), **stats.headers()}
+    if delivery == 'push':
+        return JSONResponse({"results": [item.manifest() for item in items]}, headers=headers)
+    if delivery == 'multipart':
+        boundary = uuid.uuid4().hex
+        return Response(content=batch_render.to_multipart(items, boundary),
+                        media_type=f'multipart/mixed; boundary={boundary}', headers=headers)
+    headers['Content-Disposition'] = 'attachment; filename="dot_calendar_batch.zip"'
+    return Response(content=batch_render.to_zip(items), media_type='application/zip', headers=headers)
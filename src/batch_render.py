@@ -0,0 +1,280 @@
+"""
+Batch rendering
+Render images for many device profiles in one call: each distinct weather location and
+calendar source is fetched once, identical images are rendered once, the rest in parallel
+"""
+
+import io
+import json
+import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import config
+import encoders
+import main as main_mod
+import push_service
+import render_farm
+import tracing
+from calendar_aggregator import parse_sources
+from dot_calendar import DotCalendar
+from render_farm import RenderJob, format_options
+from weather_chart import WeatherChart, forecast_days
+
+
+LAYOUTS = ('calendar', 'weather_chart')
+FORMATS = tuple(encoders.ENCODERS)
+DELIVERIES = ('zip', 'multipart', 'push')
+# Profile IDs become archive entry names and multipart header parameters
+PROFILE_ID_PATTERN = re.compile(r'[A-Za-z0-9._-]{1,64}')
+STRING_FIELDS = ('device_id', 'location', 'calendar_source', 'layout', 'format')
+
+
+class BatchError(ValueError):
+    """The batch request itself is invalid"""
+
+
+@dataclass
+class Profile:
+    """One device's render settings"""
+    id: str
+    device_id: Optional[str] = None
+    location: Optional[str] = None
+    calendar_source: Optional[str] = None
+    calendar: Any = None
+    layout: str = 'calendar'
+    format: str = 'png'
+    days: int = 15
+    include_yesterday: bool = True
+
+
+@dataclass
+class BatchItem:
+    """Result for one profile: the encoded image and its ETag, or the error that prevented it"""
+    profile: Profile
+    etag: Optional[str] = None
+    image: Optional[bytes] = None
+    error: Optional[str] = None
+    pushed: Optional[bool] = None
+
+    @property
+    def filename(self) -> str:
+        return f'{self.profile.id}.{encoders.get_encoder(self.profile.format).extension}'
+
+    def manifest(self) -> Dict[str, Any]:
+        entry = {'id': self.profile.id, 'device_id': self.profile.device_id, 'layout': self.profile.layout,
+                 'format': self.profile.format, 'etag': self.etag, 'error': self.error}
+        if self.image is not None:
+            entry['filename'] = self.filename
+            entry['bytes'] = len(self.image)
+        if self.pushed is not None:
+            entry['pushed'] = self.pushed
+        return entry
+
+
+@dataclass
+class BatchStats:
+    profiles: int = 0
+    weather_fetches: int = 0
+    todolist_fetches: int = 0
+    renders: int = 0
+
+    def headers(self) -> Dict[str, str]:
+        return {'X-Batch-Profiles': str(self.profiles), 'X-Batch-Weather-Fetches': str(self.weather_fetches),
+                'X-Batch-Todolist-Fetches': str(self.todolist_fetches), 'X-Batch-Renders': str(self.renders)}
+
+
+def parse_profiles(raw: Any) -> List[Profile]:
+    """Validate the 'profiles' list of a batch request"""
+    if not isinstance(raw, list) or not raw:
+        raise BatchError('profiles must be a non-empty list')
+    if len(raw) > config.BATCH_MAX_PROFILES:
+        raise BatchError(f'at most {config.BATCH_MAX_PROFILES} profiles per batch')
+
+    profiles, ids = [], set()
+    for index, item in enumerate(raw):
+        if not isinstance(item, dict):
+            raise BatchError(f'profile {index} must be an object')
+        for field in STRING_FIELDS:
+            if item.get(field) is not None and not isinstance(item[field], str):
+                raise BatchError(f'profile {index}: {field} must be a string')
+        raw_id = item.get('id')
+        if raw_id is not None and (isinstance(raw_id, bool) or not isinstance(raw_id, (str, int))):
+            raise BatchError(f'profile {index}: id must be a string')
+        try:
+            days = forecast_days(item.get('days', 15))
+        except ValueError as e:
+            raise BatchError(f'profile {index}: {e}')
+        profile = Profile(
+            id=str(raw_id if raw_id not in (None, '') else item.get('device_id') or index),
+            device_id=item.get('device_id'),
+            location=item.get('location') or config.CONFIG_USER_LOCATION,
+            calendar_source=item.get('calendar_source') or config.CALENDAR_SOURCE,
+            calendar=item.get('calendar'),
+            layout=item.get('layout', 'calendar'),
+            format=item.get('format', 'png'),
+            days=days,
+            include_yesterday=bool(item.get('include_yesterday', True)),
+        )
+        if not PROFILE_ID_PATTERN.fullmatch(profile.id):
+            raise BatchError(f'profile {index}: id must be 1-64 characters of A-Z, a-z, 0-9, ".", "_" or "-"')
+        if profile.layout not in LAYOUTS:
+            raise BatchError(f'profile {profile.id}: layout must be one of {", ".join(LAYOUTS)}')
+        if profile.format not in FORMATS:
+            raise BatchError(f'profile {profile.id}: format must be one of {", ".join(FORMATS)}')
+        if profile.id in ids:
+            raise BatchError(f'duplicate profile id: {profile.id}')
+        ids.add(profile.id)
+        profiles.append(profile)
+    return profiles
+
+
+def _fetch_once(keys: List[Hashable], fetch: Callable[[Hashable], Any],
+                executor: ThreadPoolExecutor) -> Dict[Hashable, Any]:
+    """fetch() each distinct key concurrently, {key: result or the exception raised}"""
+    distinct = list(dict.fromkeys(keys))
+
+    def guarded(key):
+        try:
+            return fetch(key)
+        except Exception as e:
+            return e
+
+    return dict(zip(distinct, executor.map(tracing.propagate(guarded), distinct)))
+
+
+def _weather_key(profile: Profile) -> Tuple:
+    if profile.layout == 'calendar':
+        return ('calendar', profile.location)
+    return ('weather_chart', profile.location, profile.days, profile.include_yesterday)
+
+
+def _fetch_weather(key: Tuple) -> Any:
+    if key[0] == 'calendar':
+        return DotCalendar(location=key[1], qweather_host=config.QWEATHER_HOST,
+                           qweather_key=config.QWEATHER_KEY).qweather_get_daily(key[1])
+    chart = WeatherChart(location=key[1], qweather_host=config.QWEATHER_HOST, qweather_key=config.QWEATHER_KEY)
+    return chart.load_weather_data(days=key[2], include_yesterday=key[3]).weather_data
+
+
+def _todolist_key(profile: Profile) -> Optional[Tuple]:
+    if profile.layout != 'calendar':
+        return None
+    if profile.calendar:
+        calendar = profile.calendar if isinstance(profile.calendar, str) else \
+            json.dumps(profile.calendar, ensure_ascii=False, sort_keys=True)
+        return ('param', calendar)
+    return ('sources', tuple(sorted(parse_sources(profile.calendar_source) or ['dingtalk'])))
+
+
+def _fetch_todolist(key: Tuple) -> List[str]:
+    if key[0] == 'param':
+        return main_mod.get_todolist_from_calendar_param(key[1])
+    return main_mod.get_todolist_from_sources(list(key[1]))
+
+
+def render_batch(profiles: List[Profile], push: bool = False) -> Tuple[List[BatchItem], BatchStats]:
+    """Fetch shared inputs once, render each distinct image once, optionally push to devices"""
+    stats = BatchStats(profiles=len(profiles))
+    workers = max(2, config.RENDER_PROCESSES)
+    items = [BatchItem(profile) for profile in profiles]
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch') as executor:
+        weather = _fetch_once([_weather_key(p) for p in profiles], _fetch_weather, executor)
+        todolist_keys = [k for k in (_todolist_key(p) for p in profiles) if k is not None]
+        todolists = _fetch_once(todolist_keys, _fetch_todolist, executor)
+        stats.weather_fetches, stats.todolist_fetches = len(weather), len(todolists)
+
+        # Profiles with the same inputs share one job and one render
+        jobs: Dict[str, RenderJob] = {}
+        digests: Dict[int, str] = {}
+        for index, item in enumerate(items):
+            data = weather[_weather_key(item.profile)]
+            todolist = todolists.get(_todolist_key(item.profile), [])
+            for value in (data, todolist):
+                if isinstance(value, Exception):
+                    item.error = str(value)
+            if item.error:
+                continue
+            job = RenderJob(item.profile.layout, data, todolist, format_options(item.profile.format))
+            digest = job.digest()
+            jobs.setdefault(digest, job)
+            digests[index] = digest
+
+        def render(digest: str):
+            try:
+                return render_farm.render_cached(jobs[digest], digest)[1]
+            except Exception as e:
+                return e
+
+        images = dict(zip(jobs, executor.map(tracing.propagate(render), jobs)))
+        stats.renders = len(jobs)
+
+        for index, digest in digests.items():
+            item = items[index]
+            if isinstance(images[digest], Exception):
+                item.error = str(images[digest])
+            else:
+                item.etag, item.image = f'"{digest[:32]}"', images[digest]
+
+        if push:
+            targets = [item for item in items if item.image is not None]
+            for item in targets:
+                if not item.profile.device_id:
+                    item.error, item.pushed = 'device_id is required to push', False
+            # Profiles showing the same image share one encoded payload and one device fan-out
+            groups: Dict[str, List[BatchItem]] = {}
+            for item in targets:
+                if item.profile.device_id:
+                    groups.setdefault(item.etag, []).append(item)
+
+            def push_group(group: List[BatchItem]) -> None:
+                results = push_service.push([item.profile.device_id for item in group], config.DOT_APP_KEY,
+                                            group[0].image)
+                by_device = {result.device_id: result for result in results}
+                for item in group:
+                    result = by_device.get(item.profile.device_id.strip())
+                    item.pushed = bool(result and result.ok)
+                    if result and result.error:
+                        item.error = result.error
+
+            list(executor.map(tracing.propagate(push_group), groups.values()))
+
+    return items, stats
+
+
+def to_zip(items: List[BatchItem]) -> bytes:
+    """ZIP of <id>.<extension> files plus manifest.json; images are already compressed, so entries are stored"""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for item in items:
+            if item.image is not None:
+                archive.writestr(item.filename, item.image)
+        archive.writestr('manifest.json', json.dumps([item.manifest() for item in items], ensure_ascii=False))
+    return buf.getvalue()
+
+
+def _quote(value: str) -> str:
+    """A quoted-string header parameter (RFC 7230 3.2.6)"""
+    if '\r' in value or '\n' in value:
+        raise ValueError(f'header parameter contains a line break: {value!r}')
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def to_multipart(items: List[BatchItem], boundary: str) -> bytes:
+    """multipart/mixed body: a JSON manifest part, then one image part per rendered profile"""
+    parts = [(b'Content-Type: application/json; charset=utf-8\r\n'
+              b'Content-Disposition: inline; name="manifest"\r\n\r\n' +
+              json.dumps([item.manifest() for item in items], ensure_ascii=False).encode('utf-8'))]
+    for item in items:
+        if item.image is None:
+            continue
+        headers = (f'Content-Type: {encoders.get_encoder(item.profile.format).media_type}\r\n'
+                   f'Content-Disposition: attachment; name={_quote(item.profile.id)}; '
+                   f'filename={_quote(item.filename)}\r\n'
+                   f'ETag: {item.etag}\r\n\r\n')
+        parts.append(headers.encode('utf-8') + item.image)
+    delimiter = f'--{boundary}\r\n'.encode('ascii')
+    return b''.join(delimiter + part + b'\r\n' for part in parts) + f'--{boundary}--\r\n'.encode('ascii')
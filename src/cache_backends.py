@@ -0,0 +1,251 @@
+"""Storage backends for W2FileCache.
+
+A backend stores opaque serialized cache items (bytes) by key. The file
+backend keeps the original one-file-per-key layout under ``cache/``; the
+Redis backend lets several API replicas share one cache over the Redis
+protocol (RESP), with pooled connections and pipelined batch reads.
+"""
+
+import os
+import queue
+import socket
+import tempfile
+from typing import Iterable, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+
+class CacheBackendError(IOError):
+    """Raised when a backend cannot serve a request"""
+
+
+class _ConnectionClosed(CacheBackendError):
+    """The server closed the connection mid-reply"""
+
+
+class FileCacheBackend:
+    """One ``<key>.cache`` file per entry in a local directory"""
+
+    SUFFIX = '.cache'
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}{self.SUFFIX}")
+
+    def read(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._file(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def read_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        return [self.read(key) for key in keys]
+
+    def write(self, key: str, payload: bytes, timeout: int = 0) -> None:
+        if not os.path.exists(self.path):
+            os.makedirs(self.path, exist_ok=True)
+        # Readers see the old entry or the new one, never a partly written file
+        fd, tmp = tempfile.mkstemp(dir=self.path, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp, self._file(key))
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    def delete(self, key: str) -> bool:
+        try:
+            os.remove(self._file(key))
+            return True
+        except OSError:
+            return False
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._file(key))
+
+    def keys(self, prefix: str = '') -> List[str]:
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return []
+        return sorted(
+            name[:-len(self.SUFFIX)] for name in names
+            if name.endswith(self.SUFFIX) and name.startswith(prefix)
+        )
+
+    def close(self) -> None:
+        pass
+
+
+class _RedisConnection:
+    """A single RESP connection"""
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile('rb')
+
+    @staticmethod
+    def _pack(args: Iterable) -> bytes:
+        parts = []
+        items = [a if isinstance(a, bytes) else str(a).encode('utf-8') for a in args]
+        parts.append(b'*%d\r\n' % len(items))
+        for item in items:
+            parts.append(b'$%d\r\n%s\r\n' % (len(item), item))
+        return b''.join(parts)
+
+    def send(self, *commands: Tuple) -> None:
+        self.sock.sendall(b''.join(self._pack(command) for command in commands))
+
+    def read_reply(self):
+        line = self.reader.readline()
+        if not line:
+            raise _ConnectionClosed('Redis connection closed')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode('utf-8')
+        if kind == b'-':
+            raise CacheBackendError(f"Redis error: {rest.decode('utf-8', 'replace')}")
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length == -1:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(rest)
+            if length == -1:
+                return None
+            return [self.read_reply() for _ in range(length)]
+        raise CacheBackendError(f"Unexpected Redis reply: {line!r}")
+
+    def close(self) -> None:
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisCacheBackend:
+    """Shared cache over the Redis protocol
+
+    Connections are pooled per backend instance and reused across threads.
+    Entries with a timeout get a Redis expiry of ``timeout + stale_grace`` so
+    expired-but-present reads are still reported as stale hits.
+    """
+
+    def __init__(self, url: str = 'redis://localhost:6379/0', key_prefix: str = 'dotcal:',
+                 pool_size: int = 8, timeout: float = 2.0, stale_grace: int = 60 * 60 * 24):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.key_prefix = key_prefix
+        self.timeout = timeout
+        self.stale_grace = stale_grace
+        self._pool: 'queue.LifoQueue[_RedisConnection]' = queue.LifoQueue(maxsize=pool_size)
+
+    def _connect(self) -> _RedisConnection:
+        conn = _RedisConnection(self.host, self.port, self.timeout)
+        setup = []
+        if self.password:
+            setup.append(('AUTH', self.password))
+        if self.db:
+            setup.append(('SELECT', self.db))
+        if setup:
+            conn.send(*setup)
+            for _ in setup:
+                conn.read_reply()
+        return conn
+
+    def _execute(self, *commands: Tuple) -> list:
+        """Send commands in one pipeline and return their replies in order"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+
+        try:
+            conn.send(*commands)
+            replies = []
+            error = None
+            for _ in commands:
+                # Drain every reply so the connection stays usable after an error reply
+                try:
+                    replies.append(conn.read_reply())
+                except _ConnectionClosed:
+                    raise
+                except CacheBackendError as e:
+                    error = error or e
+                    replies.append(None)
+        except (OSError, ValueError):
+            conn.close()
+            raise
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+        if error:
+            raise error
+        return replies
+
+    def _key(self, key: str) -> str:
+        return self.key_prefix + key
+
+    def read(self, key: str) -> Optional[bytes]:
+        return self._execute(('GET', self._key(key)))[0]
+
+    def read_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        if not keys:
+            return []
+        return self._execute(*[('GET', self._key(key)) for key in keys])
+
+    def write(self, key: str, payload: bytes, timeout: int = 0) -> None:
+        if timeout:
+            self._execute(('SET', self._key(key), payload, 'EX', int(timeout) + self.stale_grace))
+        else:
+            self._execute(('SET', self._key(key), payload))
+
+    def delete(self, key: str) -> bool:
+        return bool(self._execute(('DEL', self._key(key)))[0])
+
+    def exists(self, key: str) -> bool:
+        return bool(self._execute(('EXISTS', self._key(key)))[0])
+
+    def keys(self, prefix: str = '') -> List[str]:
+        pattern = self._key(prefix)
+        for char in '\\*?[]':
+            pattern = pattern.replace(char, '\\' + char)
+        cursor, found = '0', set()
+        while True:
+            cursor, batch = self._execute(('SCAN', cursor, 'MATCH', pattern + '*', 'COUNT', 500))[0]
+            cursor = cursor.decode('utf-8') if isinstance(cursor, bytes) else cursor
+            found.update(k.decode('utf-8')[len(self.key_prefix):] for k in batch)
+            if cursor == '0':
+                return sorted(found)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def create_backend(name: str, cache_path: str, redis_url: Optional[str] = None,
+                   redis_prefix: str = 'dotcal:', redis_pool_size: int = 8):
+    """Build the backend selected by CACHE_BACKEND"""
+    if (name or 'file').lower() == 'redis':
+        return RedisCacheBackend(redis_url or 'redis://localhost:6379/0',
+                                 key_prefix=redis_prefix, pool_size=redis_pool_size)
+    return FileCacheBackend(cache_path)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+缓存管理命令行工具
+查看缓存统计、列出/查看缓存项、按前缀或命名空间失效缓存
+"""
+
+import sys
+import os
+import json
+import argparse
+from datetime import datetime
+
+# Add the current directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils import W2FileCache, CACHE_NAMESPACES
+
+
+def _format_time(timestamp) -> str:
+    if not timestamp:
+        return '-'
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def cmd_stats(args) -> int:
+    """按前缀汇总磁盘上的缓存项；--live 时读取运行中 API 的命中统计"""
+    if args.live:
+        import requests
+        response = requests.get(f"{args.live.rstrip('/')}/cache/stats",
+                                params={'token': args.token or ''}, timeout=10)
+        if response.status_code != 200:
+            print(f"❌ 获取统计失败: {response.status_code} {response.text}")
+            return 1
+        stats = response.json().get('stats', {})
+        if not stats:
+            print("📊 暂无缓存访问记录")
+            return 0
+        print(f"{'前缀':<28}{'命中':>8}{'未命中':>8}{'过期':>8}{'命中率':>8}{'读字节':>12}{'写字节':>12}{'平均读ms':>10}")
+        for prefix, c in sorted(stats.items()):
+            print(f"{prefix:<28}{c['hits']:>8.0f}{c['misses']:>8.0f}{c['stale_hits']:>8.0f}"
+                  f"{c['hit_ratio']:>8.2%}{c['bytes_read']:>12.0f}{c['bytes_written']:>12.0f}{c['avg_read_ms']:>10.3f}")
+        return 0
+
+    summary = {}
+    for entry in W2FileCache.list_keys():
+        item = summary.setdefault(entry['prefix'], {'entries': 0, 'valid': 0, 'bytes': 0})
+        item['entries'] += 1
+        item['valid'] += 1 if entry['valid'] else 0
+        item['bytes'] += entry['size']
+
+    if not summary:
+        print("📊 缓存目录为空")
+        return 0
+    print(f"{'前缀':<28}{'条目':>8}{'有效':>8}{'过期':>8}{'字节':>12}")
+    for prefix, item in sorted(summary.items()):
+        print(f"{prefix:<28}{item['entries']:>8}{item['valid']:>8}"
+              f"{item['entries'] - item['valid']:>8}{item['bytes']:>12}")
+    return 0
+
+
+def cmd_list(args) -> int:
+    """列出缓存项"""
+    entries = W2FileCache.list_keys(args.prefix)
+    for entry in entries:
+        status = '✅' if entry['valid'] else '⌛'
+        print(f"{status} {entry['key']}  {entry['size']}B  更新: {_format_time(entry['update_time'])}  "
+              f"过期: {_format_time(entry['expires_at']) if entry['timeout'] else '永不'}")
+    print(f"📊 共 {len(entries)} 项")
+    return 0
+
+
+def cmd_inspect(args) -> int:
+    """查看单个缓存项"""
+    info = W2FileCache.inspect_key(args.key)
+    if info is None:
+        print(f"❌ 缓存项不存在: {args.key}")
+        return 1
+    print(json.dumps(info, ensure_ascii=False, indent=2))
+    return 0
+
+
+def cmd_invalidate(args) -> int:
+    """按前缀删除缓存项"""
+    if not args.prefix and not args.all:
+        print("❌ 错误: 请指定前缀，或使用 --all 清空全部缓存")
+        return 1
+    deleted = W2FileCache.invalidate(args.prefix or '')
+    print(f"🧹 已删除 {deleted} 个缓存项")
+    return 0
+
+
+def cmd_namespaces(args) -> int:
+    """列出缓存命名空间"""
+    for ns in CACHE_NAMESPACES.values():
+        info = ns.info()
+        print(f"🗂️  {info['name']:<12} 版本 v{info['version']}  代数 g{info['generation']}")
+    return 0
+
+
+def cmd_bump(args) -> int:
+    """递增命名空间代数，使其下所有缓存项失效"""
+    ns = CACHE_NAMESPACES.get(args.namespace)
+    if ns is None:
+        print(f"❌ 未知命名空间: {args.namespace} (可选: {', '.join(CACHE_NAMESPACES)})")
+        return 1
+    print(f"🔄 {ns.name} 已递增到代数 g{ns.bump()}")
+    if args.purge:
+        print(f"🧹 已删除 {ns.purge()} 个旧代数缓存项")
+    return 0
+
+
+def cmd_purge(args) -> int:
+    """删除各命名空间中旧版本 / 旧代数的缓存项"""
+    total = sum(ns.purge() for ns in CACHE_NAMESPACES.values())
+    print(f"🧹 已删除 {total} 个旧缓存项")
+    return 0
+
+
+def main():
+    """命令行主函数"""
+    parser = argparse.ArgumentParser(description='缓存管理工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    stats_parser = subparsers.add_parser('stats', help='缓存统计')
+    stats_parser.add_argument('--live', metavar='URL', help='从运行中的 API 读取命中统计 (如 http://localhost:8000)')
+    stats_parser.add_argument('--token', help='API 访问令牌')
+    stats_parser.set_defaults(func=cmd_stats)
+
+    list_parser = subparsers.add_parser('list', help='列出缓存项')
+    list_parser.add_argument('prefix', nargs='?', default='', help='键前缀')
+    list_parser.set_defaults(func=cmd_list)
+
+    inspect_parser = subparsers.add_parser('inspect', help='查看缓存项')
+    inspect_parser.add_argument('key', help='缓存键')
+    inspect_parser.set_defaults(func=cmd_inspect)
+
+    invalidate_parser = subparsers.add_parser('invalidate', help='按前缀删除缓存项')
+    invalidate_parser.add_argument('prefix', nargs='?', default='', help='键前缀')
+    invalidate_parser.add_argument('--all', action='store_true', help='删除全部缓存项')
+    invalidate_parser.set_defaults(func=cmd_invalidate)
+
+    namespaces_parser = subparsers.add_parser('namespaces', help='列出缓存命名空间')
+    namespaces_parser.set_defaults(func=cmd_namespaces)
+
+    bump_parser = subparsers.add_parser('bump', help='使整个命名空间失效')
+    bump_parser.add_argument('namespace', help='命名空间名称')
+    bump_parser.add_argument('--purge', action='store_true', help='同时删除旧代数的缓存文件')
+    bump_parser.set_defaults(func=cmd_bump)
+
+    purge_parser = subparsers.add_parser('purge', help='删除旧版本 / 旧代数的缓存项')
+    purge_parser.set_defaults(func=cmd_purge)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == '__main__':
+    main()
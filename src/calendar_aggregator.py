@@ -0,0 +1,120 @@
+"""
+Calendar aggregation
+Fetch events from several CalDAV sources at once and merge them into one time-ordered stream
+"""
+
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import config
+import metrics
+import tracing
+from clients.caldav_utils import event_timestamp
+
+if TYPE_CHECKING:
+    from clients.caldav_core import CalDAVClient
+
+
+def _accounts() -> Dict[str, Tuple[Optional[str], Optional[str], Optional[str]]]:
+    """(username, password, caldav_url) per source, read from config at call time"""
+    return {
+        'dingtalk': (config.DINGTALK_CALDAV_USER, config.DINGTALK_CALDAV_PASS, None),
+        'icloud': (config.ICLOUD_CALDAV_USER, config.ICLOUD_CALDAV_PASS, config.ICLOUD_CALDAV_URL),
+        'google': (config.GOOGLE_CALDAV_USER, config.GOOGLE_CALDAV_PASS, config.GOOGLE_CALDAV_URL),
+    }
+
+
+def parse_sources(value: Optional[str]) -> List[str]:
+    """'dingtalk, icloud' -> ['dingtalk', 'icloud']; unknown names are skipped"""
+    sources = []
+    for name in (value or '').split(','):
+        name = name.strip().lower()
+        if not name or name in sources:
+            continue
+        if name not in _accounts():
+            print(f"Unknown calendar source: {name}")
+            continue
+        sources.append(name)
+    return sources
+
+
+def get_client(source: str) -> Optional['CalDAVClient']:
+    """Pooled CalDAV client for a configured source, None if it has no account"""
+    # Imported on first use: reads served from the event store never load requests or the clients
+    from clients.caldav_core import CLIENT_POOL, PROFILES
+
+    username, password, caldav_url = _accounts()[source]
+    if not username or not password or (PROFILES[source].base_url is None and not caldav_url):
+        return None
+    return CLIENT_POOL.get(source, username, password, caldav_url,
+                           incremental_sync=config.CALDAV_INCREMENTAL_SYNC,
+                           max_workers=config.CALDAV_MAX_CONCURRENCY,
+                           timeout=config.CALDAV_TIMEOUT,
+                           discovery_ttl=config.CALDAV_DISCOVERY_TTL)
+
+
+def default_window() -> Tuple[str, str]:
+    """-2 hours to +2 days, the window the PHP version showed"""
+    now = datetime.now()
+    return ((now - timedelta(hours=2)).strftime('%Y-%m-%d %H:%M:%S'),
+            (now + timedelta(days=2)).strftime('%Y-%m-%d %H:%M:%S'))
+
+
+def fetch_source(source: str, start: str, end: str) -> List[Dict[str, Any]]:
+    """Sorted events of one source; an unconfigured or failing source yields none"""
+    try:
+        client = get_client(source)
+        if client is None:
+            return []
+        with tracing.span('caldav.source', **{'caldav.source': source}):
+            events = client.get_all_events(start, end)
+    except Exception as e:
+        print(f"Error getting {source} events: {e}")
+        metrics.upstream_error('caldav', e)
+        return []
+    for m in client.last_fetch_metrics:
+        if m['error']:
+            metrics.upstream_error('caldav', f"{m['displayname']}: {m['error']}")
+    for event in events:
+        event['SOURCE'] = source
+    return events
+
+
+def merge_events(streams: Iterable[Iterable[Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
+    """k-way merge of start-sorted event streams, dropping duplicates
+
+    Two events are the same when UID (or SUMMARY without one) and start
+    time match, e.g. a meeting invite present in two accounts. Streams are
+    merged in time order, so only keys at the current start time are kept.
+    """
+    current = None
+    seen = set()
+    for event in heapq.merge(*streams, key=lambda e: event_timestamp(e) or 0):
+        timestamp = event_timestamp(event)
+        if timestamp != current:
+            current, seen = timestamp, set()
+        key = event.get('UID') or event.get('SUMMARY')
+        if key is not None:
+            if key in seen:
+                continue
+            seen.add(key)
+        yield event
+
+
+def aggregate_events(sources: List[str], start: Optional[str] = None,
+                     end: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Fetch all sources concurrently and return one ordered, de-duplicated iterator
+
+    Total latency is that of the slowest source.
+    """
+    if not start or not end:
+        start, end = default_window()
+    if not sources:
+        return iter(())
+    if len(sources) == 1:
+        return merge_events([fetch_source(sources[0], start, end)])
+    with ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix='calendar-source') as executor:
+        streams = list(executor.map(tracing.propagate(lambda source: fetch_source(source, start, end)), sources))
+    return merge_events(streams)
@@ -0,0 +1,428 @@
+import hashlib
+import threading
+import time
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, List, Dict, Any, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+import requests
+
+from clients.caldav_sync import CalDAVSyncEngine
+from clients.ical_engine import parse_ical
+from clients.caldav_utils import (
+    TIME_RANGE_REJECTED_STATUS, CALENDAR_GONE_STATUS, STREAM_CHUNK_SIZE, CalendarGone, check_cancelled,
+    iter_multistatus, to_caldav_utc, filter_events_by_window, sort_events, fetch_all_calendars
+)
+import tracing
+from utils import W2FileCache, CALDAV_CACHE
+
+
+@dataclass(frozen=True)
+class CalDAVProfile:
+    """What differs between CalDAV providers"""
+    name: str
+    # Fixed server URL; None when the account supplies its own caldav_url
+    base_url: Optional[str] = None
+    # Calendar home below base_url, formatted with the username; None means base_url itself
+    home_set: Optional[str] = None
+    # Depth header on the discovery PROPFIND; None leaves it to the server default
+    propfind_depth: Optional[str] = '1'
+    # Only keep responses whose resourcetype includes <C:calendar/>
+    calendars_only: bool = True
+    # Collections that are listed but never hold events
+    skip_displaynames: Tuple[str, ...] = ()
+    # Window used by get_all_events when the caller gives none; None fetches everything
+    default_window_days: Optional[int] = None
+
+
+DINGTALK_PROFILE = CalDAVProfile(
+    name='dingtalk',
+    base_url='https://calendar.dingtalk.com',
+    home_set='/dav/{username}/',
+    propfind_depth=None,
+    calendars_only=False,
+    skip_displaynames=('Outbox', 'Inbox', 'Notifications'),
+)
+ICLOUD_PROFILE = CalDAVProfile(name='icloud', default_window_days=7)
+GOOGLE_PROFILE = CalDAVProfile(name='google', default_window_days=7)
+
+PROFILES = {p.name: p for p in (DINGTALK_PROFILE, ICLOUD_PROFILE, GOOGLE_PROFILE)}
+
+NAMESPACES = {
+    'd': 'DAV:',
+    'c': 'urn:ietf:params:xml:ns:caldav',
+    'cs': 'http://calendarserver.org/ns/'
+}
+
+# Properties read on discovery, and the subset needed to check ctags before each sync
+DISCOVERY_PROPS = ('<d:resourcetype />', '<d:displayname />', '<c:supported-calendar-component-set />',
+                   '<cs:getctag />')
+CTAG_PROPS = ('<d:resourcetype />', '<d:displayname />', '<cs:getctag />')
+
+
+class _TracedSession(requests.Session):
+    """Session opening a tracing span per request (streamed bodies are read after the span ends)"""
+
+    def request(self, method, url, *args, **kwargs):
+        with tracing.span(f'HTTP {method}', **{'http.method': method, 'http.url': url}) as span:
+            response = super().request(method, url, *args, **kwargs)
+            span.set_attribute('http.status_code', response.status_code)
+            return response
+
+
+class CalDAVClient:
+    """CalDAV client shared by all providers
+
+    Calendars are discovered lazily on first use and the result is kept for
+    discovery_ttl seconds, in memory and in the caldav cache namespace. A
+    reused result is checked against a light Depth: 1 PROPFIND on every
+    fetch, so calendars added or removed since show up at once. A calendar
+    that has since disappeared (404/410) triggers a new discovery.
+    """
+
+    def __init__(self, profile: CalDAVProfile, username: str, password: str,
+                 caldav_url: Optional[str] = None, incremental_sync: bool = True,
+                 max_workers: int = 4, timeout: int = 30, discovery_ttl: int = 3600):
+        base_url = caldav_url or profile.base_url
+        if not base_url:
+            raise ValueError(f"CalDAV URL is required for {profile.name}")
+        self.profile = profile
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.calendar_home_set = profile.home_set.format(username=username) if profile.home_set else None
+        self.session = _TracedSession()
+        self.session.auth = (username, password)
+        self.session.headers.update({
+            'User-Agent': 'Python Enhanced CalDAV Client/1.0'
+        })
+        # Calendars are fetched concurrently over this session (see get_all_events)
+        self.max_workers = max_workers
+        self.timeout = timeout
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(max_workers, 1))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.last_fetch_metrics: List[Dict[str, Any]] = []
+        self.calendar_paths = []
+        self.discovery_ttl = discovery_ttl
+        self._discovered_at = 0.0
+        self._discovery_lock = threading.Lock()
+        # Cleared when the server rejects <C:time-range>; we then filter locally
+        self.time_range_supported = True
+        # Incremental sync keeps a local copy of each calendar (see caldav_sync)
+        self.sync_engine = CalDAVSyncEngine(self, timeout=timeout,
+                                            account=f'{profile.name}_{username}') if incremental_sync else None
+
+    @property
+    def discovery_url(self) -> str:
+        return self.base_url + self.calendar_home_set if self.calendar_home_set else self.base_url
+
+    def _discovery_expired(self) -> bool:
+        return not self.calendar_paths or time.time() - self._discovered_at > self.discovery_ttl
+
+    def _discovery_key(self) -> str:
+        digest = hashlib.sha1(f"{self.username}|{self.discovery_url}".encode('utf-8')).hexdigest()[:20]
+        return CALDAV_CACHE.key('calendars', digest)
+
+    def discover_calendars(self, force: bool = False) -> List[Dict[str, str]]:
+        """Discover available calendars, reusing the last result until it expires"""
+        if not force and not self._discovery_expired():
+            return self.calendar_paths
+
+        with self._discovery_lock:
+            # Another thread may have discovered while we waited
+            if not force and not self._discovery_expired():
+                return self.calendar_paths
+
+            if not force:
+                cached = W2FileCache.get_cache(self._discovery_key())
+                if cached and cached.get('calendars'):
+                    self.calendar_paths = cached['calendars']
+                    self._discovered_at = cached['discovered_at']
+                    return self.calendar_paths
+
+            self._remember_calendars(self._propfind_calendars())
+            return self.calendar_paths
+
+    def _remember_calendars(self, calendars: List[Dict[str, str]]) -> None:
+        """Keep a complete calendar listing as the discovery result (call with _discovery_lock held)"""
+        self.calendar_paths = calendars
+        self._discovered_at = time.time()
+        W2FileCache.set_cache(self._discovery_key(), {
+            'calendars': self.calendar_paths,
+            'discovered_at': self._discovered_at,
+        }, self.discovery_ttl)
+
+    def _propfind_calendars(self, props: Tuple[str, ...] = DISCOVERY_PROPS) -> List[Dict[str, str]]:
+        prop_xml = '\n    '.join(props)
+        propfind_xml = f'''<?xml version="1.0" encoding="utf-8" ?>
+<d:propfind xmlns:d="DAV:" xmlns:c="urn:ietf:params:xml:ns:caldav" xmlns:cs="http://calendarserver.org/ns/">
+  <d:prop>
+    {prop_xml}
+  </d:prop>
+</d:propfind>'''
+
+        headers = {'Content-Type': 'application/xml; charset=utf-8'}
+        if self.profile.propfind_depth is not None:
+            headers['Depth'] = self.profile.propfind_depth
+
+        try:
+            response = self.session.request(
+                'PROPFIND',
+                self.discovery_url,
+                data=propfind_xml.encode('utf-8'),
+                headers=headers,
+                timeout=self.timeout
+            )
+
+            if response.status_code != 207:
+                raise Exception(f"Failed to get calendar list, HTTP status code: {response.status_code}")
+
+            return self._parse_calendars(response.text)
+
+        except requests.RequestException as e:
+            raise Exception(f"Network error while discovering calendars: {str(e)}")
+
+    def _parse_calendars(self, response_text: str) -> List[Dict[str, str]]:
+        """Parse calendar discovery response"""
+        try:
+            root = ET.fromstring(response_text)
+        except ET.ParseError as e:
+            raise Exception(f"Failed to parse calendar discovery response: {str(e)}")
+
+        home = urlparse(self.discovery_url).path.rstrip('/')
+        calendars = []
+        for response in root.findall('.//d:response', NAMESPACES):
+            href_elem = response.find('./d:href', NAMESPACES)
+            if href_elem is None or not href_elem.text:
+                continue
+
+            href = href_elem.text
+
+            # Skip the calendar home set itself
+            if urlparse(href).path.rstrip('/') == home:
+                continue
+
+            if self.profile.calendars_only:
+                resourcetype_elem = response.find('./d:propstat/d:prop/d:resourcetype', NAMESPACES)
+                if resourcetype_elem is None or resourcetype_elem.find('./c:calendar', NAMESPACES) is None:
+                    continue
+
+            displayname_elem = response.find('./d:propstat/d:prop/d:displayname', NAMESPACES)
+            ctag_elem = response.find('.//cs:getctag', NAMESPACES)
+
+            displayname = 'Unnamed Calendar'
+            if displayname_elem is not None and displayname_elem.text:
+                displayname = displayname_elem.text
+                if displayname in self.profile.skip_displaynames:
+                    continue
+
+            calendars.append({
+                'href': href,
+                'displayname': displayname,
+                'ctag': ctag_elem.text if ctag_elem is not None else None
+            })
+
+        return calendars
+
+    def get_events(self, calendar_path: str, start: Optional[str] = None, end: Optional[str] = None,
+                   cancelled: Optional[threading.Event] = None) -> List[Dict[str, Any]]:
+        """Get events from a specific calendar, limited to [start, end] when both are given
+
+        Setting cancelled stops reading the response (FetchCancelled) and closes it.
+        """
+        # hrefs are absolute paths (or full URLs) even when caldav_url has a path of its own
+        url = urljoin(self.base_url + '/', calendar_path)
+
+        # Let the server filter by time (times in UTC per RFC 4791) unless it rejected that before
+        use_time_range = bool(start and end) and self.time_range_supported
+        time_filter = ''
+        if use_time_range:
+            time_filter = f'<C:time-range start="{to_caldav_utc(start)}" end="{to_caldav_utc(end)}"/>'
+
+        calendar_query_xml = f'''<?xml version="1.0" encoding="utf-8"?>
+<C:calendar-query xmlns:D="DAV:" xmlns:C="urn:ietf:params:xml:ns:caldav">
+  <D:prop>
+    <D:getetag/>
+    <C:calendar-data/>
+  </D:prop>
+  <C:filter>
+    <C:comp-filter name="VCALENDAR">
+      <C:comp-filter name="VEVENT">
+        {time_filter}
+      </C:comp-filter>
+    </C:comp-filter>
+  </C:filter>
+</C:calendar-query>'''
+
+        try:
+            with self.session.request(
+                'REPORT',
+                url,
+                data=calendar_query_xml.encode('utf-8'),
+                headers={
+                    'Content-Type': 'application/xml; charset=utf-8',
+                    'Depth': '1'
+                },
+                timeout=self.timeout,
+                stream=True
+            ) as response:
+
+                if response.status_code in CALENDAR_GONE_STATUS:
+                    raise CalendarGone(url)
+
+                if use_time_range and response.status_code in TIME_RANGE_REJECTED_STATUS:
+                    # Server does not support the filter: fetch everything and filter client-side
+                    print(f"CalDAV server rejected time-range filter (HTTP {response.status_code}), filtering locally")
+                    self.time_range_supported = False
+                    return self.get_events(calendar_path, start, end, cancelled)
+
+                if response.status_code != 207:
+                    return [{"SUMMARY": f"REPORT request failed, HTTP status code: {response.status_code}"}]
+
+                # Even after a server-side time-range, recurring masters still need expanding
+                window = (start, end) if start and end else None
+                return list(self._iter_events(response.iter_content(STREAM_CHUNK_SIZE), window, cancelled))
+
+        except requests.RequestException as e:
+            raise Exception(f"Network error while getting events: {str(e)}")
+
+    def _iter_events(self, chunks: Iterable[bytes], window: Optional[Tuple[str, str]] = None,
+                     cancelled: Optional[threading.Event] = None) -> Iterator[Dict[str, Any]]:
+        """Parse events from a streamed calendar response, one <D:response> at a time
+
+        With a window, each resource is expanded to its instances inside it and
+        everything else is dropped as it is parsed, so a full-calendar
+        download never holds more than the matching events.
+        """
+        try:
+            for response in iter_multistatus(chunks):
+                check_cancelled(cancelled)
+                calendar_data_elem = response.find('.//c:calendar-data', NAMESPACES)
+                if calendar_data_elem is None or not calendar_data_elem.text:
+                    continue
+                events = self._parse_ical(calendar_data_elem.text)
+                if window:
+                    events = filter_events_by_window(events, *window)
+                yield from events
+
+        except ET.ParseError as e:
+            raise Exception(f"Failed to parse events response: {str(e)}")
+
+    def _parse_ical(self, ical_data: str) -> List[Dict[str, Any]]:
+        """Parse iCalendar data (see clients.ical_engine)"""
+        return parse_ical(ical_data)
+
+    def get_all_events(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get all events from all calendars, sorted by start time"""
+        if not (start and end) and self.profile.default_window_days:
+            start_time = datetime.strptime(start, '%Y-%m-%d %H:%M:%S') if start else datetime.now()
+            end_time = datetime.strptime(end, '%Y-%m-%d %H:%M:%S') if end else \
+                start_time + timedelta(days=self.profile.default_window_days)
+            start = start_time.strftime('%Y-%m-%d %H:%M:%S')
+            end = end_time.strftime('%Y-%m-%d %H:%M:%S')
+
+        started = time.time()
+        calendars = self.discover_calendars()
+        trust_ctag = True
+        if self._discovered_at < started:
+            # Discovery was reused: check its calendars and read the current ctags
+            calendars, trust_ctag = self._revalidate(calendars)
+        events, gone = self._fetch_calendars(calendars, start, end, trust_ctag)
+
+        if gone:
+            # Calendars were deleted or moved since discovery: rediscover and retry once
+            print(f"CalDAV calendars no longer found ({', '.join(gone)}), rediscovering")
+            calendars = self.discover_calendars(force=True)
+            events, _ = self._fetch_calendars(calendars, start, end, True)
+
+        return sort_events(events)
+
+    def _revalidate(self, calendars: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], bool]:
+        """Current calendars from a Depth: 1 PROPFIND on the home, and whether their ctags can be trusted
+
+        One small request lets every unchanged calendar skip its REPORT, and
+        replaces the cached discovery when calendars or their ctags changed.
+        If it fails, the cached calendars are synced without the ctag shortcut.
+        """
+        try:
+            current = self._propfind_calendars(CTAG_PROPS)
+        except Exception as e:
+            print(f"CalDAV calendar check failed ({e}), using the cached calendar list")
+            return calendars, False
+        if [(c['href'], c['ctag']) for c in current] != [(c['href'], c.get('ctag')) for c in calendars]:
+            with self._discovery_lock:
+                self._remember_calendars(current)
+        return current, True
+
+    def _fetch_calendars(self, calendars: List[Dict[str, Any]], start: Optional[str], end: Optional[str],
+                         trust_ctag: bool) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """Events of all calendars plus the hrefs that turned out to be gone
+
+        trust_ctag is True only when the calendars' ctags were read during this
+        call; a ctag read earlier says nothing about changes since.
+        """
+        gone = []
+
+        def fetch(calendar: Dict[str, Any], cancelled: threading.Event) -> List[Dict[str, Any]]:
+            try:
+                if self.sync_engine:
+                    # The synced copy may reach beyond the window, filter to it locally
+                    calendar_events = self.sync_engine.sync(calendar, trust_ctag, start, end, cancelled)
+                    if start and end:
+                        calendar_events = filter_events_by_window(calendar_events, start, end)
+                    return calendar_events
+                return self.get_events(calendar['href'], start, end, cancelled)
+            except CalendarGone:
+                # After the deadline the caller has moved on, gone is no longer ours to change
+                check_cancelled(cancelled)
+                gone.append(calendar['href'])
+                return []
+
+        # One REPORT per calendar, run concurrently; a failing or overdue calendar yields no events
+        events, self.last_fetch_metrics = fetch_all_calendars(calendars, fetch, self.max_workers, self.timeout)
+        return events, gone
+
+    def close(self) -> None:
+        """Close the session"""
+        self.session.close()
+
+
+class CalDAVClientPool:
+    """Long-lived CalDAV clients keyed by account
+
+    Reusing a client keeps its HTTP connections (no new TLS handshake per
+    render) and its discovered calendars.
+    """
+
+    def __init__(self):
+        self._clients: Dict[Tuple[str, str, str], CalDAVClient] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider: str, username: str, password: str,
+            caldav_url: Optional[str] = None, **options) -> CalDAVClient:
+        """Return the pooled client for an account, creating it on first use"""
+        profile = PROFILES[provider]
+        key = (profile.name, (caldav_url or profile.base_url or '').rstrip('/'), username)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None and client.password != password:
+                # Credentials changed: drop the old session
+                client.close()
+                client = None
+            if client is None:
+                client = CalDAVClient(profile, username, password, caldav_url, **options)
+                self._clients[key] = client
+            return client
+
+    def close_all(self) -> None:
+        """Close every pooled client"""
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+
+CLIENT_POOL = CalDAVClientPool()
@@ -0,0 +1,353 @@
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from typing import Iterator, List, Dict, Any, Optional, Tuple
+import xml.etree.ElementTree as ET
+from urllib.parse import urljoin
+from xml.sax.saxutils import escape
+
+import requests
+
+from clients.caldav_utils import (
+    TIME_RANGE_REJECTED_STATUS, CALENDAR_GONE_STATUS, STREAM_CHUNK_SIZE, CalendarGone, FetchCancelled,
+    check_cancelled, iter_multistatus, to_caldav_utc
+)
+from utils import W2FileCache, CALDAV_CACHE
+
+
+NAMESPACES = {'d': 'DAV:', 'c': 'urn:ietf:params:xml:ns:caldav'}
+RESPONSE_TAG = '{DAV:}response'
+SYNC_TOKEN_TAG = '{DAV:}sync-token'
+# Statuses that mean the collection has no sync-collection REPORT at all
+SYNC_UNSUPPORTED_STATUS = (403, 405, 501)
+
+
+class SyncTokenInvalid(Exception):
+    """The server no longer accepts our sync-token (RFC 6578 valid-sync-token)"""
+
+
+class SyncNotSupported(Exception):
+    """The collection does not support the sync-collection REPORT"""
+
+
+class SyncUnavailable(Exception):
+    """sync-collection failed for now (auth, rate limit, server error, network); retry next run"""
+
+
+class CalDAVSyncEngine:
+    """Incremental sync of calendar collections into the local event cache
+
+    For each calendar the engine keeps ``{ctag, sync_token, window, resources}``
+    in the caldav cache namespace, where resources maps each event href to its
+    ETag and parsed events, and window is the time range they cover (None for
+    the whole calendar). A sync then costs, in order of preference:
+
+    1. nothing, when the calendar's ctag from discovery is unchanged;
+    2. one RFC 6578 sync-collection REPORT listing changed/removed hrefs;
+    3. one calendar-query REPORT for ETags only (with a <C:time-range> when
+       syncing a window), diffed against the cache,
+
+    followed by a calendar-multiget for the changed hrefs only. sync-collection
+    has no time filter and would name changes anywhere in the calendar, so it
+    only serves whole-calendar copies; a windowed copy is kept by the
+    time-range listing, which stays as small as the window.
+    """
+
+    MULTIGET_BATCH = 100
+    # A windowed copy covers this much beyond the requested end, so a sliding window is re-listed rarely
+    WINDOW_MARGIN = timedelta(days=7)
+
+    def __init__(self, client, account: str, timeout: int = 30):
+        self.client = client
+        self.account = account
+        self.timeout = timeout
+        # href -> how the last sync was served ('ctag', 'sync-collection', 'etag-diff')
+        self.last_mode: Dict[str, str] = {}
+
+    def _url(self, path: str) -> str:
+        return urljoin(self.client.base_url + '/', path)
+
+    def _state_key(self, calendar_href: str) -> str:
+        digest = hashlib.sha1(f"{self.account}|{self._url(calendar_href)}".encode('utf-8')).hexdigest()[:20]
+        return CALDAV_CACHE.key('sync', digest)
+
+    def _report(self, url: str, body: str, depth: str = '1') -> requests.Response:
+        """Send a REPORT; the body is streamed, so use the response as a context manager"""
+        try:
+            response = self.client.session.request(
+                'REPORT',
+                url,
+                data=body.encode('utf-8'),
+                headers={
+                    'Content-Type': 'application/xml; charset=utf-8',
+                    'Depth': depth
+                },
+                timeout=self.timeout,
+                stream=True
+            )
+        except requests.RequestException as e:
+            raise Exception(f"Network error while syncing calendar: {str(e)}")
+        if response.status_code in CALENDAR_GONE_STATUS:
+            response.close()
+            raise CalendarGone(url)
+        return response
+
+    @staticmethod
+    def _iter_multistatus(response: requests.Response,
+                          cancelled: Optional[threading.Event] = None) -> Iterator[ET.Element]:
+        """Top-level elements of a streamed multistatus body, see iter_multistatus
+
+        Stops with FetchCancelled once cancelled is set; the caller's with-block then closes the response.
+        """
+        try:
+            for elem in iter_multistatus(response.iter_content(STREAM_CHUNK_SIZE)):
+                check_cancelled(cancelled)
+                yield elem
+        except ET.ParseError as e:
+            raise Exception(f"Failed to parse sync response: {str(e)}")
+        except requests.RequestException as e:
+            raise Exception(f"Network error while syncing calendar: {str(e)}")
+
+    @staticmethod
+    def _response_item(response: ET.Element) -> Optional[Tuple[str, Optional[str], Optional[str], str]]:
+        """(href, etag, calendar-data, status) of one <D:response>, None without an href"""
+        href_elem = response.find('./d:href', NAMESPACES)
+        if href_elem is None or not href_elem.text:
+            return None
+        etag_elem = response.find('.//d:getetag', NAMESPACES)
+        data_elem = response.find('.//c:calendar-data', NAMESPACES)
+        status_elem = response.find('./d:status', NAMESPACES)
+        if status_elem is None:
+            status_elem = response.find('./d:propstat/d:status', NAMESPACES)
+        return (
+            href_elem.text,
+            etag_elem.text if etag_elem is not None else None,
+            data_elem.text if data_elem is not None else None,
+            status_elem.text if status_elem is not None and status_elem.text else '',
+        )
+
+    def _iter_items(self, response: requests.Response,
+                    cancelled: Optional[threading.Event] = None) -> Iterator[Tuple[str, Optional[str], Optional[str], str]]:
+        for elem in self._iter_multistatus(response, cancelled):
+            item = self._response_item(elem) if elem.tag == RESPONSE_TAG else None
+            if item:
+                yield item
+
+    def _sync_collection(self, calendar_href: str, sync_token: str, cancelled: Optional[threading.Event] = None
+                         ) -> Tuple[Dict[str, str], List[str], Optional[str]]:
+        """Run sync-collection, returning ({changed href: etag}, [removed hrefs], new token)"""
+        token_xml = f'<d:sync-token>{escape(sync_token)}</d:sync-token>' if sync_token else '<d:sync-token/>'
+        body = f'''<?xml version="1.0" encoding="utf-8" ?>
+<d:sync-collection xmlns:d="DAV:">
+  {token_xml}
+  <d:sync-level>1</d:sync-level>
+  <d:prop>
+    <d:getetag/>
+  </d:prop>
+</d:sync-collection>'''
+        # RFC 6578 requires Depth: 0 on the sync-collection REPORT
+        try:
+            with self._report(self._url(calendar_href), body, depth='0') as response:
+                if response.status_code != 207:
+                    self._sync_error(response, sync_token)
+
+                changed, removed, token = {}, [], None
+                for elem in self._iter_multistatus(response, cancelled):
+                    if elem.tag == SYNC_TOKEN_TAG:
+                        token = elem.text
+                        continue
+                    item = self._response_item(elem) if elem.tag == RESPONSE_TAG else None
+                    if not item:
+                        continue
+                    href, etag, _, status = item
+                    if ' 404' in status or ' 410' in status:
+                        removed.append(href)
+                    elif etag:
+                        changed[href] = etag
+        except (CalendarGone, FetchCancelled, SyncTokenInvalid, SyncNotSupported, SyncUnavailable):
+            raise
+        except Exception as e:
+            # Network error or a truncated body: nothing learned about the server's support
+            raise SyncUnavailable(str(e)) from e
+
+        if not token:
+            raise SyncNotSupported()
+        return changed, removed, token
+
+    @staticmethod
+    def _sync_error(response: requests.Response, sync_token: str) -> None:
+        """Raise the exception matching a non-207 sync-collection response
+
+        Only an explicit refusal marks the collection unsupported; anything
+        else (401, 429, 5xx, ...) is transient and leaves the sync state alone.
+        """
+        status = response.status_code
+        text = response.text if status < 500 else ''
+        if 'valid-sync-token' in text:
+            # An initial sync has no token to reject, so the report itself is refused
+            raise SyncTokenInvalid() if sync_token else SyncNotSupported()
+        if status in SYNC_UNSUPPORTED_STATUS or 'supported-report' in text:
+            raise SyncNotSupported()
+        raise SyncUnavailable(f"HTTP {status}")
+
+    def _list_etags(self, calendar_href: str, window: Optional[List[str]] = None,
+                    cancelled: Optional[threading.Event] = None) -> Tuple[Dict[str, str], Optional[List[str]]]:
+        """ETags of the event resources overlapping window (all of them without one)
+
+        Returns the ETags and the window actually applied, which is None when
+        the server rejects <C:time-range> and everything had to be listed.
+        """
+        use_time_range = bool(window) and self.client.time_range_supported
+        time_filter = ''
+        if use_time_range:
+            time_filter = f'<C:time-range start="{to_caldav_utc(window[0])}" end="{to_caldav_utc(window[1])}"/>'
+        body = f'''<?xml version="1.0" encoding="utf-8"?>
+<C:calendar-query xmlns:D="DAV:" xmlns:C="urn:ietf:params:xml:ns:caldav">
+  <D:prop>
+    <D:getetag/>
+  </D:prop>
+  <C:filter>
+    <C:comp-filter name="VCALENDAR">
+      <C:comp-filter name="VEVENT">
+        {time_filter}
+      </C:comp-filter>
+    </C:comp-filter>
+  </C:filter>
+</C:calendar-query>'''
+        with self._report(self._url(calendar_href), body) as response:
+            if use_time_range and response.status_code in TIME_RANGE_REJECTED_STATUS:
+                print(f"CalDAV server rejected time-range filter (HTTP {response.status_code}), syncing everything")
+                self.client.time_range_supported = False
+                return self._list_etags(calendar_href, cancelled=cancelled)
+            if response.status_code != 207:
+                raise Exception(f"REPORT request failed, HTTP status code: {response.status_code}")
+            etags = {href: etag for href, etag, _, _ in self._iter_items(response, cancelled) if etag}
+        return etags, window if use_time_range else None
+
+    def _multiget(self, calendar_href: str, hrefs: List[str], cancelled: Optional[threading.Event] = None
+                  ) -> Dict[str, Tuple[Optional[str], List[Dict[str, Any]]]]:
+        """Fetch and parse the given event hrefs, {href: (etag, events)}"""
+        fetched = {}
+        for i in range(0, len(hrefs), self.MULTIGET_BATCH):
+            href_xml = ''.join(f'<D:href>{escape(href)}</D:href>' for href in hrefs[i:i + self.MULTIGET_BATCH])
+            body = f'''<?xml version="1.0" encoding="utf-8"?>
+<C:calendar-multiget xmlns:D="DAV:" xmlns:C="urn:ietf:params:xml:ns:caldav">
+  <D:prop>
+    <D:getetag/>
+    <C:calendar-data/>
+  </D:prop>
+  {href_xml}
+</C:calendar-multiget>'''
+            with self._report(self._url(calendar_href), body) as response:
+                if response.status_code != 207:
+                    raise Exception(f"calendar-multiget failed, HTTP status code: {response.status_code}")
+                # Parse each resource as it arrives so its raw text can be dropped
+                for href, etag, data, _ in self._iter_items(response, cancelled):
+                    if data:
+                        fetched[href] = (etag, self.client._parse_ical(data))
+        return fetched
+
+    def _window(self, start: Optional[str], end: Optional[str]) -> Optional[List[str]]:
+        """[start, end + WINDOW_MARGIN] as local 'YYYY-mm-dd HH:MM:SS' strings, None without a window"""
+        if not (start and end):
+            return None
+        padded = datetime.strptime(end, '%Y-%m-%d %H:%M:%S') + self.WINDOW_MARGIN
+        return [start, padded.strftime('%Y-%m-%d %H:%M:%S')]
+
+    @staticmethod
+    def _covers(cached: Optional[List[str]], start: Optional[str], end: Optional[str]) -> bool:
+        """Whether a copy of the cached window holds everything in [start, end]"""
+        if cached is None:
+            return True
+        return bool(start and end) and cached[0] <= start and end <= cached[1]
+
+    def sync(self, calendar: Dict[str, Any], trust_ctag: bool = True,
+             start: Optional[str] = None, end: Optional[str] = None,
+             cancelled: Optional[threading.Event] = None) -> List[Dict[str, Any]]:
+        """Bring the cached copy of a calendar up to date and return its events
+
+        With start and end (local 'YYYY-mm-dd HH:MM:SS'), only resources
+        overlapping that window need to be cached; the events returned may
+        still reach beyond it, so filter them. Pass trust_ctag=False when the
+        calendar's ctag was not read just now (e.g. discovery was reused);
+        the ctag shortcut is then skipped. Once cancelled is set the sync
+        stops with FetchCancelled and leaves the cached state untouched.
+        """
+        href = calendar['href']
+        key = self._state_key(href)
+        state = W2FileCache.get_cache(key) or {}
+        resources: Dict[str, Dict[str, Any]] = state.get('resources', {})
+        ctag = calendar.get('ctag')
+        covered = bool(state) and self._covers(state.get('window'), start, end)
+
+        if trust_ctag and covered and ctag and state.get('ctag') == ctag:
+            self.last_mode[href] = 'ctag'
+            return self._flatten(resources)
+
+        # Keep syncing the window already cached, or cache a new one with room to slide
+        window = state.get('window') if covered else self._window(start, end)
+        sync_supported = state.get('sync_supported', True)
+        sync_token = state.get('sync_token') or ''
+        remote: Optional[Dict[str, str]] = None
+        removed: List[str] = []
+        full_listing = not (covered and sync_token)
+
+        # sync-collection has no time filter: without a token it lists the whole calendar,
+        # so a windowed copy is filled from the time-range listing instead
+        if sync_supported and (window is None or not full_listing):
+            try:
+                try:
+                    remote, removed, sync_token = self._sync_collection(href, '' if full_listing else sync_token,
+                                                                          cancelled)
+                except SyncTokenInvalid:
+                    # Token expired on the server: start over with a full listing
+                    full_listing, sync_token = True, ''
+                    if window is None:
+                        remote, removed, sync_token = self._sync_collection(href, sync_token, cancelled)
+                if remote is not None:
+                    self.last_mode[href] = 'sync-collection'
+            except SyncNotSupported:
+                sync_supported, sync_token = False, None
+            except SyncUnavailable as e:
+                # List ETags this time, keep the token and try sync-collection again next run
+                print(f"CalDAV sync-collection unavailable ({e}), listing ETags instead")
+
+        if remote is None:
+            remote, window = self._list_etags(href, window, cancelled)
+            full_listing = True
+            self.last_mode[href] = 'etag-diff'
+
+        if full_listing:
+            # A full listing names every live resource; anything else is gone
+            removed = [h for h in resources if h not in remote]
+        dirty = False
+        for h in removed:
+            dirty |= resources.pop(h, None) is not None
+
+        changed = [h for h, etag in remote.items() if resources.get(h, {}).get('etag') != etag]
+        if changed:
+            for h, (etag, events) in self._multiget(href, changed, cancelled).items():
+                resources[h] = {'etag': etag or remote.get(h), 'events': events}
+                dirty = True
+
+        new_state = {
+            'ctag': ctag,
+            'sync_token': sync_token,
+            'sync_supported': sync_supported,
+            'window': window,
+            'resources': resources,
+        }
+        # Most runs change nothing; skip rewriting the whole calendar then
+        if dirty or any(state.get(field) != new_state[field]
+                        for field in ('ctag', 'sync_token', 'sync_supported', 'window')):
+            # An abandoned sync may finish after a newer one; never let it overwrite that state
+            check_cancelled(cancelled)
+            W2FileCache.set_cache(key, new_state, 0)
+        return self._flatten(resources)
+
+    @staticmethod
+    def _flatten(resources: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        events = []
+        for resource in resources.values():
+            events.extend(dict(event) for event in resource.get('events', []))
+        return events
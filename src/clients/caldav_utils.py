@@ -0,0 +1,180 @@
+import math
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Iterator, List, Dict, Any, Optional, Tuple
+
+import tracing
+from clients.ical_engine import expand_events
+
+
+# Status codes with which servers reject a calendar-query time-range filter
+TIME_RANGE_REJECTED_STATUS = (400, 403, 412, 415, 422, 501)
+# Status codes meaning a calendar collection no longer exists
+CALENDAR_GONE_STATUS = (404, 410)
+
+
+# Bytes read from the socket per step while streaming a multistatus body
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class CalendarGone(Exception):
+    """A calendar href from (possibly cached) discovery no longer exists on the server"""
+
+
+class FetchCancelled(Exception):
+    """The fetch outlived its deadline and was abandoned; it must stop without writing anything"""
+
+
+def check_cancelled(cancelled: Optional[threading.Event]) -> None:
+    """Raise FetchCancelled once fetch_all_calendars has given up on this fetch"""
+    if cancelled is not None and cancelled.is_set():
+        raise FetchCancelled()
+
+
+def iter_multistatus(chunks: Iterable[bytes]) -> Iterator[ET.Element]:
+    """Yield each top-level element of a multistatus body as soon as it is complete
+
+    That is every <D:response> plus trailing elements such as <D:sync-token>.
+    Each element is dropped from the tree once the caller moves on, so peak
+    memory is one response element rather than the whole body and tree.
+    Feed it response.iter_content() of a request made with stream=True.
+    """
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    root = None
+    depth = 0
+
+    def drain() -> Iterator[ET.Element]:
+        nonlocal root, depth
+        for event, elem in parser.read_events():
+            if event == 'start':
+                if root is None:
+                    root = elem
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 1:
+                yield elem
+                root.remove(elem)
+
+    for chunk in chunks:
+        if chunk:
+            parser.feed(chunk)
+            yield from drain()
+    parser.close()
+    yield from drain()
+
+
+def to_caldav_utc(value: str) -> str:
+    """Convert a local 'YYYY-mm-dd HH:MM:SS' time to the UTC form CalDAV expects (RFC 4791 9.9)"""
+    local = datetime.strptime(value, '%Y-%m-%d %H:%M:%S').astimezone()
+    return local.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def event_timestamp(event: Dict[str, Any]) -> Optional[int]:
+    """Start time of a parsed event as a Unix timestamp, or None if unknown"""
+    value = event.get('DTSTART')
+    return value if isinstance(value, int) else None
+
+
+def filter_events_by_window(events: List[Dict[str, Any]], start: str, end: str) -> List[Dict[str, Any]]:
+    """Event instances overlapping [start, end] (local 'YYYY-mm-dd HH:MM:SS' strings)
+
+    Same test as a server-side <C:time-range> (RFC 4791 9.9). Recurring
+    events are expanded to their instances inside the window, which the
+    server never does for us: it returns the whole master.
+    """
+    start_ts = int(datetime.strptime(start, '%Y-%m-%d %H:%M:%S').timestamp())
+    end_ts = int(datetime.strptime(end, '%Y-%m-%d %H:%M:%S').timestamp())
+    return list(expand_events(events, start_ts, end_ts))
+
+
+def sort_events(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Sort events by start time, events without a usable start first"""
+    events.sort(key=lambda event: event_timestamp(event) or 0)
+    return events
+
+
+def _timed_fetch(fetch: Callable[[Dict[str, Any], threading.Event], List[Dict[str, Any]]],
+                 calendar: Dict[str, Any],
+                 cancelled: threading.Event) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    started = time.perf_counter()
+    error = None
+    try:
+        with tracing.span('caldav.calendar', **{'caldav.calendar': calendar.get('displayname') or calendar['href']}) as span:
+            events = fetch(calendar, cancelled)
+            span.set_attribute('caldav.events', len(events))
+    except FetchCancelled:
+        # Already reported as timed out by fetch_all_calendars
+        events, error = [], 'cancelled'
+    except Exception as e:
+        events, error = [], str(e)
+        print(f"Error fetching calendar {calendar.get('displayname') or calendar['href']}: {e}")
+    return events, {
+        'href': calendar['href'],
+        'displayname': calendar.get('displayname'),
+        'seconds': round(time.perf_counter() - started, 3),
+        'events': len(events),
+        'error': error,
+    }
+
+
+def fetch_all_calendars(calendars: List[Dict[str, Any]],
+                        fetch: Callable[[Dict[str, Any], threading.Event], List[Dict[str, Any]]],
+                        max_workers: int = 4,
+                        timeout: Optional[float] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Run fetch(calendar, cancelled) for every calendar with at most max_workers in flight
+
+    Returns (events, metrics) with one metrics entry per calendar (href,
+    displayname, seconds, events, error). A calendar that fails or times
+    out contributes no events instead of failing the whole fetch.
+
+    With a timeout, each round of max_workers calendars gets timeout seconds
+    on top of the socket timeouts; calendars still running when that runs out
+    are recorded as failed and left behind, so a slow server can't hold up
+    the others' results. The cancelled event is then set: a fetch must check
+    it (check_cancelled) before writing any state, as it may finish long
+    after a newer fetch of the same calendar.
+    """
+    if not calendars:
+        return [], []
+    cancelled = threading.Event()
+    if timeout is None and (max_workers <= 1 or len(calendars) == 1):
+        results = [_timed_fetch(fetch, calendar, cancelled) for calendar in calendars]
+    else:
+        workers = max(1, min(max_workers, len(calendars)))
+        started = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='caldav')
+        done = set()
+        try:
+            task = tracing.propagate(lambda calendar: _timed_fetch(fetch, calendar, cancelled))
+            futures = [executor.submit(task, calendar) for calendar in calendars]
+            deadline = timeout * math.ceil(len(calendars) / workers) if timeout is not None else None
+            done = wait(futures, timeout=deadline).done
+        finally:
+            cancelled.set()
+            # Don't wait for calendars past the deadline; queued ones never start
+            executor.shutdown(wait=False, cancel_futures=True)
+        results = []
+        for calendar, future in zip(calendars, futures):
+            if future in done:
+                results.append(future.result())
+                continue
+            name = calendar.get('displayname') or calendar['href']
+            print(f"Error fetching calendar {name}: timed out after {deadline:g}s")
+            results.append(([], {
+                'href': calendar['href'],
+                'displayname': calendar.get('displayname'),
+                'seconds': round(time.perf_counter() - started, 3),
+                'events': 0,
+                'error': f'timed out after {deadline:g}s',
+            }))
+
+    events: List[Dict[str, Any]] = []
+    metrics = []
+    for calendar_events, calendar_metrics in results:
+        events.extend(calendar_events)
+        metrics.append(calendar_metrics)
+    return events, metrics
@@ -0,0 +1,330 @@
+import re
+from datetime import datetime, timedelta, timezone, tzinfo
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from dateutil.rrule import rrulestr, rruleset
+
+
+# A CRLF followed by a space or tab continues the previous line (RFC 5545 3.1)
+_FOLD_RE = re.compile(r'\r?\n[ \t]')
+_DURATION_RE = re.compile(r'([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+_UNTIL_RE = re.compile(r'UNTIL=([0-9TZ]+)', re.IGNORECASE)
+
+TEXT_PROPERTIES = ('SUMMARY', 'LOCATION', 'DESCRIPTION')
+# Only meaningful on a recurring master, not copied to its expanded instances
+RECURRENCE_PROPERTIES = ('RRULE', 'RDATE', 'EXDATE')
+
+# Windows zone names that Exchange-backed servers put in TZID
+WINDOWS_ZONES = {
+    'China Standard Time': 'Asia/Shanghai',
+    'Tokyo Standard Time': 'Asia/Tokyo',
+    'Singapore Standard Time': 'Asia/Singapore',
+    'India Standard Time': 'Asia/Kolkata',
+    'GMT Standard Time': 'Europe/London',
+    'W. Europe Standard Time': 'Europe/Berlin',
+    'Romance Standard Time': 'Europe/Paris',
+    'Eastern Standard Time': 'America/New_York',
+    'Central Standard Time': 'America/Chicago',
+    'Pacific Standard Time': 'America/Los_Angeles',
+    'UTC': 'UTC',
+}
+
+
+@lru_cache(maxsize=256)
+def get_zone(tzid: Optional[str]) -> Optional[tzinfo]:
+    """zoneinfo zone for a TZID parameter, None (local time) when unknown
+
+    Accepts Olson names, common Windows names and vendor prefixed ids such
+    as '/freeassociation.sourceforge.net/Asia/Shanghai'.
+    """
+    if not tzid:
+        return None
+    name = tzid.strip().strip('"')
+    name = WINDOWS_ZONES.get(name, name)
+    parts = name.strip('/').split('/')
+    for candidate in (name, '/'.join(parts[-2:]), parts[-1]):
+        try:
+            return ZoneInfo(candidate)
+        except (ZoneInfoNotFoundError, ValueError):
+            continue
+    return None
+
+
+def _split_line(line: str) -> Tuple[str, Dict[str, str], str]:
+    """'NAME;P1=a;P2="b:c":value' -> ('NAME', {'P1': 'a', 'P2': 'b:c'}, 'value')"""
+    colon = line.find(':')
+    # A colon inside a quoted parameter value does not end the name part
+    while colon != -1 and line.count('"', 0, colon) % 2:
+        colon = line.find(':', colon + 1)
+    if colon == -1:
+        return line.upper(), {}, ''
+    head, value = line[:colon], line[colon + 1:]
+    if ';' not in head:
+        return head.upper(), {}, value
+    parts = head.split(';')
+    params = {}
+    for part in parts[1:]:
+        key, _, param_value = part.partition('=')
+        params[key.upper()] = param_value.strip('"')
+    return parts[0].upper(), params, value
+
+
+def _unescape(value: str) -> str:
+    if '\\' not in value:
+        return value
+    return (value.replace('\\n', '\n').replace('\\N', '\n').replace('\\,', ',')
+            .replace('\\;', ';').replace('\\\\', '\\'))
+
+
+def parse_datetime(value: str, params: Dict[str, str]) -> Tuple[Optional[datetime], bool]:
+    """(datetime, is_date) of a DATE or DATE-TIME value
+
+    UTC values are aware, TZID values are aware in that zone, floating
+    values and dates are naive (local time).
+    """
+    value = value.strip()
+    try:
+        if params.get('VALUE') == 'DATE' or len(value) == 8:
+            return datetime(int(value[0:4]), int(value[4:6]), int(value[6:8])), True
+        dt = datetime(int(value[0:4]), int(value[4:6]), int(value[6:8]),
+                      int(value[9:11]), int(value[11:13]), int(value[13:15]))
+    except (ValueError, IndexError):
+        return None, False
+    if value.endswith('Z'):
+        return dt.replace(tzinfo=timezone.utc), False
+    zone = get_zone(params.get('TZID'))
+    return (dt.replace(tzinfo=zone) if zone else dt), False
+
+
+def parse_duration(value: str) -> Optional[int]:
+    """Seconds of an RFC 5545 DURATION such as 'PT1H30M' or '-P1D'"""
+    match = _DURATION_RE.match(value.strip())
+    if not match:
+        return None
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    total = (int(weeks or 0) * 7 + int(days or 0)) * 86400 + \
+        int(hours or 0) * 3600 + int(minutes or 0) * 60 + int(seconds or 0)
+    return -total if sign == '-' else total
+
+
+def _timestamps(entries: List[Tuple[Dict[str, str], str]]) -> List[int]:
+    """Timestamps of a multi-valued EXDATE / RDATE property (PERIOD values are skipped)"""
+    result = []
+    for params, value in entries:
+        for item in value.split(','):
+            if '/' in item:
+                continue
+            dt, _ = parse_datetime(item, params)
+            if dt is not None:
+                result.append(int(dt.timestamp()))
+    return result
+
+
+def _build_event(props: Dict[str, Any], multi: Dict[str, List[Tuple[Dict[str, str], str]]]) -> Optional[Dict[str, Any]]:
+    """Normalise the raw properties of one VEVENT"""
+    if 'DTSTART' not in props:
+        return None
+    params, value = props.pop('DTSTART')
+    start, all_day = parse_datetime(value, params)
+    if start is None:
+        return None
+
+    event: Dict[str, Any] = {}
+    for name, (_, raw) in props.items():
+        if name in ('DTEND', 'DURATION', 'RECURRENCE-ID'):
+            continue
+        event[name] = _unescape(raw) if name in TEXT_PROPERTIES else raw
+
+    start_ts = int(start.timestamp())
+    event['DTSTART'] = start_ts
+    if all_day:
+        event['ALL_DAY'] = True
+    if start.tzinfo is not None:
+        event['TZID'] = 'UTC' if start.tzinfo is timezone.utc else params.get('TZID')
+
+    end_ts = None
+    if 'DTEND' in props:
+        end, _ = parse_datetime(props['DTEND'][1], props['DTEND'][0])
+        end_ts = int(end.timestamp()) if end is not None else None
+    elif 'DURATION' in props:
+        duration = parse_duration(props['DURATION'][1])
+        if duration is not None:
+            end_ts = start_ts + duration
+    if end_ts is None:
+        # RFC 5545 3.6.1: a date lasts one day, a date-time has no duration
+        end_ts = int((start + timedelta(days=1)).timestamp()) if all_day else start_ts
+    event['DTEND'] = end_ts
+
+    if 'RECURRENCE-ID' in props:
+        recurrence_id, _ = parse_datetime(props['RECURRENCE-ID'][1], props['RECURRENCE-ID'][0])
+        if recurrence_id is not None:
+            event['RECURRENCE-ID'] = int(recurrence_id.timestamp())
+    if multi.get('EXDATE'):
+        event['EXDATE'] = _timestamps(multi['EXDATE'])
+    if multi.get('RDATE'):
+        event['RDATE'] = _timestamps(multi['RDATE'])
+    return event
+
+
+def parse_ical(ical_data: str) -> List[Dict[str, Any]]:
+    """Parse the VEVENTs of an iCalendar object into plain, JSON-safe dicts
+
+    DTSTART / DTEND become Unix timestamps (TZID resolved, dates at local
+    midnight with ALL_DAY set). Recurring masters keep RRULE plus EXDATE /
+    RDATE timestamps and are expanded later by expand_events; overridden
+    instances carry RECURRENCE-ID. Properties of nested components such
+    as VALARM are ignored.
+    """
+    events = []
+    stack: List[str] = []
+    props: Dict[str, Any] = {}
+    multi: Dict[str, List[Tuple[Dict[str, str], str]]] = {}
+
+    for line in _FOLD_RE.sub('', ical_data).splitlines():
+        if not line:
+            continue
+        name, params, value = _split_line(line)
+        if name == 'BEGIN':
+            stack.append(value.strip().upper())
+            if stack[-1] == 'VEVENT':
+                props, multi = {}, {}
+        elif name == 'END':
+            component = stack.pop() if stack else None
+            if component == 'VEVENT':
+                event = _build_event(props, multi)
+                if event:
+                    events.append(event)
+        elif stack and stack[-1] == 'VEVENT':
+            if name in ('EXDATE', 'RDATE'):
+                multi.setdefault(name, []).append((params, value))
+            else:
+                props[name] = (params, value)
+    return events
+
+
+def _local(timestamp: int, zone: Optional[tzinfo]) -> datetime:
+    return datetime.fromtimestamp(timestamp, zone) if zone else datetime.fromtimestamp(timestamp)
+
+
+def _normalize_until(rule: str, dtstart: datetime) -> str:
+    """Make UNTIL as aware (UTC) or naive as DTSTART, which dateutil requires"""
+    match = _UNTIL_RE.search(rule)
+    if not match:
+        return rule
+    until, is_date = parse_datetime(match.group(1), {})
+    if until is None:
+        return rule
+    if is_date:
+        # A date UNTIL includes the whole day
+        until = until.replace(hour=23, minute=59, second=59)
+    if dtstart.tzinfo is not None:
+        if until.tzinfo is None:
+            until = until.replace(tzinfo=dtstart.tzinfo)
+        value = until.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    else:
+        if until.tzinfo is not None:
+            until = datetime.fromtimestamp(until.timestamp())
+        value = until.strftime('%Y%m%dT%H%M%S')
+    return rule[:match.start(1)] + value + rule[match.end(1):]
+
+
+def _rule_anchor(rule: Optional[str], dtstart_ts: int, window_start_ts: int) -> int:
+    """Days to move DTSTART forward so the rule is not iterated from years back
+
+    Only for DAILY / WEEKLY rules without COUNT, moved by whole intervals so
+    every later instance is unchanged. Other rules are short enough to walk.
+    """
+    if not rule:
+        return 0
+    params = dict(part.split('=', 1) for part in rule.upper().split(';') if '=' in part)
+    days = {'DAILY': 1, 'WEEKLY': 7}.get(params.get('FREQ'))
+    if not days or 'COUNT' in params:
+        return 0
+    try:
+        step = days * max(int(params.get('INTERVAL') or 1), 1)
+    except ValueError:
+        return 0
+    # One period of slack keeps instances that started before the window
+    periods = (window_start_ts - dtstart_ts) // 86400 // step - 1
+    return periods * step if periods > 0 else 0
+
+
+@lru_cache(maxsize=1024)
+def _recurrence_set(rule: Optional[str], dtstart_ts: int, tzid: Optional[str], all_day: bool,
+                    rdates: Tuple[int, ...], skip_days: int = 0) -> rruleset:
+    """Recurrence set of a master event, cached across renders and threads"""
+    zone = None if all_day else get_zone(tzid)
+    dtstart = _local(dtstart_ts, zone)
+    rules = rruleset()
+    # DTSTART is always the first instance, even if the rule does not match it
+    rules.rdate(dtstart)
+    if rule:
+        # Adding days keeps the wall-clock time, also across DST changes
+        anchor = dtstart + timedelta(days=skip_days)
+        rules.rrule(rrulestr(_normalize_until(rule, dtstart), dtstart=anchor))
+    for timestamp in rdates:
+        rules.rdate(_local(timestamp, zone))
+    return rules
+
+
+def _overlaps(event: Dict[str, Any], start_ts: int, end_ts: int) -> bool:
+    start = event.get('DTSTART')
+    if not isinstance(start, int):
+        return False
+    end = event.get('DTEND', start)
+    return start < end_ts and (end if end > start else start + 1) > start_ts
+
+
+def _expand(event: Dict[str, Any], start_ts: int, end_ts: int, overridden: Iterable[int]) -> Iterator[Dict[str, Any]]:
+    duration = max(event.get('DTEND', event['DTSTART']) - event['DTSTART'], 0)
+    all_day = bool(event.get('ALL_DAY'))
+    try:
+        rules = _recurrence_set(event.get('RRULE'), event['DTSTART'], event.get('TZID'), all_day,
+                                tuple(event.get('RDATE', ())),
+                                _rule_anchor(event.get('RRULE'), event['DTSTART'], start_ts - duration))
+    except (ValueError, TypeError) as e:
+        # Unparseable rule: show the first instance rather than nothing
+        print(f"Invalid RRULE for {event.get('UID')}: {e}")
+        if _overlaps(event, start_ts, end_ts):
+            yield event
+        return
+
+    skip = set(event.get('EXDATE', ()))
+    skip.update(overridden)
+    zone = None if all_day else get_zone(event.get('TZID'))
+    # Instances starting before the window may still run into it
+    for occurrence in rules.xafter(_local(start_ts - duration, zone), inc=True):
+        timestamp = int(occurrence.timestamp())
+        if timestamp >= end_ts:
+            break
+        if timestamp in skip or timestamp + max(duration, 1) <= start_ts:
+            continue
+        instance = {k: v for k, v in event.items() if k not in RECURRENCE_PROPERTIES}
+        instance['DTSTART'] = timestamp
+        instance['DTEND'] = timestamp + duration
+        yield instance
+
+
+def expand_events(events: Iterable[Dict[str, Any]], start_ts: int, end_ts: int) -> Iterator[Dict[str, Any]]:
+    """Lazily yield the event instances overlapping [start_ts, end_ts)
+
+    Recurring masters are expanded only inside the window; EXDATEs and
+    instances replaced by a RECURRENCE-ID override (cancelled ones are
+    dropped) are skipped.
+    """
+    events = list(events)
+    overrides: Dict[Any, set] = {}
+    for event in events:
+        if 'RECURRENCE-ID' in event:
+            overrides.setdefault(event.get('UID'), set()).add(event['RECURRENCE-ID'])
+
+    for event in events:
+        if 'RECURRENCE-ID' in event:
+            if event.get('STATUS', '').upper() != 'CANCELLED' and _overlaps(event, start_ts, end_ts):
+                yield event
+        elif isinstance(event.get('DTSTART'), int) and ('RRULE' in event or 'RDATE' in event):
+            yield from _expand(event, start_ts, end_ts, overrides.get(event.get('UID'), ()))
+        elif _overlaps(event, start_ts, end_ts):
+            yield event
@@ -1,39 +1,131 @@
+"""
+Configuration
+Settings come from the environment and the project's .env file. Both are read on the
+first attribute access rather than at import, so importing config (and every module
+that imports it) costs nothing until a setting is actually used. The settings are
+listed in __all__ and typed in config.pyi for linters and IDEs.
+"""
+
 import os
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
-
-# Configuration constants
-DOT_CALENDAR_TOKEN = os.getenv('DOT_CALENDAR_TOKEN')
-QWEATHER_KEY = os.getenv('QWEATHER_KEY')
-QWEATHER_HOST = os.getenv('QWEATHER_HOST', 'devapi.qweather.com')
-CONFIG_USER_LOCATION = os.getenv('CONFIG_USER_LOCATION')
-DOT_DEVICE_ID = os.getenv('DOT_DEVICE_ID')
-DOT_APP_KEY = os.getenv('DOT_APP_KEY')
-DINGTALK_CALDAV_USER = os.getenv('DINGTALK_CALDAV_USER')
-DINGTALK_CALDAV_PASS = os.getenv('DINGTALK_CALDAV_PASS')
-
-# Calendar source configuration
-CALENDAR_SOURCE = os.getenv('CALENDAR_SOURCE', 'dingtalk')  # Options: 'dingtalk', 'icloud', 'google'
-
-# iCloud Calendar configuration
-ICLOUD_CALDAV_URL = os.getenv('ICLOUD_CALDAV_URL')
-ICLOUD_CALDAV_USER = os.getenv('ICLOUD_CALDAV_USER')
-ICLOUD_CALDAV_PASS = os.getenv('ICLOUD_CALDAV_PASS')
-
-# Google Calendar configuration
-GOOGLE_CALDAV_URL = os.getenv('GOOGLE_CALDAV_URL')
-GOOGLE_CALDAV_USER = os.getenv('GOOGLE_CALDAV_USER')
-GOOGLE_CALDAV_PASS = os.getenv('GOOGLE_CALDAV_PASS')
-
-# Cache path
-CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache')
-
-
-# Ensure cache directory exists (useful in containers)
-try:
-	os.makedirs(CACHE_PATH, exist_ok=True)
-except Exception:
-	# Best-effort: if creation fails, code using CACHE_PATH should handle it
-	pass
\ No newline at end of file
+import threading
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_lock = threading.Lock()
+_loaded = False
+
+
+def _settings() -> dict:
+    # Configuration constants
+    DOT_CALENDAR_TOKEN = os.getenv('DOT_CALENDAR_TOKEN')
+    QWEATHER_KEY = os.getenv('QWEATHER_KEY')
+    QWEATHER_HOST = os.getenv('QWEATHER_HOST', 'devapi.qweather.com')
+    CONFIG_USER_LOCATION = os.getenv('CONFIG_USER_LOCATION')
+    DOT_DEVICE_ID = os.getenv('DOT_DEVICE_ID')
+    DOT_APP_KEY = os.getenv('DOT_APP_KEY')
+    DINGTALK_CALDAV_USER = os.getenv('DINGTALK_CALDAV_USER')
+    DINGTALK_CALDAV_PASS = os.getenv('DINGTALK_CALDAV_PASS')
+
+    # Calendar source configuration
+    # Options: 'dingtalk', 'icloud', 'google', or several comma separated (e.g. 'dingtalk,icloud')
+    CALENDAR_SOURCE = os.getenv('CALENDAR_SOURCE', 'dingtalk')
+
+    # iCloud Calendar configuration
+    ICLOUD_CALDAV_URL = os.getenv('ICLOUD_CALDAV_URL')
+    ICLOUD_CALDAV_USER = os.getenv('ICLOUD_CALDAV_USER')
+    ICLOUD_CALDAV_PASS = os.getenv('ICLOUD_CALDAV_PASS')
+
+    # Google Calendar configuration
+    GOOGLE_CALDAV_URL = os.getenv('GOOGLE_CALDAV_URL')
+    GOOGLE_CALDAV_USER = os.getenv('GOOGLE_CALDAV_USER')
+    GOOGLE_CALDAV_PASS = os.getenv('GOOGLE_CALDAV_PASS')
+
+    # Incremental CalDAV sync (ctag / sync-collection / ETag diff with a local event cache)
+    CALDAV_INCREMENTAL_SYNC = os.getenv('CALDAV_INCREMENTAL_SYNC', 'true').lower() in ('1', 'true', 'yes')
+    # Calendars fetched in parallel per account, and seconds each calendar may take (request timeout and fetch deadline)
+    CALDAV_MAX_CONCURRENCY = int(os.getenv('CALDAV_MAX_CONCURRENCY', '4'))
+    CALDAV_TIMEOUT = int(os.getenv('CALDAV_TIMEOUT', '30'))
+    # Seconds a discovered calendar list is reused (in memory and in the shared cache) before the next PROPFIND
+    CALDAV_DISCOVERY_TTL = int(os.getenv('CALDAV_DISCOVERY_TTL', '3600'))
+
+    # Cache path
+    CACHE_PATH = os.path.join(_ROOT, 'cache')
+
+    # Cache backend: 'file' (local cache/ directory) or 'redis' (shared across replicas)
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'file')
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_REDIS_PREFIX = os.getenv('CACHE_REDIS_PREFIX', 'dotcal:')
+    CACHE_REDIS_POOL_SIZE = int(os.getenv('CACHE_REDIS_POOL_SIZE', '8'))
+
+    # Render executor: concurrent renders, and renders allowed to wait before requests get 503 + Retry-After
+    RENDER_MAX_WORKERS = int(os.getenv('RENDER_MAX_WORKERS', '2'))
+    RENDER_MAX_QUEUE = int(os.getenv('RENDER_MAX_QUEUE', '8'))
+    # Worker processes drawing and encoding images (about one per core); 0 renders in the calling thread
+    RENDER_PROCESSES = int(os.getenv('RENDER_PROCESSES', '2'))
+    # Devices pushed to concurrently when DOT_DEVICE_ID lists several (also the pooled connections to the Dot API)
+    PUSH_CONCURRENCY = int(os.getenv('PUSH_CONCURRENCY', '8'))
+    # Seconds one device may take across all push attempts; retries on 429/5xx and network errors
+    PUSH_TIMEOUT = float(os.getenv('PUSH_TIMEOUT', '30'))
+    PUSH_RETRIES = int(os.getenv('PUSH_RETRIES', '2'))
+    # Exponential backoff between retries: jittered up to PUSH_BACKOFF * 2^n seconds, at most PUSH_BACKOFF_MAX
+    PUSH_BACKOFF = float(os.getenv('PUSH_BACKOFF', '0.5'))
+    PUSH_BACKOFF_MAX = float(os.getenv('PUSH_BACKOFF_MAX', '8'))
+    # Most device profiles accepted by one /generate/batch request
+    BATCH_MAX_PROFILES = int(os.getenv('BATCH_MAX_PROFILES', '100'))
+    # Seconds a rendered PNG is kept in the render cache, keyed by the hash of its inputs
+    RENDER_CACHE_TTL = int(os.getenv('RENDER_CACHE_TTL', '3600'))
+    # Cache-Control of image responses; clients revalidate with If-None-Match and get 304 while unchanged
+    IMAGE_CACHE_CONTROL = os.getenv('IMAGE_CACHE_CONTROL', 'no-cache')
+
+    # Per-stage timings and upstream errors as JSON log lines in CLI and scheduler runs (the API exposes /metrics)
+    METRICS_LOG = os.getenv('METRICS_LOG', 'true').lower() in ('1', 'true', 'yes')
+    # Request tracing spans: 'none', 'console' (stderr) or 'file' (OTLP/JSON lines in TRACING_FILE)
+    TRACING_EXPORTER = os.getenv('TRACING_EXPORTER', 'none').lower()
+    TRACING_FILE = os.getenv('TRACING_FILE', os.path.join(CACHE_PATH, 'traces.jsonl'))
+
+    # Startup warm-up: prefetch weather and calendars before /ready reports ready
+    WARMUP_PREFETCH = os.getenv('WARMUP_PREFETCH', 'true').lower() in ('1', 'true', 'yes')
+    # Extra locations to prefetch besides CONFIG_USER_LOCATION, ';' separated (e.g. '116.41,39.90;121.47,31.23')
+    WARMUP_LOCATIONS = os.getenv('WARMUP_LOCATIONS', '')
+
+    # Local SQLite event store: todolists are read from it, CalDAV sync runs in the background
+    EVENT_STORE_ENABLED = os.getenv('EVENT_STORE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    EVENT_STORE_PATH = os.getenv('EVENT_STORE_PATH', os.path.join(CACHE_PATH, 'events.sqlite3'))
+    # Days of expanded instances kept ahead of now
+    EVENT_STORE_HORIZON_DAYS = int(os.getenv('EVENT_STORE_HORIZON_DAYS', '7'))
+    # Seconds between background syncs, and the age after which a read syncs first
+    EVENT_SYNC_INTERVAL = int(os.getenv('EVENT_SYNC_INTERVAL', '300'))
+    EVENT_STORE_MAX_AGE = int(os.getenv('EVENT_STORE_MAX_AGE', '900'))
+    # Seconds a failed sync is not retried on read; the stored events are served meanwhile
+    EVENT_SYNC_RETRY_AFTER = int(os.getenv('EVENT_SYNC_RETRY_AFTER', '120'))
+
+    return {name: value for name, value in locals().items() if name.isupper()}
+
+
+__all__ = [name for name in _settings.__code__.co_varnames if name.isupper()]
+
+
+def _load() -> None:
+    """Load .env, then define every setting not already assigned (e.g. overridden by a script)"""
+    global _loaded
+    with _lock:
+        if _loaded:
+            return
+        from dotenv import load_dotenv
+
+        # Load environment variables from .env file
+        load_dotenv(os.path.join(_ROOT, '.env'))
+        for name, value in _settings().items():
+            globals().setdefault(name, value)
+        _loaded = True
+
+
+def __getattr__(name: str):
+    if not name.startswith('__') and not _loaded:
+        _load()
+        if name in globals():
+            return globals()[name]
+    raise AttributeError(f"module 'config' has no attribute '{name}'")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,62 @@
+"""Types of the settings defined lazily in config.py (_settings); tests/test_config.py keeps the names in step"""
+
+from typing import List, Optional
+
+__all__: List[str]
+
+DOT_CALENDAR_TOKEN: Optional[str]
+QWEATHER_KEY: Optional[str]
+QWEATHER_HOST: str
+CONFIG_USER_LOCATION: Optional[str]
+DOT_DEVICE_ID: Optional[str]
+DOT_APP_KEY: Optional[str]
+DINGTALK_CALDAV_USER: Optional[str]
+DINGTALK_CALDAV_PASS: Optional[str]
+
+CALENDAR_SOURCE: str
+
+ICLOUD_CALDAV_URL: Optional[str]
+ICLOUD_CALDAV_USER: Optional[str]
+ICLOUD_CALDAV_PASS: Optional[str]
+
+GOOGLE_CALDAV_URL: Optional[str]
+GOOGLE_CALDAV_USER: Optional[str]
+GOOGLE_CALDAV_PASS: Optional[str]
+
+CALDAV_INCREMENTAL_SYNC: bool
+CALDAV_MAX_CONCURRENCY: int
+CALDAV_TIMEOUT: int
+CALDAV_DISCOVERY_TTL: int
+
+CACHE_PATH: str
+
+CACHE_BACKEND: str
+CACHE_REDIS_URL: str
+CACHE_REDIS_PREFIX: str
+CACHE_REDIS_POOL_SIZE: int
+
+RENDER_MAX_WORKERS: int
+RENDER_MAX_QUEUE: int
+RENDER_PROCESSES: int
+PUSH_CONCURRENCY: int
+PUSH_TIMEOUT: float
+PUSH_RETRIES: int
+PUSH_BACKOFF: float
+PUSH_BACKOFF_MAX: float
+BATCH_MAX_PROFILES: int
+RENDER_CACHE_TTL: int
+IMAGE_CACHE_CONTROL: str
+
+METRICS_LOG: bool
+TRACING_EXPORTER: str
+TRACING_FILE: str
+
+WARMUP_PREFETCH: bool
+WARMUP_LOCATIONS: str
+
+EVENT_STORE_ENABLED: bool
+EVENT_STORE_PATH: str
+EVENT_STORE_HORIZON_DAYS: int
+EVENT_SYNC_INTERVAL: int
+EVENT_STORE_MAX_AGE: int
+EVENT_SYNC_RETRY_AFTER: int
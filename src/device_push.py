@@ -6,16 +6,18 @@
 
 import os
 import sys
-import base64
 import argparse
 from PIL import Image
-import requests
 from io import BytesIO
+from typing import Optional, Tuple
 
 # Add the current directory to the path so we can import our modules
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 import config
+import metrics
+import push_service
+import tracing
 
 
 def blackwhite_image(image: Image.Image) -> Image.Image:
@@ -51,8 +53,25 @@ def blackwhite_image(image: Image.Image) -> Image.Image:
     return bw_image
 
 
-def push_image_to_device(image_path: str, device_id: str = None, app_key: str = None):
-    """Push image to Dot device"""
+def load_image(image_path: str, size: Optional[Tuple[int, int]] = None) -> bytes:
+    """PNG bytes of an image file, optionally resized, converted to black and white"""
+    image = Image.open(image_path)
+    print(f"📏 图片尺寸: {image.width}x{image.height}")
+    if size:
+        print(f"🔧 调整图片尺寸为: {size[0]}x{size[1]}")
+        image = image.resize(size, Image.Resampling.LANCZOS)
+
+    print("🎨 转换为黑白图片...")
+    bw_image = blackwhite_image(image)
+    img_buffer = BytesIO()
+    bw_image.save(img_buffer, format='PNG')
+    return img_buffer.getvalue()
+
+
+@tracing.traced('device_push.run')
+def push_image_to_device(image_path: str, device_id: str = None, app_key: str = None,
+                         size: Optional[Tuple[int, int]] = None) -> bool:
+    """Push an image file to one or more (comma separated) Dot devices, True if any succeeded"""
     
     # Use defaults from config if not provided
     device_id = device_id or config.DOT_DEVICE_ID
@@ -71,65 +90,26 @@ def push_image_to_device(image_path: str, device_id: str = None, app_key: str =
         print(f"📱 正在推送图片到设备...")
         print(f"📁 图片文件: {image_path}")
         print(f"🔧 设备ID: {device_id}")
-        
-        # Load and convert image
-        image = Image.open(image_path)
-        print(f"📏 图片尺寸: {image.width}x{image.height}")
-        
-        # Convert to black and white
-        print("🎨 转换为黑白图片...")
-        bw_image = blackwhite_image(image)
-        
-        # Save image to bytes
-        img_buffer = BytesIO()
-        bw_image.save(img_buffer, format='PNG')
-        img_buffer.seek(0)
-        image_content = img_buffer.getvalue()
-        
-        # Send to Dot devices
-        devices = [d.strip() for d in device_id.split(',')]
-        success_count = 0
-        
-        for device in devices:
-            try:
-                print(f"📡 推送到设备: {device}")
-                
-                url = 'https://dot.mindreset.tech/api/open/image'
-                payload = {
-                    "deviceId": device,
-                    "image": base64.b64encode(image_content).decode('utf-8'),
-                    "refreshNow": True,
-                    "border": 0,
-                    "ditherType": "NONE",
-                    "link": "https://dot.mindreset.tech"
-                }
-                
-                headers = {
-                    'Authorization': f'Bearer {app_key}',
-                    'Content-Type': 'application/json',
-                    'Accept-Encoding': 'identity'  # 禁用gzip压缩
-                }
-                
-                response = requests.post(url, json=payload, headers=headers, timeout=30)
-                
-                if response.status_code == 200:
-                    print(f"✅ 设备 {device} 推送成功")
-                    success_count += 1
-                else:
-                    print(f"❌ 设备 {device} 推送失败: {response.status_code}")
-                    if response.text:
-                        print(f"   错误信息: {response.text}")
-                        
-            except requests.RequestException as e:
-                print(f"❌ 设备 {device} 推送异常: {str(e)}")
-        
-        print(f"📊 推送结果: {success_count}/{len(devices)} 个设备成功")
-        return success_count > 0
-        
+        image_content = load_image(image_path, size)
     except Exception as e:
-        print(f"❌ 推送失败: {str(e)}")
+        print(f"❌ 读取图片失败: {str(e)}")
         return False
 
+    # Retries, timeouts and concurrency are handled by push_service; each result is also logged as JSON
+    devices = push_service.parse_devices(device_id)
+    print(f"📡 推送到 {len(devices)} 个设备...")
+    results = push_service.push(devices, app_key, image_content)
+    for result in results:
+        retried = f"，共尝试 {result.attempts} 次" if result.attempts > 1 else ''
+        if result.ok:
+            print(f"✅ 设备 {result.device_id} 推送成功 ({result.seconds:.2f}s{retried})")
+        else:
+            print(f"❌ 设备 {result.device_id} 推送失败 ({result.seconds:.2f}s{retried}): {result.error}")
+
+    success_count = sum(result.ok for result in results)
+    print(f"📊 推送结果: {success_count}/{len(devices)} 个设备成功")
+    return success_count > 0
+
 
 def main():
     """命令行主函数"""
@@ -140,39 +120,19 @@ def main():
     parser.add_argument('--resize', help='调整图片尺寸 (格式: 296x152)')
     
     args = parser.parse_args()
+    if config.METRICS_LOG:
+        metrics.enable_event_log(run='device_push')
     
-    # Optional resize
+    size = None
     if args.resize:
         try:
             width, height = map(int, args.resize.split('x'))
-            print(f"🔧 调整图片尺寸为: {width}x{height}")
-            
-            image = Image.open(args.image_path)
-            resized_image = image.resize((width, height), Image.Resampling.LANCZOS)
-            
-            # Save resized image temporarily
-            temp_path = f"temp_resized_{os.path.basename(args.image_path)}"
-            resized_image.save(temp_path)
-            
-            # Push resized image
-            success = push_image_to_device(
-                temp_path, 
-                args.device_id, 
-                args.app_key
-            )
-            
-            # Clean up temp file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-                
-            sys.exit(0 if success else 1)
-            
+            size = (width, height)
         except ValueError:
             print("❌ 错误: 尺寸格式不正确，请使用格式: 296x152")
             sys.exit(1)
-    
-    # Push original image
-    success = push_image_to_device(args.image_path, args.device_id, args.app_key)
+
+    success = push_image_to_device(args.image_path, args.device_id, args.app_key, size)
     sys.exit(0 if success else 1)
 
 
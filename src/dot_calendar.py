@@ -1,17 +1,34 @@
 import math
 import os
-import requests
 import json
 from datetime import datetime
 from typing import List, Dict, Any, Tuple, Optional
 from PIL import Image, ImageDraw, ImageFont
-import base64
 from io import BytesIO
 
-from utils import W2FileCache
+import metrics
+import push_service
+from fonts import TEXT_FONT, ICON_FONT, get_font
+from utils import W2FileCache, WEATHER_CACHE
 from models import WeatherInfo, Event, WeatherDaily
 
 
+def push_image(device_id: str, app_key: str, image_content: bytes) -> bool:
+    """Send an encoded image to one Dot device, returns True on success"""
+    return push_to_devices(device_id, app_key, image_content).get(device_id.strip(), False)
+
+
+def push_to_devices(device_ids: str, app_key: str, image_content: bytes) -> Dict[str, bool]:
+    """Send the same encoded image to every device in a comma separated list, concurrently"""
+    results = push_service.push(device_ids, app_key, image_content)
+    for result in results:
+        if result.ok:
+            print(f"   ✅ Push success: {result.device_id} ({result.seconds:.2f}s)")
+        else:
+            print(f"   ❌ Push failed: {result.device_id} ({result.error})")
+    return {result.device_id: result.ok for result in results}
+
+
 class DotCalendar:
     """Main DotCalendar class for generating weather calendar images"""
 
@@ -40,10 +57,9 @@ class DotCalendar:
         self.todolist = todolist or []
 
         # Font paths
-        self.fonts_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'assets', 'fonts')
-        self.text_font = os.path.join(self.fonts_dir, 'fusion-pixel-12px-monospaced-zh_hans.ttf')
-        self.number_font = os.path.join(self.fonts_dir, 'fusion-pixel-12px-monospaced-zh_hans.ttf')
-        self.icon_font = os.path.join(self.fonts_dir, 'qweather-icons.ttf')
+        self.text_font = TEXT_FONT
+        self.number_font = TEXT_FONT
+        self.icon_font = ICON_FONT
 
         # Initialize data
         self.params: List[WeatherInfo] = []
@@ -120,18 +136,24 @@ class DotCalendar:
 
     def qweather_get_daily(self, location: str, days: str = '30d') -> Dict[str, Any]:
         """Get daily weather data from QWeather API"""
-        cache_key = f'qweather_daily_{location}_{days}'
+        cache_key = WEATHER_CACHE.key('daily', location, days)
         data = W2FileCache.get_cache(cache_key)
         if data is not None:
             return data
 
+        # requests is only imported on a cache miss, so warm runs skip loading it
+        import requests
+
         try:
             url = f'https://{self.qweather_host}/v7/weather/{days}?location={location}&key={self.qweather_key}'
-            response = requests.get(url, timeout=30)
-            data = response.json()
+            with metrics.stage('weather_fetch', **{'qweather.api': f'weather/{days}', 'qweather.location': location}) as span:
+                response = requests.get(url, timeout=30)
+                span.set_attribute('http.status_code', response.status_code)
+                data = response.json()
             W2FileCache.set_cache(cache_key, data, 60 * 5)  # Cache for 5 minutes
             return data
         except requests.RequestException as e:
+            metrics.upstream_error('qweather', e)
             raise Exception(f"Failed to get weather data: {str(e)}")
 
     def load_weather_data(self, days: str = '30d') -> 'DotCalendar':
@@ -140,6 +162,7 @@ class DotCalendar:
         self.process_weather_data()
         return self
 
+    @metrics.timed('layout')
     def process_weather_data(self) -> None:
         """Process weather data for calendar display"""
         line = 0
@@ -200,6 +223,7 @@ class DotCalendar:
                     )
                     self.params.append(param)
 
+    @metrics.timed('draw')
     def create_image(self) -> 'DotCalendar':
         """Create the calendar image"""
         # Calculate calendar dimensions
@@ -231,7 +255,7 @@ class DotCalendar:
             
         draw = ImageDraw.Draw(self.image)
         try:
-            font = ImageFont.truetype(self.text_font, self.HEADER_FONT_SIZE)
+            font = get_font(self.text_font, self.HEADER_FONT_SIZE)
         except:
             font = ImageFont.load_default()
 
@@ -254,8 +278,8 @@ class DotCalendar:
         draw = ImageDraw.Draw(self.image)
         
         try:
-            number_font = ImageFont.truetype(self.number_font, self.DAY_FONT_SIZE)
-            icon_font = ImageFont.truetype(self.icon_font, self.ICON_FONT_SIZE)
+            number_font = get_font(self.number_font, self.DAY_FONT_SIZE)
+            icon_font = get_font(self.icon_font, self.ICON_FONT_SIZE)
         except:
             number_font = ImageFont.load_default()
             icon_font = ImageFont.load_default()
@@ -288,7 +312,7 @@ class DotCalendar:
             
         draw = ImageDraw.Draw(self.image)
         try:
-            font = ImageFont.truetype(self.text_font, self.TODO_FONT_SIZE)
+            font = get_font(self.text_font, self.TODO_FONT_SIZE)
         except:
             font = ImageFont.load_default()
 
@@ -356,7 +380,7 @@ class DotCalendar:
             if extra_info and self.image:
                 # Draw extra weather info in the bottom right corner of the calendar area
                 try:
-                    font = ImageFont.truetype(self.text_font, self.TODO_FONT_SIZE)
+                    font = get_font(self.text_font, self.TODO_FONT_SIZE)
                     draw = ImageDraw.Draw(self.image)
                     
                     # Calculate text dimensions
@@ -455,7 +479,7 @@ class DotCalendar:
         if self.image:
             draw = ImageDraw.Draw(self.image)
             try:
-                icon_font = ImageFont.truetype(self.icon_font, 35)
+                icon_font = get_font(self.icon_font, 35)
                 # Make sure the icon is within bounds (35 is the font size)
                 y_position = self.BG_HEIGHT - 35 - 2  # Reduced margin from 5 to 2
                 draw.text((3, y_position), icon_today, fill=(0, 0, 0), font=icon_font)
@@ -464,8 +488,8 @@ class DotCalendar:
         
         # Draw min temperature info
         try:
-            text_font = ImageFont.truetype(self.text_font, 10)
-            temp_font = ImageFont.truetype(self.text_font, 20)
+            text_font = get_font(self.text_font, 10)
+            temp_font = get_font(self.text_font, 20)
             
             # Calculate proper Y positions to keep text within bounds
             text_height = 10  # Approximate height of text with font size 10
@@ -505,42 +529,14 @@ class DotCalendar:
             print(f"📱 Connecting to Dot device service...")
             # Save image to bytes
             img_buffer = BytesIO()
-            bw_image.save(img_buffer, format='PNG')
+            with metrics.stage('encode'):
+                bw_image.save(img_buffer, format='PNG')
             img_buffer.seek(0)
             image_content = img_buffer.getvalue()
             
             # Send to Dot devices
-            devices = [d.strip() for d in self.dot_device_id.split(',')]
-            for device_id in devices:
-                try:
-                    print(f"   Shape sending to {device_id}...")
-                    url = 'https://dot.mindreset.tech/api/open/image'
-                    payload = {
-                        "deviceId": device_id,
-                        "image": base64.b64encode(image_content).decode('utf-8'),
-                        "refreshNow": True,
-                        "border": 0,
-                        "ditherType": "NONE",
-                        "link": "https://dot.mindreset.tech"
-                    }
-                    
-                    headers = {
-                        'Authorization': f'Bearer {self.dot_appkey}',
-                        'Content-Type': 'application/json',
-                        'Accept-Encoding': 'identity'  # 禁用gzip压缩
-                    }
-                    
-                    response = requests.post(url, json=payload, headers=headers, timeout=30)
-                    if response.status_code == 200:
-                        print(f"   ✅ Push success: {device_id}")
-                    else:
-                        print(f"   ❌ Push failed: {device_id} (Status: {response.status_code})")
-                        print(f"      Response: {response.text}")
-                    
-                except requests.RequestException as e:
-                    print(f"   ❌ Network error: {device_id} - {str(e)}")
-                    pass
-                    
+            push_to_devices(self.dot_device_id, self.dot_appkey, image_content)
+
         else:
             # Save to file for demonstration
             bw_image.save('output.png', format='PNG')
@@ -548,6 +544,7 @@ class DotCalendar:
             
         return self
 
+    @metrics.timed('binarize')
     def blackwhite_image(self, image: Image.Image) -> Image.Image:
         """Convert image to black and white"""
         # Work with RGBA image to properly handle transparency
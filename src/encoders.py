@@ -0,0 +1,126 @@
+"""
+Image encoders
+Every output format the image endpoints can return, registered in one place.
+Binarized frames for e-ink panels: 1-bit PNG and BMP, raw packed 1 bit per pixel
+buffers (296*152/8 = 5624 bytes) with MSB or LSB first bit order, and lossless WebP.
+"""
+
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+
+@dataclass(frozen=True)
+class Encoder:
+    """An output format: how to encode an image and how to label the bytes"""
+    name: str
+    media_type: str
+    extension: str
+    encode: Callable[[Image.Image], bytes]
+    # Extra response headers describing the bytes (e.g. bit order of raw frames)
+    headers: Dict[str, str] = field(default_factory=dict)
+    # Media types that select this format in an Accept header, besides media_type
+    accept: Tuple[str, ...] = ()
+
+
+ENCODERS: Dict[str, Encoder] = {}
+DEFAULT_FORMAT = 'png'
+
+
+def register(encoder: Encoder) -> Encoder:
+    ENCODERS[encoder.name] = encoder
+    return encoder
+
+
+def get_encoder(name: Optional[str]) -> Encoder:
+    """Encoder for a format name, DEFAULT_FORMAT for None; raises ValueError if unknown"""
+    encoder = ENCODERS.get(name or DEFAULT_FORMAT)
+    if encoder is None:
+        raise ValueError(f"Unknown format: {name} (expected one of {', '.join(ENCODERS)})")
+    return encoder
+
+
+def encode(image: Image.Image, name: Optional[str] = None) -> bytes:
+    return get_encoder(name).encode(image)
+
+
+def _one_bit(image: Image.Image) -> Image.Image:
+    """Mode '1' without dithering; the renderers' output is already black and white"""
+    if image.mode == '1':
+        return image
+    return image.convert('L').point(lambda value: 255 if value >= 128 else 0, mode='1')
+
+
+def _save(image: Image.Image, format: str, **params) -> bytes:
+    buf = BytesIO()
+    image.save(buf, format=format, **params)
+    return buf.getvalue()
+
+
+def _raw(image: Image.Image, packer: str) -> bytes:
+    """Rows top to bottom, 8 pixels per byte, a set bit is a black pixel"""
+    return _one_bit(image).tobytes('raw', packer)
+
+
+register(Encoder('png', 'image/png', 'png', lambda image: _save(image, 'PNG')))
+register(Encoder('png-1bit', 'image/png', 'png', lambda image: _save(_one_bit(image), 'PNG', optimize=True),
+                 headers={'X-Pixel-Format': '1bpp'}))
+# Pillow's '1;I' packer writes inverted bits (1 = black) MSB first, '1;IR' also reverses each byte
+register(Encoder('raw-msb', 'application/octet-stream', 'bin', lambda image: _raw(image, '1;I'),
+                 headers={'X-Pixel-Format': '1bpp', 'X-Bit-Order': 'msb', 'X-Pixel-Polarity': '1=black'},
+                 accept=('application/x-1bpp-msb',)))
+register(Encoder('raw-lsb', 'application/octet-stream', 'bin', lambda image: _raw(image, '1;IR'),
+                 headers={'X-Pixel-Format': '1bpp', 'X-Bit-Order': 'lsb', 'X-Pixel-Polarity': '1=black'},
+                 accept=('application/x-1bpp-lsb',)))
+register(Encoder('bmp', 'image/bmp', 'bmp', lambda image: _save(_one_bit(image), 'BMP'),
+                 headers={'X-Pixel-Format': '1bpp'}))
+register(Encoder('webp', 'image/webp', 'webp', lambda image: _save(image.convert('L'), 'WEBP', lossless=True)))
+
+
+def _parse_accept(accept: str) -> List[Tuple[str, float]]:
+    """[(media type, q)] of an Accept header, highest q first, q=0 entries dropped"""
+    ranges = []
+    for position, part in enumerate(accept.split(',')):
+        media_type, *params = [piece.strip() for piece in part.split(';')]
+        if not media_type:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            ranges.append((media_type.lower(), q, position))
+    ranges.sort(key=lambda item: (-item[1], item[2]))
+    return [(media_type, q) for media_type, q, _ in ranges]
+
+
+def negotiate(accept: Optional[str]) -> Optional[Encoder]:
+    """Encoder for an Accept header; DEFAULT_FORMAT unless it asks only for image types we can't make
+
+    A vendor type (application/x-1bpp-msb, -lsb) selects a raw frame;
+    application/octet-stream alone means raw-msb. An Accept naming no image
+    type at all (e.g. application/json from a generic client) still gets
+    DEFAULT_FORMAT; None, for a 406, only when every named type is an
+    unsupported image type such as image/gif.
+    """
+    if not accept:
+        return ENCODERS[DEFAULT_FORMAT]
+    ranges = _parse_accept(accept)
+    for media_type, _ in ranges:
+        if media_type in ('*/*', 'image/*'):
+            return ENCODERS[DEFAULT_FORMAT]
+        for encoder in ENCODERS.values():
+            if media_type in encoder.accept:
+                return encoder
+        for encoder in ENCODERS.values():
+            if media_type == encoder.media_type:
+                return encoder
+    if any(media_type.startswith('image/') for media_type, _ in ranges):
+        return None
+    return ENCODERS[DEFAULT_FORMAT]
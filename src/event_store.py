@@ -0,0 +1,267 @@
+"""
+Local event store
+Expanded event instances from the CalDAV sources kept in SQLite, indexed on (start, end),
+so building a todolist is an index lookup instead of a network round trip
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+import config
+import metrics
+import tracing
+from calendar_aggregator import get_client, merge_events
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    source TEXT NOT NULL,
+    uid TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (source, uid, start)
+);
+CREATE INDEX IF NOT EXISTS idx_events_window ON events (start, end);
+CREATE TABLE IF NOT EXISTS sync_state (
+    source TEXT PRIMARY KEY,
+    synced_at REAL NOT NULL,
+    horizon_start INTEGER NOT NULL,
+    horizon_end INTEGER NOT NULL,
+    max_span INTEGER NOT NULL DEFAULT 0,
+    events INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    retry_at REAL
+);
+"""
+
+
+class EventStore:
+    """SQLite table of event instances per source
+
+    Each sync replaces a source's instances inside its horizon (the window
+    that was fetched, with recurrences already expanded). Window queries
+    scan the (start, end) index from start - max_span, where max_span is
+    the longest event of the queried sources, so old history is never read.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        columns = [row[1] for row in self._conn.execute('PRAGMA table_info(sync_state)')]
+        if 'retry_at' not in columns:
+            self._conn.execute('ALTER TABLE sync_state ADD COLUMN retry_at REAL')
+        self._lock = threading.Lock()
+
+    def replace_window(self, source: str, events: List[Dict[str, Any]], horizon_start: int, horizon_end: int,
+                       partial: bool = False, error: Optional[str] = None) -> int:
+        """Store the instances of a source fetched for [horizon_start, horizon_end)
+
+        With partial=True (some calendars failed) rows are only upserted, so
+        events of the failed calendars are kept until a complete sync.
+        """
+        rows = []
+        max_span = 0
+        for event in events:
+            start = event.get('DTSTART')
+            if not isinstance(start, int):
+                continue
+            end = max(event.get('DTEND', start), start)
+            max_span = max(max_span, end - start)
+            uid = event.get('UID') or f"{event.get('SUMMARY', '')}@{start}"
+            rows.append((source, uid, start, end, json.dumps(event, ensure_ascii=False)))
+
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                if not partial:
+                    self._conn.execute('DELETE FROM events WHERE source = ? AND end > ? AND start < ?',
+                                       (source, horizon_start, horizon_end))
+                self._conn.executemany('INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?)', rows)
+                previous = self._conn.execute('SELECT max_span FROM sync_state WHERE source = ?',
+                                              (source,)).fetchone()
+                if partial and previous:
+                    max_span = max(max_span, previous[0])
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?, ?, ?, ?, NULL)',
+                    (source, time.time(), horizon_start, horizon_end, max_span, len(rows), error))
+                # Instances that ended before the horizon are never queried again
+                self._conn.execute('DELETE FROM events WHERE source = ? AND end <= ?', (source, horizon_start))
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return len(rows)
+
+    def record_error(self, source: str, error: str, retry_after: float) -> None:
+        """Keep the last good data of a source but remember why its sync failed
+
+        Reads serve what is stored until retry_after seconds have passed, so a
+        failing (or never synced) source does not block every read on a sync.
+        """
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO sync_state (source, synced_at, horizon_start, horizon_end, error, retry_at) '
+                'VALUES (?, 0, 0, 0, ?, ?) '
+                'ON CONFLICT (source) DO UPDATE SET error = excluded.error, retry_at = excluded.retry_at',
+                (source, error, time.time() + retry_after))
+
+    def sync_state(self, source: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            cursor = self._conn.execute('SELECT * FROM sync_state WHERE source = ?', (source,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return dict(zip([c[0] for c in cursor.description], row))
+
+    def covers(self, source: str, start_ts: int, end_ts: int, max_age: float) -> bool:
+        """Whether the store can answer a window query for source without syncing first"""
+        state = self.sync_state(source)
+        if not state:
+            return False
+        if state['retry_at'] and time.time() < state['retry_at']:
+            return True
+        return time.time() - state['synced_at'] <= max_age and \
+            state['horizon_start'] <= start_ts and end_ts <= state['horizon_end']
+
+    def query(self, start_ts: int, end_ts: int, sources: List[str]) -> List[Dict[str, Any]]:
+        """Instances of the given sources overlapping [start_ts, end_ts), ordered by start"""
+        if not sources:
+            return []
+        marks = ','.join('?' * len(sources))
+        with self._lock:
+            max_span = self._conn.execute(f'SELECT MAX(max_span) FROM sync_state WHERE source IN ({marks})',
+                                          sources).fetchone()[0] or 0
+            rows = self._conn.execute(
+                f'SELECT data FROM events INDEXED BY idx_events_window '
+                f'WHERE start >= ? AND start < ? AND end > ? AND source IN ({marks}) ORDER BY start, end',
+                (start_ts - max_span, end_ts, start_ts, *sources)).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_store: Optional[EventStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> EventStore:
+    """Process-wide store at EVENT_STORE_PATH"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = EventStore(config.EVENT_STORE_PATH)
+        return _store
+
+
+def sync_horizon() -> tuple:
+    """Window fetched on each sync: a day back to EVENT_STORE_HORIZON_DAYS ahead"""
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    return now - timedelta(days=1), now + timedelta(days=config.EVENT_STORE_HORIZON_DAYS)
+
+
+def sync_source(source: str) -> int:
+    """Fetch a source's horizon from CalDAV into the store, returns instances stored"""
+    store = get_store()
+    start, end = sync_horizon()
+    try:
+        client = get_client(source)
+        if client is None:
+            store.record_error(source, 'no CalDAV account configured', config.EVENT_SYNC_RETRY_AFTER)
+            return 0
+        with tracing.span('caldav.sync', **{'caldav.source': source}):
+            events = client.get_all_events(start.strftime('%Y-%m-%d %H:%M:%S'), end.strftime('%Y-%m-%d %H:%M:%S'))
+    except Exception as e:
+        print(f"Error syncing {source} events: {e}")
+        metrics.upstream_error('caldav', e)
+        store.record_error(source, str(e), config.EVENT_SYNC_RETRY_AFTER)
+        return 0
+
+    errors = [f"{m['displayname']}: {m['error']}" for m in client.last_fetch_metrics if m['error']]
+    for error in errors:
+        metrics.upstream_error('caldav', error)
+    for event in events:
+        event['SOURCE'] = source
+    return store.replace_window(source, events, int(start.timestamp()), int(end.timestamp()),
+                                partial=bool(errors), error='; '.join(errors) or None)
+
+
+def sync_sources(sources: List[str]) -> None:
+    """Sync several sources concurrently"""
+    if len(sources) <= 1:
+        for source in sources:
+            sync_source(source)
+        return
+    with ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix='event-sync') as executor:
+        list(executor.map(tracing.propagate(sync_source), sources))
+
+
+def query_events(sources: List[str], start: str, end: str) -> Iterator[Dict[str, Any]]:
+    """Ordered, de-duplicated instances of sources in [start, end] from the store
+
+    Sources whose last sync is older than EVENT_STORE_MAX_AGE, or whose
+    horizon does not cover the window, are synced first (cold CLI runs),
+    unless their last sync failed less than EVENT_SYNC_RETRY_AFTER ago.
+    """
+    store = get_store()
+    start_ts = int(datetime.strptime(start, '%Y-%m-%d %H:%M:%S').timestamp())
+    end_ts = int(datetime.strptime(end, '%Y-%m-%d %H:%M:%S').timestamp())
+    stale = [s for s in sources if not store.covers(s, start_ts, end_ts, config.EVENT_STORE_MAX_AGE)]
+    if stale:
+        sync_sources(stale)
+    return merge_events([store.query(start_ts, end_ts, sources)])
+
+
+class EventSyncer(threading.Thread):
+    """Background thread keeping the store fresh every EVENT_SYNC_INTERVAL seconds"""
+
+    def __init__(self, sources: List[str], interval: int):
+        super().__init__(name='event-syncer', daemon=True)
+        self.sources = sources
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                sync_sources(self.sources)
+            except Exception as e:
+                print(f"Background event sync failed: {e}")
+            self._stopped.wait(self.interval)
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+_syncer: Optional[EventSyncer] = None
+
+
+def start_background_sync(sources: List[str]) -> EventSyncer:
+    """Start the background syncer once per process"""
+    global _syncer
+    with _store_lock:
+        if _syncer is None or not _syncer.is_alive():
+            _syncer = EventSyncer(sources, config.EVENT_SYNC_INTERVAL)
+            _syncer.start()
+        return _syncer
+
+
+def stop_background_sync() -> None:
+    global _syncer
+    with _store_lock:
+        if _syncer is not None:
+            _syncer.stop()
+            _syncer = None
@@ -0,0 +1,47 @@
+"""
+Font loading
+Parsed FreeType fonts are cached so renders don't re-read the .ttf files each time
+"""
+
+import os
+import threading
+from typing import Dict, Tuple
+
+from PIL import ImageFont
+
+
+FONTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'assets', 'fonts')
+TEXT_FONT = os.path.join(FONTS_DIR, 'fusion-pixel-12px-monospaced-zh_hans.ttf')
+ICON_FONT = os.path.join(FONTS_DIR, 'qweather-icons.ttf')
+
+# (font, size) pairs drawn by DotCalendar and WeatherChart
+PRELOAD = (
+    (TEXT_FONT, 9), (TEXT_FONT, 10), (TEXT_FONT, 20),
+    (ICON_FONT, 10), (ICON_FONT, 12), (ICON_FONT, 35),
+)
+
+# One cache per thread: a FreeType face must not be used by two threads at once
+_local = threading.local()
+
+
+def get_font(path: str, size: int) -> ImageFont.FreeTypeFont:
+    """Cached ImageFont.truetype(path, size); raises OSError like truetype when missing"""
+    cache: Dict[Tuple[str, int], ImageFont.FreeTypeFont] = getattr(_local, 'fonts', None)
+    if cache is None:
+        cache = _local.fonts = {}
+    font = cache.get((path, size))
+    if font is None:
+        font = cache[(path, size)] = ImageFont.truetype(path, size)
+    return font
+
+
+def preload() -> int:
+    """Load every PRELOAD font into this thread's cache, returns how many loaded"""
+    loaded = 0
+    for path, size in PRELOAD:
+        try:
+            get_font(path, size)
+            loaded += 1
+        except OSError:
+            pass
+    return loaded
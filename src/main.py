@@ -2,32 +2,21 @@ import sys
 import os
 import json
 from datetime import datetime
-from typing import List
+from typing import Any, Dict, Iterable, List
 import urllib.parse
 
 # Add the current directory to the path so we can import our modules
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 import config
-from dot_calendar import DotCalendar
-from clients.dingtalk_caldav_client import DingtalkCalDAVClient
+import metrics
+import tracing
 
-# Try to import optional calendar clients
-try:
-    from clients.icloud_caldav_client import ICloudCalDAVClient
-    ICLOUD_AVAILABLE = True
-except ImportError:
-    ICloudCalDAVClient = None
-    ICLOUD_AVAILABLE = False
-
-try:
-    from clients.google_caldav_client import GoogleCalDAVClient
-    GOOGLE_AVAILABLE = True
-except ImportError:
-    GoogleCalDAVClient = None
-    GOOGLE_AVAILABLE = False
+# CalDAV clients, the event store and the drawing code are imported where they are used,
+# so a run with --calendar (or a cron run that fails the token check) never loads them
 
 
+@metrics.timed('todolist_fetch')
 def get_todolist_from_calendar_param(calendar_param: str) -> List[str]:
     """Get todo list from calendar parameter"""
     if not calendar_param:
@@ -59,142 +48,67 @@ def get_todolist_from_calendar_param(calendar_param: str) -> List[str]:
         return []
 
 
+def events_to_todolist(events: Iterable[Dict[str, Any]]) -> List[str]:
+    """Format time-ordered events as todo lines, with a blank line between days"""
+    from clients.caldav_utils import event_timestamp
+
+    todolist = []
+    index_day = datetime.now().day
+    
+    for event in events:
+        if 'SUMMARY' in event and event_timestamp(event) is not None:
+            event_date = datetime.fromtimestamp(event_timestamp(event))
+            if event_date.day != index_day:
+                todolist.append("")
+                index_day = event_date.day
+                
+            time_label = '全天' if event.get('ALL_DAY') else event_date.strftime('%H:%M')
+            todolist.append(f"{time_label} {event['SUMMARY']}")
+            
+    return todolist
+
+
+@metrics.timed('todolist_fetch')
+def get_todolist_from_sources(sources: List[str]) -> List[str]:
+    """Get todo list from several calendar sources, merged in time order"""
+    import sqlite3
+    from calendar_aggregator import aggregate_events, default_window
+
+    if config.EVENT_STORE_ENABLED:
+        import event_store
+
+        try:
+            return events_to_todolist(event_store.query_events(sources, *default_window()))
+        except sqlite3.Error as e:
+            print(f"Event store unavailable, fetching from CalDAV: {e}")
+    return events_to_todolist(aggregate_events(sources))
+
+
 def get_todolist_from_dingtalk() -> List[str]:
     """Get todo list from DingTalk calendar"""
-    if not config.DINGTALK_CALDAV_USER or not config.DINGTALK_CALDAV_PASS:
-        return []
-        
-    try:
-        client = DingtalkCalDAVClient(config.DINGTALK_CALDAV_USER, config.DINGTALK_CALDAV_PASS)
-        # Match PHP version time range: -2 hours to +2 days
-        from datetime import timedelta
-        start_time = (datetime.now() - timedelta(hours=2)).strftime('%Y-%m-%d %H:%M:%S')
-        end_time = (datetime.now() + timedelta(days=2)).strftime('%Y-%m-%d %H:%M:%S')
-        
-        events = client.get_all_events(start_time, end_time)
-        
-        todolist = []
-        index_day = datetime.now().day
-        
-        for event in events:
-            if 'SUMMARY' in event and 'DTSTART' in event:
-                event_date = datetime.fromtimestamp(event['DTSTART'])
-                if event_date.day != index_day:
-                    todolist.append("")
-                    index_day = event_date.day
-                    
-                todolist.append(f"{event_date.strftime('%H:%M')} {event['SUMMARY']}")
-                
-        client.close()
-        return todolist
-    except Exception as e:
-        print(f"Error getting DingTalk events: {e}")
-        return []
+    return get_todolist_from_sources(['dingtalk'])
 
 
 def get_todolist_from_icloud() -> List[str]:
     """Get todo list from iCloud calendar"""
-    if not ICLOUD_AVAILABLE:
-        print("iCloud CalDAV client not available. Please install required dependencies.")
-        return []
-        
-    if not config.ICLOUD_CALDAV_URL or not config.ICLOUD_CALDAV_USER or not config.ICLOUD_CALDAV_PASS:
-        return []
-        
-    try:
-        client = ICloudCalDAVClient(config.ICLOUD_CALDAV_USER, config.ICLOUD_CALDAV_PASS, config.ICLOUD_CALDAV_URL)
-        events = client.get_all_events(
-            datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            datetime.now().strftime('%Y-%m-%d 00:00:00')
-        )
-        
-        todolist = []
-        index_day = datetime.now().day
-        
-        for event in events:
-            if 'SUMMARY' in event and 'DTSTART' in event:
-                # Handle different time formats
-                if isinstance(event['DTSTART'], int):
-                    event_date = datetime.fromtimestamp(event['DTSTART'])
-                else:
-                    # Try to parse as string date
-                    try:
-                        event_date = datetime.strptime(event['DTSTART'], '%Y%m%dT%H%M%S')
-                    except ValueError:
-                        event_date = datetime.now()
-                        
-                if event_date.day != index_day:
-                    todolist.append("")
-                    index_day = event_date.day
-                    
-                todolist.append(f"{event_date.strftime('%H:%M')} {event['SUMMARY']}")
-                
-        client.close()
-        return todolist
-    except Exception as e:
-        print(f"Error fetching iCloud calendar events: {e}")
-        return []
+    return get_todolist_from_sources(['icloud'])
 
 
 def get_todolist_from_google() -> List[str]:
     """Get todo list from Google calendar"""
-    if not GOOGLE_AVAILABLE:
-        print("Google CalDAV client not available. Please install required dependencies.")
-        return []
-        
-    if not config.GOOGLE_CALDAV_URL or not config.GOOGLE_CALDAV_USER or not config.GOOGLE_CALDAV_PASS:
-        return []
-        
-    try:
-        client = GoogleCalDAVClient(config.GOOGLE_CALDAV_USER, config.GOOGLE_CALDAV_PASS, config.GOOGLE_CALDAV_URL)
-        events = client.get_all_events(
-            datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            datetime.now().strftime('%Y-%m-%d 00:00:00')
-        )
-        
-        todolist = []
-        index_day = datetime.now().day
-        
-        for event in events:
-            if 'SUMMARY' in event and 'DTSTART' in event:
-                # Handle different time formats
-                if isinstance(event['DTSTART'], int):
-                    event_date = datetime.fromtimestamp(event['DTSTART'])
-                else:
-                    # Try to parse as string date
-                    try:
-                        event_date = datetime.strptime(event['DTSTART'], '%Y%m%dT%H%M%S')
-                    except ValueError:
-                        event_date = datetime.now()
-                        
-                if event_date.day != index_day:
-                    todolist.append("")
-                    index_day = event_date.day
-                    
-                todolist.append(f"{event_date.strftime('%H:%M')} {event['SUMMARY']}")
-                
-        client.close()
-        return todolist
-    except Exception as e:
-        print(f"Error fetching Google calendar events: {e}")
-        return []
+    return get_todolist_from_sources(['google'])
 
 
 def get_todolist_from_calendar() -> List[str]:
-    """Get todo list from configured calendar source"""
-    calendar_source = config.CALENDAR_SOURCE.lower()
-    
-    if calendar_source == 'dingtalk':
-        return get_todolist_from_dingtalk()
-    elif calendar_source == 'icloud':
-        return get_todolist_from_icloud()
-    elif calendar_source == 'google':
-        return get_todolist_from_google()
-    else:
-        # Default to dingtalk for backward compatibility
-        return get_todolist_from_dingtalk()
+    """Get todo list from the configured calendar source(s), e.g. 'dingtalk,icloud'"""
+    from calendar_aggregator import parse_sources
 
+    # Default to dingtalk for backward compatibility
+    sources = parse_sources(config.CALENDAR_SOURCE) or ['dingtalk']
+    return get_todolist_from_sources(sources)
 
+
+@tracing.traced('cli.main')
 def main():
     """Main function"""
     # Parse query parameters (in a real web app, this would come from the request)
@@ -205,6 +119,8 @@ def main():
     parser.add_argument('--dotsync', type=int, default=0, help='Sync to Dot device')
     parser.add_argument('--device_idx', type=int, default=-1, help='Device index')
     args = parser.parse_args()
+    if config.METRICS_LOG:
+        metrics.enable_event_log(run='cli')
     
     # Token verification
     if not args.token or args.token != config.DOT_CALENDAR_TOKEN:
@@ -221,6 +137,8 @@ def main():
 
     
     # Create calendar
+    from dot_calendar import DotCalendar
+
     dot_calendar = DotCalendar(
         config.DOT_DEVICE_ID,
         config.DOT_APP_KEY,
@@ -0,0 +1,304 @@
+"""
+Pipeline metrics
+Per-stage timings and counters in the Prometheus text format, without a client library.
+Every observation is also passed to the registered hooks, which the CLI and scheduler
+use for structured (JSON lines) logs, and every stage is a tracing span.
+"""
+
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import tracing
+
+if TYPE_CHECKING:
+    import logging
+
+# Render pipeline stages, in pipeline order
+STAGES = ('todolist_fetch', 'weather_fetch', 'cache_lookup', 'layout', 'draw', 'binarize', 'encode',
+          'device_push')
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def expose(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        return '\n'.join(lines + self.samples())
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in values]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][index] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    def get(self, **labels) -> Dict[str, float]:
+        """{'count': n, 'sum': seconds} of one series"""
+        with self._lock:
+            series = self._values.get(self._key(labels))
+            return {'count': series['count'], 'sum': series['sum']} if series else {'count': 0, 'sum': 0.0}
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, dict(series, counts=list(series['counts']))) for key, series in self._values.items())
+        lines = []
+        for key, series in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series['counts']):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(series["sum"])}')
+            lines.append(f'{self.name}_count{labels} {series["count"]}')
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+
+STAGE_SECONDS = Histogram('dotcal_stage_seconds', 'Seconds spent in each render pipeline stage', ('stage',))
+STAGE_ERRORS = Counter('dotcal_stage_errors_total', 'Pipeline stages that raised', ('stage',))
+CACHE_REQUESTS = Counter('dotcal_cache_requests_total', 'Cache reads by namespace and result (hit, miss, error)',
+                         ('namespace', 'result'))
+UPSTREAM_ERRORS = Counter('dotcal_upstream_errors_total', 'Failed calls to upstream services', ('upstream',))
+REQUESTS_IN_FLIGHT = Gauge('dotcal_http_requests_in_flight', 'HTTP requests being served')
+REQUEST_SECONDS = Histogram('dotcal_http_request_seconds', 'HTTP request latency', ('method', 'route', 'status'))
+PUSH_ATTEMPTS = Counter('dotcal_device_push_attempts_total', 'Dot API push attempts by outcome (ok, retry, failed)',
+                        ('result',))
+
+
+def generate_latest() -> str:
+    """Every metric in the Prometheus text exposition format (version 0.0.4)"""
+    return '\n'.join(metric.expose() for metric in REGISTRY) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+# ---- hooks ----
+
+_hooks: List[Callable[[Dict[str, Any]], None]] = []
+_local = threading.local()
+
+
+def add_hook(hook: Callable[[Dict[str, Any]], None]) -> None:
+    """Call hook(event) for every stage timing and upstream error recorded in this process"""
+    if hook not in _hooks:
+        _hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[Dict[str, Any]], None]) -> None:
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def _emit(event: Dict[str, Any]) -> None:
+    for hook in list(_hooks):
+        try:
+            hook(event)
+        except Exception:
+            pass
+
+
+def observe_stage(name: str, seconds: float, error: Optional[str] = None, started_ns: Optional[int] = None) -> None:
+    """Record one stage run, or hand it to the enclosing capture()"""
+    captured = getattr(_local, 'captured', None)
+    if captured is not None:
+        captured.append((name, seconds, error, started_ns or time.time_ns() - int(seconds * 1e9)))
+        return
+    STAGE_SECONDS.observe(seconds, stage=name)
+    if error is not None:
+        STAGE_ERRORS.inc(stage=name)
+    _emit({'event': 'stage', 'stage': name, 'seconds': round(seconds, 6), 'error': error})
+
+
+@contextmanager
+def stage(name: str, **attributes: Any) -> Iterator[Any]:
+    """Time the enclosed block as pipeline stage name, yields its tracing span
+
+    Inside capture() no span is opened; replay() exports the stages as spans
+    of the process that replays them.
+    """
+    started_ns = time.time_ns()
+    started = time.perf_counter()
+    capturing = getattr(_local, 'captured', None) is not None
+    with (nullcontext(tracing.NOOP_SPAN) if capturing else tracing.span(name, **attributes)) as span:
+        try:
+            yield span
+        except BaseException as e:
+            observe_stage(name, time.perf_counter() - started, type(e).__name__, started_ns)
+            raise
+        observe_stage(name, time.perf_counter() - started, None, started_ns)
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """Decorator form of stage()"""
+    def decorate(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def upstream_error(upstream: str, error: Any = None) -> None:
+    """Count a failed call to 'qweather', 'caldav' or 'dot'"""
+    UPSTREAM_ERRORS.inc(upstream=upstream)
+    _emit({'event': 'upstream_error', 'upstream': upstream, 'error': None if error is None else str(error)})
+
+
+def record_event(event: str, **fields: Any) -> None:
+    """Pass a structured event (e.g. one device's push result) to the hooks"""
+    _emit({'event': event, **fields})
+
+
+def cache_request(namespace: str, result: str) -> None:
+    CACHE_REQUESTS.inc(namespace=namespace, result=result)
+
+
+@contextmanager
+def capture() -> Iterator[List[Tuple[str, float, Optional[str], int]]]:
+    """Collect this thread's stage timings instead of recording them
+
+    Render farm workers run stages in another process; they capture them
+    and the parent replays them into its own registry.
+    """
+    previous = getattr(_local, 'captured', None)
+    _local.captured = captured = []
+    try:
+        yield captured
+    finally:
+        _local.captured = previous
+
+
+def replay(stages: List[Tuple[str, float, Optional[str], int]]) -> None:
+    for name, seconds, error, started_ns in stages:
+        observe_stage(name, seconds, error, started_ns)
+        tracing.record_span(name, started_ns, seconds, error)
+
+
+# ---- structured logs ----
+
+class JsonLogHook:
+    """Hook writing each event as one JSON object per log line"""
+
+    def __init__(self, logger: 'logging.Logger', **context: Any):
+        self.logger = logger
+        self.context = context
+
+    def __call__(self, event: Dict[str, Any]) -> None:
+        import logging
+
+        record = {'ts': round(time.time(), 3), **self.context, **event}
+        request_id = tracing.current_request_id()
+        if request_id:
+            record.setdefault('request_id', request_id)
+        level = logging.WARNING if event.get('error') else logging.INFO
+        self.logger.log(level, json.dumps(record, ensure_ascii=False))
+
+
+def enable_event_log(logger: Optional['logging.Logger'] = None, **context: Any) -> JsonLogHook:
+    """Log every metric event as JSON lines
+
+    Without a logger the events go to stderr through the 'dot_calendar.events'
+    logger; context (e.g. run='scheduler') is added to every line.
+    """
+    import logging
+
+    if logger is None:
+        logger = logging.getLogger('dot_calendar.events')
+        if not logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+    hook = JsonLogHook(logger, **context)
+    add_hook(hook)
+    return hook
@@ -0,0 +1,248 @@
+"""
+Device push
+The one place images are sent to Dot devices. The request body is built once per image,
+requests share a pooled HTTP session and run concurrently with bounded parallelism.
+Each device is retried with jittered exponential backoff on 429/5xx and network errors
+within its own deadline, and gets a structured result.
+"""
+
+import base64
+import dataclasses
+import hashlib
+import json
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import config
+import metrics
+import tracing
+
+if TYPE_CHECKING:
+    import requests
+
+DOT_IMAGE_API = 'https://dot.mindreset.tech/api/open/image'
+
+
+@dataclass
+class PushResult:
+    """Outcome of pushing to one device
+
+    status is the last HTTP status (None when no response arrived), seconds
+    covers every attempt and backoff, coalesced marks a result shared with an
+    identical push that was already in flight.
+    """
+    device_id: str
+    ok: bool
+    status: Optional[int] = None
+    seconds: float = 0.0
+    error: Optional[str] = None
+    attempts: int = 0
+    idempotency_key: str = ''
+    coalesced: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'device_id': self.device_id, 'ok': self.ok, 'status': self.status,
+                'seconds': round(self.seconds, 3), 'error': self.error, 'attempts': self.attempts,
+                'idempotency_key': self.idempotency_key, 'coalesced': self.coalesced}
+
+
+class PushPayload:
+    """Request body for one image, base64 and JSON encoded once for every device
+
+    Only the deviceId differs between devices, so the body is a fixed prefix
+    (holding the image) followed by the JSON encoded device ID.
+    """
+
+    def __init__(self, image_content: bytes):
+        fields = {
+            'image': base64.b64encode(image_content).decode('ascii'),
+            'refreshNow': True,
+            'border': 0,
+            'ditherType': 'NONE',
+            'link': 'https://dot.mindreset.tech',
+        }
+        self._prefix = json.dumps(fields)[:-1].encode('ascii') + b', "deviceId": '
+        self.digest = hashlib.sha256(image_content).hexdigest()
+
+    def body(self, device_id: str) -> bytes:
+        return self._prefix + json.dumps(device_id).encode('ascii') + b'}'
+
+    def idempotency_key(self, device_id: str) -> str:
+        """Same for every attempt of this image to this device, so a retried push can be deduplicated"""
+        return hashlib.sha256(f'{device_id}\0{self.digest}'.encode('utf-8')).hexdigest()[:32]
+
+
+def parse_devices(device_ids: Union[str, Sequence[str], None]) -> List[str]:
+    """Device IDs from a comma separated string (as in DOT_DEVICE_ID) or a list, duplicates dropped"""
+    if not device_ids:
+        return []
+    if isinstance(device_ids, str):
+        device_ids = device_ids.split(',')
+    return list(dict.fromkeys(d.strip() for d in device_ids if d and d.strip()))
+
+
+_session: Optional['requests.Session'] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> 'requests.Session':
+    """Process-wide session keeping up to PUSH_CONCURRENCY connections to the Dot API alive"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                    pool_maxsize=max(1, config.PUSH_CONCURRENCY))
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Seconds to wait after failed attempt number attempt (1-based)
+
+    Full jitter: uniform in [0, PUSH_BACKOFF * 2^(attempt-1)], capped at PUSH_BACKOFF_MAX,
+    so devices failing together don't retry in lockstep. A Retry-After from the server wins.
+    """
+    if retry_after is not None:
+        return min(max(retry_after, 0.0), config.PUSH_BACKOFF_MAX)
+    return random.uniform(0, min(config.PUSH_BACKOFF_MAX, config.PUSH_BACKOFF * 2 ** (attempt - 1)))
+
+
+def _retry_after(response: 'requests.Response') -> Optional[float]:
+    """Retry-After in seconds (delta-seconds or HTTP-date form), None if absent or invalid"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(value).timestamp() - time.time()
+    except (TypeError, ValueError):
+        return None
+
+
+def _retryable(status: int) -> bool:
+    return status == 429 or status >= 500
+
+
+def _send(session: 'requests.Session', headers: Dict[str, str], payload: PushPayload, device_id: str,
+          timeout: float, retries: int) -> PushResult:
+    """Push to one device, retrying 429/5xx and network errors until success or the deadline"""
+    import requests
+
+    key = payload.idempotency_key(device_id)
+    headers = {**headers, 'Idempotency-Key': key}
+    body = payload.body(device_id)
+    started = time.monotonic()
+    deadline = started + timeout
+    status, error, attempt = None, None, 0
+    while attempt <= retries:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            error = f'timed out after {timeout:g}s ({error})' if error else f'timed out after {timeout:g}s'
+            break
+        attempt += 1
+        retry_after = None
+        try:
+            with metrics.stage('device_push', **{'dot.device_id': device_id, 'dot.attempt': attempt,
+                                                 'http.url': DOT_IMAGE_API}) as span:
+                response = session.post(DOT_IMAGE_API, data=body, headers=headers, timeout=remaining)
+                span.set_attribute('http.status_code', response.status_code)
+        except requests.RequestException as e:
+            status, error = None, str(e)
+            retryable = isinstance(e, (requests.ConnectionError, requests.Timeout))
+        else:
+            status = response.status_code
+            if status == 200:
+                metrics.PUSH_ATTEMPTS.inc(result='ok')
+                return PushResult(device_id, True, status, time.monotonic() - started, None, attempt, key)
+            error = f'HTTP {status}: {response.text[:200]}'
+            retryable, retry_after = _retryable(status), _retry_after(response)
+        metrics.upstream_error('dot', error)
+        if not retryable or attempt > retries:
+            break
+        delay = backoff_delay(attempt, retry_after)
+        if time.monotonic() + delay >= deadline:
+            break
+        metrics.PUSH_ATTEMPTS.inc(result='retry')
+        time.sleep(delay)
+    metrics.PUSH_ATTEMPTS.inc(result='failed')
+    return PushResult(device_id, False, status, time.monotonic() - started, error, attempt, key)
+
+
+# (app key, idempotency key) -> result of the push in flight
+_in_flight: Dict[Tuple[str, str], Future] = {}
+_in_flight_lock = threading.Lock()
+
+
+def _send_once(session: 'requests.Session', headers: Dict[str, str], payload: PushPayload, device_id: str,
+               timeout: float, retries: int) -> PushResult:
+    """_send, unless the same image is already being pushed to the device; then share that result
+
+    Two dotsync requests rendering the same frame, or the same device listed in two
+    batch profiles, refresh the panel once.
+    """
+    key = (headers['Authorization'], payload.idempotency_key(device_id))
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        owner = future is None
+        if owner:
+            future = _in_flight[key] = Future()
+    if not owner:
+        return dataclasses.replace(future.result(), coalesced=True)
+    try:
+        result = _send(session, headers, payload, device_id, timeout, retries)
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _in_flight_lock:
+            _in_flight.pop(key, None)
+
+
+def push(device_ids: Union[str, Sequence[str]], app_key: str, image_content: bytes,
+         max_workers: Optional[int] = None, timeout: Optional[float] = None,
+         retries: Optional[int] = None) -> List[PushResult]:
+    """Push one encoded image to every device, at most max_workers (PUSH_CONCURRENCY) at a time
+
+    Each device gets timeout seconds (PUSH_TIMEOUT) for all of its attempts and up to
+    retries (PUSH_RETRIES) retries. Returns one PushResult per device, in the order
+    given; a failing device never stops the others.
+    """
+    devices = parse_devices(device_ids)
+    if not devices:
+        return []
+    timeout = config.PUSH_TIMEOUT if timeout is None else timeout
+    retries = max(0, config.PUSH_RETRIES if retries is None else retries)
+    payload = PushPayload(image_content)
+    headers = {
+        'Authorization': f'Bearer {app_key}',
+        'Content-Type': 'application/json',
+        'Accept-Encoding': 'identity',
+    }
+    session = get_session()
+    workers = min(len(devices), max(1, max_workers or config.PUSH_CONCURRENCY))
+
+    def send(device_id: str) -> PushResult:
+        result = _send_once(session, headers, payload, device_id, timeout, retries)
+        metrics.record_event('device_push_result', **result.to_dict())
+        return result
+
+    with tracing.span('device_push.fan_out', **{'dot.devices': len(devices), 'dot.workers': workers}):
+        if workers == 1:
+            return [send(device_id) for device_id in devices]
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='push') as executor:
+            return list(executor.map(tracing.propagate(send), devices))
@@ -0,0 +1,136 @@
+"""
+Bounded render executor
+Runs the blocking render pipeline (HTTP/CalDAV fetches, Pillow drawing, binarization)
+off the event loop with a fixed number of workers and a bounded queue
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class ExecutorFull(Exception):
+    """Every worker is busy and the queue is full"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"render queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+@dataclass
+class RenderTiming:
+    """Seconds spent waiting for a worker and running on it"""
+    queue_wait: float
+    run: float
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, durations in milliseconds"""
+        return f"queue;dur={self.queue_wait * 1000:.1f}, render;dur={self.run * 1000:.1f}"
+
+
+class BoundedExecutor:
+    """Thread pool admitting at most max_workers running + max_queue waiting jobs
+
+    Jobs past that capacity are rejected immediately with ExecutorFull,
+    carrying a Retry-After estimate from the recent average run time.
+    """
+
+    # Weight of the newest run time in the moving average
+    EWMA_ALPHA = 0.2
+
+    def __init__(self, max_workers: int, max_queue: int, name: str = 'render',
+                 initializer: Optional[Callable[[], Any]] = None):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name,
+                                            initializer=initializer)
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._avg_run = 0.0
+        self._stats = {'completed': 0, 'failed': 0, 'rejected': 0, 'cancelled': 0,
+                       'queue_wait_seconds': 0.0, 'run_seconds': 0.0, 'max_queue_wait_seconds': 0.0}
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free: one queue's worth of runs per worker"""
+        with self._lock:
+            waves = (self._pending + 1) / self.max_workers
+            return max(1, round(waves * (self._avg_run or 1.0)))
+
+    def _run(self, func: Callable[..., Any], args: Tuple, submitted: float) -> Tuple[Any, RenderTiming]:
+        started = time.perf_counter()
+        with self._lock:
+            self._running += 1
+        ok = False
+        try:
+            result = func(*args)
+            ok = True
+        finally:
+            finished = time.perf_counter()
+            timing = RenderTiming(started - submitted, finished - started)
+            with self._lock:
+                self._running -= 1
+                self._stats['completed' if ok else 'failed'] += 1
+                self._stats['queue_wait_seconds'] += timing.queue_wait
+                self._stats['run_seconds'] += timing.run
+                self._stats['max_queue_wait_seconds'] = max(self._stats['max_queue_wait_seconds'], timing.queue_wait)
+                self._avg_run = timing.run if not self._avg_run else \
+                    self.EWMA_ALPHA * timing.run + (1 - self.EWMA_ALPHA) * self._avg_run
+        return result, timing
+
+    def _release(self, future: Future) -> None:
+        """Give the job's slot back once it is done, including when it was cancelled before starting"""
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled():
+                self._stats['cancelled'] += 1
+        self._slots.release()
+
+    async def run(self, func: Callable[..., Any], *args) -> Tuple[Any, RenderTiming]:
+        """Run func(*args) on a worker, returning (result, timing); raises ExecutorFull"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise ExecutorFull(self.retry_after())
+        with self._lock:
+            self._pending += 1
+        try:
+            # Run in a copy of the caller's context so request IDs and tracing spans carry over
+            context = contextvars.copy_context()
+            future = self._executor.submit(context.run, self._run, func, args, time.perf_counter())
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            self._slots.release()
+            raise
+        # Cancelling the awaiting task cancels a job still in the queue; _run then never runs
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def warm_up(self, timeout: float = 10.0) -> None:
+        """Start every worker thread (and its initializer) now, rather than on the first requests"""
+        # Each job blocks until all have started, so the pool can't reuse one idle thread for all of them
+        barrier = threading.Barrier(self.max_workers)
+        for future in [self._executor.submit(barrier.wait, timeout) for _ in range(self.max_workers)]:
+            future.result()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            done = self._stats['completed'] + self._stats['failed']
+            return {
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'running': self._running,
+                'queued': self._pending - self._running,
+                **self._stats,
+                'avg_queue_wait_seconds': self._stats['queue_wait_seconds'] / done if done else 0.0,
+                'avg_run_seconds': self._stats['run_seconds'] / done if done else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,207 @@
+"""
+Render farm
+CPU-bound drawing and PNG encoding run in a pool of worker processes, so renders scale
+across cores instead of contending for the GIL. Jobs carry already-fetched data only.
+"""
+
+import base64
+import hashlib
+import json
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import config
+import encoders
+import metrics
+import tracing
+from utils import W2FileCache, RENDER_CACHE
+
+
+@dataclass
+class RenderJob:
+    """A picklable render request
+
+    kind: 'calendar' (DotCalendar, data is the QWeather daily response)
+          or 'weather_chart' (WeatherChart, data is its weather_data list)
+    options: 'blackwhite' (default True) binarizes before encoding,
+             'format' picks the encoders.ENCODERS entry (default 'png')
+    """
+    kind: str
+    data: Any
+    todolist: List[str] = field(default_factory=list)
+    options: Dict[str, Any] = field(default_factory=dict)
+
+    def digest(self) -> str:
+        """sha256 of everything the rendered image depends on
+
+        Besides the job itself that is the date and whether it is past 17:00,
+        which pick the day labels and night icons. RENDER_CACHE's version is
+        included, so bumping it after a drawing change also changes every ETag.
+        """
+        now = datetime.now()
+        payload = json.dumps([RENDER_CACHE.version, self.kind, self.data, self.todolist, self.options,
+                              now.strftime('%Y-%m-%d'), now.hour >= 17],
+                             sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def format_options(format: Optional[str]) -> Dict[str, Any]:
+    """RenderJob options for an output format; none for the default, so PNG digests stay unchanged"""
+    if not format or format == encoders.DEFAULT_FORMAT:
+        return {}
+    return {'format': encoders.get_encoder(format).name}
+
+
+def _render_calendar(job: RenderJob):
+    from dot_calendar import DotCalendar
+
+    dot_calendar = DotCalendar(todolist=list(job.todolist))
+    dot_calendar.data = job.data or {}
+    dot_calendar.process_weather_data()
+    dot_calendar.create_image()
+    if job.options.get('blackwhite', True):
+        return dot_calendar.blackwhite_image(dot_calendar.image)
+    return dot_calendar.image
+
+
+def _render_weather_chart(job: RenderJob):
+    from weather_chart import WeatherChart
+
+    chart = WeatherChart()
+    chart.weather_data = job.data
+    chart.create_image()
+    if job.options.get('blackwhite', True):
+        return chart.blackwhite_image()
+    return chart.image
+
+
+RENDERERS: Dict[str, Callable[[RenderJob], Any]] = {
+    'calendar': _render_calendar,
+    'weather_chart': _render_weather_chart,
+}
+
+
+def render_png(job: RenderJob) -> bytes:
+    """Render a job in the current process and return the encoded bytes (PNG unless options['format'])"""
+    renderer = RENDERERS.get(job.kind)
+    if renderer is None:
+        raise ValueError(f"Unknown render job kind: {job.kind}")
+    encoder = encoders.get_encoder(job.options.get('format'))
+    image = renderer(job)
+    with metrics.stage('encode'):
+        return encoder.encode(image)
+
+
+def _render_in_worker(job: RenderJob) -> Tuple[bytes, List[Tuple[str, float, Optional[str], int]]]:
+    """render_png plus its stage timings, which the parent records (worker metrics are never scraped)"""
+    with metrics.capture() as stages:
+        png = render_png(job)
+    return png, stages
+
+
+def _init_worker() -> None:
+    """Pay imports and font parsing once per worker instead of on the first job"""
+    import fonts
+    from PIL import Image, PngImagePlugin  # noqa: F401
+    import dot_calendar  # noqa: F401
+    import weather_chart  # noqa: F401
+
+    Image.init()
+    fonts.preload()
+
+
+def _ping() -> bool:
+    return True
+
+
+class RenderFarm:
+    """ProcessPoolExecutor of pre-warmed render workers
+
+    Uses the 'spawn' start method: the API process runs background threads
+    (event sync, render executor) that a fork could copy mid-operation.
+    """
+
+    def __init__(self, processes: int):
+        self.processes = max(1, processes)
+        self._pool = ProcessPoolExecutor(max_workers=self.processes,
+                                         mp_context=multiprocessing.get_context('spawn'),
+                                         initializer=_init_worker)
+
+    def warm_up(self) -> None:
+        """Start every worker now, rather than on the first requests"""
+        for future in [self._pool.submit(_ping) for _ in range(self.processes)]:
+            future.result()
+
+    def submit(self, job: RenderJob) -> Future:
+        return self._pool.submit(render_png, job)
+
+    def render(self, job: RenderJob) -> bytes:
+        """Render on a worker, recording its stage timings in this process"""
+        png, stages = self._pool.submit(_render_in_worker, job).result()
+        metrics.replay(stages)
+        return png
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+_farm: Optional[RenderFarm] = None
+_farm_lock = threading.Lock()
+
+
+def get_render_farm() -> Optional[RenderFarm]:
+    """Process-wide farm with RENDER_PROCESSES workers, None when disabled (0)"""
+    global _farm
+    if config.RENDER_PROCESSES <= 0:
+        return None
+    with _farm_lock:
+        if _farm is None:
+            _farm = RenderFarm(config.RENDER_PROCESSES)
+        return _farm
+
+
+def render(job: RenderJob, in_process: bool = False) -> bytes:
+    """Render on the farm, or in this process when the farm is disabled
+
+    One-shot callers (the scheduler) pass in_process=True: spawning and
+    warming worker processes for a single render costs more than it saves.
+    """
+    global _farm
+    farm = None if in_process else get_render_farm()
+    with tracing.span('render', **{'render.kind': job.kind, 'render.in_process': farm is None}):
+        if farm is None:
+            return render_png(job)
+        try:
+            return farm.render(job)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM killed); start a fresh pool for the next job
+            with _farm_lock:
+                if _farm is farm:
+                    _farm = None
+            farm.shutdown()
+            raise
+
+
+def render_cached(job: RenderJob, digest: Optional[str] = None) -> Tuple[str, bytes]:
+    """(digest, PNG) from RENDER_CACHE, rendering only when the inputs are new"""
+    digest = digest or job.digest()
+    key = RENDER_CACHE.key('png', digest)
+    cached = W2FileCache.get_cache(key)
+    if isinstance(cached, str):
+        return digest, base64.b64decode(cached)
+    png = render(job)
+    W2FileCache.set_cache(key, base64.b64encode(png).decode('ascii'), config.RENDER_CACHE_TTL)
+    return digest, png
+
+
+def shutdown_render_farm() -> None:
+    global _farm
+    with _farm_lock:
+        farm, _farm = _farm, None
+    if farm is not None:
+        farm.shutdown()
@@ -0,0 +1,272 @@
+"""
+Request tracing
+Nested spans with W3C trace context and a request ID carried in contextvars. Spans are
+written as OTLP/JSON shaped records to the console or a local JSON-lines file, so traces
+work offline and can later be replayed into any OpenTelemetry backend.
+"""
+
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, TextIO, Tuple
+
+import config
+
+
+# Plain classes rather than dataclasses: metrics imports this module, and the CLIs import metrics
+
+
+class SpanContext:
+    """Identity of a span, e.g. the remote parent from an incoming traceparent header"""
+    __slots__ = ('trace_id', 'span_id')
+
+    def __init__(self, trace_id: str, span_id: str):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+    def traceparent(self) -> str:
+        return f'00-{self.trace_id}-{self.span_id}-01'
+
+
+class Span(SpanContext):
+    """A timed operation; parent_id is None for the root of a trace"""
+    __slots__ = ('name', 'parent_id', 'start_ns', 'end_ns', 'attributes', 'error')
+
+    def __init__(self, trace_id: str, span_id: str, name: str, parent_id: Optional[str] = None,
+                 start_ns: int = 0, attributes: Optional[Dict[str, Any]] = None):
+        super().__init__(trace_id, span_id)
+        self.name = name
+        self.parent_id = parent_id
+        self.start_ns = start_ns
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes or {}
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def end(self, end_ns: Optional[int] = None) -> None:
+        self.end_ns = end_ns or time.time_ns()
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """The span as an OTLP/JSON span object"""
+        def value(v: Any) -> Dict[str, Any]:
+            if isinstance(v, bool):
+                return {'boolValue': v}
+            if isinstance(v, int):
+                return {'intValue': str(v)}
+            if isinstance(v, float):
+                return {'doubleValue': v}
+            return {'stringValue': str(v)}
+
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': 'SPAN_KIND_INTERNAL',
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns or self.start_ns),
+            'attributes': [{'key': k, 'value': value(v)} for k, v in self.attributes.items()],
+            'status': {'code': 'STATUS_CODE_ERROR', 'message': self.error} if self.error
+            else {'code': 'STATUS_CODE_OK'},
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+class _NoopSpan:
+    """Stands in for a span while tracing is off"""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: contextvars.ContextVar[Optional[SpanContext]] = contextvars.ContextVar('current_span', default=None)
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('request_id', default=None)
+
+
+# ---- exporters ----
+
+class ConsoleExporter:
+    """One OTLP/JSON span per line on stderr"""
+
+    def __init__(self, stream: Optional[TextIO] = None):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_otlp(), ensure_ascii=False)
+        with self._lock:
+            print(line, file=self.stream or sys.stderr, flush=True)
+
+
+class FileExporter:
+    """Append one OTLP/JSON span per line to a local file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_otlp(), ensure_ascii=False) + '\n'
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+
+_exporter = None
+_exporter_ready = False
+_exporter_lock = threading.Lock()
+
+
+def get_exporter():
+    """Exporter selected by TRACING_EXPORTER ('none', 'console' or 'file'), None when off"""
+    global _exporter, _exporter_ready
+    if not _exporter_ready:
+        with _exporter_lock:
+            if not _exporter_ready:
+                kind = (config.TRACING_EXPORTER or 'none').lower()
+                if kind == 'console':
+                    _exporter = ConsoleExporter()
+                elif kind == 'file':
+                    _exporter = FileExporter(config.TRACING_FILE)
+                elif kind != 'none':
+                    print(f"Unknown TRACING_EXPORTER: {kind}, tracing disabled")
+                _exporter_ready = True
+    return _exporter
+
+
+def set_exporter(exporter) -> None:
+    """Replace the exporter (None turns tracing off)"""
+    global _exporter, _exporter_ready
+    with _exporter_lock:
+        _exporter, _exporter_ready = exporter, True
+
+
+# ---- spans ----
+
+def _new_trace_id() -> str:
+    return os.urandom(16).hex()
+
+
+def _new_span_id() -> str:
+    return os.urandom(8).hex()
+
+
+def current_span() -> Optional[SpanContext]:
+    return _current_span.get()
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+def _start_span(name: str, attributes: Dict[str, Any], start_ns: Optional[int] = None) -> Span:
+    parent = _current_span.get()
+    span = Span(trace_id=parent.trace_id if parent else _new_trace_id(), span_id=_new_span_id(), name=name,
+                parent_id=parent.span_id if parent else None, start_ns=start_ns or time.time_ns(),
+                attributes=dict(attributes))
+    request_id = _request_id.get()
+    if request_id and (parent is None or not isinstance(parent, Span)):
+        # Only the local root carries the request ID; children share its trace
+        span.attributes.setdefault('request.id', request_id)
+    return span
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    """Time the enclosed block as a child of the current span (a new trace if there is none)"""
+    exporter = get_exporter()
+    if exporter is None:
+        yield NOOP_SPAN
+        return
+    current = _start_span(name, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f'{type(e).__name__}: {e}'
+        raise
+    finally:
+        current.end()
+        _current_span.reset(token)
+        exporter.export(current)
+
+
+def traced(name: str, **attributes: Any) -> Callable[[Callable], Callable]:
+    """Decorator form of span()"""
+    def decorate(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_span(name: str, start_ns: int, seconds: float, error: Optional[str] = None, **attributes: Any) -> None:
+    """Export a span that ran elsewhere (a render worker process) as a child of the current span"""
+    exporter = get_exporter()
+    if exporter is None:
+        return
+    finished = _start_span(name, attributes, start_ns)
+    finished.error = error
+    finished.end(start_ns + int(seconds * 1e9))
+    exporter.export(finished)
+
+
+# ---- request scope ----
+
+_REQUEST_ID_PATTERN = r'[A-Za-z0-9._:-]{1,128}'
+_TRACEPARENT_PATTERN = r'[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}'
+
+
+def clean_request_id(value: Optional[str]) -> str:
+    """A caller's X-Request-ID if it is safe to echo and log, otherwise a new one"""
+    import re
+
+    if value and re.fullmatch(_REQUEST_ID_PATTERN, value):
+        return value
+    return os.urandom(16).hex()
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[SpanContext]:
+    """Remote parent of a W3C traceparent header, None if absent or malformed"""
+    import re
+
+    match = re.fullmatch(_TRACEPARENT_PATTERN, (value or '').strip().lower())
+    if not match or set(match.group(1)) == {'0'} or set(match.group(2)) == {'0'}:
+        return None
+    return SpanContext(match.group(1), match.group(2))
+
+
+@contextmanager
+def request_scope(request_id: Optional[str] = None, traceparent: Optional[str] = None) -> Iterator[str]:
+    """Bind a request ID (and a remote parent span) for everything run inside, yields the ID"""
+    request_id = clean_request_id(request_id)
+    tokens: Tuple = (_request_id.set(request_id), _current_span.set(parse_traceparent(traceparent)))
+    try:
+        yield request_id
+    finally:
+        _current_span.reset(tokens[1])
+        _request_id.reset(tokens[0])
+
+
+def propagate(func: Callable) -> Callable:
+    """Bind func to the caller's context, for thread pools (which don't copy contextvars)"""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # A Context can only be entered by one thread at a time, so each call gets a copy
+        return context.copy().run(func, *args, **kwargs)
+
+    return run
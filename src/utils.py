@@ -1,59 +1,358 @@
 import os
 import json
 import time
-from typing import Any, Optional
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+from cache_backends import create_backend
 
 class W2FileCache:
-    """File-based cache implementation similar to the PHP version"""
-    
+    """File-based cache implementation similar to the PHP version
+
+    Entries are stored through a pluggable backend (see cache_backends):
+    the local ``cache/`` directory by default, or a shared Redis server when
+    CACHE_BACKEND=redis.
+    """
+
     CACHE_PATH = os.path.join(os.path.dirname(__file__), '..', 'cache')
-    
+
+    _backend = None
+    _backend_lock = threading.Lock()
+
+    # Per key-prefix counters, see get_stats()
+    _stats: Dict[str, Dict[str, float]] = {}
+    _stats_lock = threading.Lock()
+
     @classmethod
-    def get_valid_data_from_file(cls, cache_file: str) -> Optional[Any]:
-        """Retrieve valid data from cache file"""
-        if not os.path.exists(cache_file):
+    def get_backend(cls):
+        """Return the configured storage backend, creating it on first use"""
+        if cls._backend is None:
+            with cls._backend_lock:
+                if cls._backend is None:
+                    import config
+                    cls._backend = create_backend(
+                        config.CACHE_BACKEND, cls.CACHE_PATH,
+                        redis_url=config.CACHE_REDIS_URL,
+                        redis_prefix=config.CACHE_REDIS_PREFIX,
+                        redis_pool_size=config.CACHE_REDIS_POOL_SIZE,
+                    )
+        return cls._backend
+
+    @classmethod
+    def set_backend(cls, backend) -> None:
+        """Replace the storage backend (closing the previous one)"""
+        with cls._backend_lock:
+            if cls._backend is not None and cls._backend is not backend:
+                cls._backend.close()
+            cls._backend = backend
+
+    @staticmethod
+    def key_prefix(key: str) -> str:
+        """Group key for statistics: the namespace name for namespaced keys
+        ('weather' for 'weather:v1:g0:daily_...'), otherwise the first two
+        words ('qweather_daily' for 'qweather_daily_<location>_30d')"""
+        if ':' in key:
+            return key.split(':', 1)[0]
+        return '_'.join(key.split('_')[:2])
+
+    @classmethod
+    def _record(cls, key: str, **deltas: float) -> None:
+        """Add deltas to the counters of the key's prefix"""
+        prefix = cls.key_prefix(key)
+        if 'hits' in deltas or 'misses' in deltas:
+            metrics.cache_request(prefix, 'error' if deltas.get('errors') else 'hit' if deltas.get('hits') else 'miss')
+        with cls._stats_lock:
+            counters = cls._stats.setdefault(prefix, {
+                'hits': 0, 'misses': 0, 'stale_hits': 0, 'writes': 0, 'errors': 0,
+                'bytes_read': 0, 'bytes_written': 0,
+                'read_seconds': 0.0, 'write_seconds': 0.0,
+                'max_read_seconds': 0.0,
+            })
+            for name, value in deltas.items():
+                if name == 'max_read_seconds':
+                    counters[name] = max(counters[name], value)
+                else:
+                    counters[name] += value
+
+    @staticmethod
+    def _is_valid(item: Any) -> bool:
+        return isinstance(item, dict) and (item.get('timeout') == 0 or
+                                           item.get('timeout') + item.get('update_time', 0) > time.time())
+
+    @staticmethod
+    def _decode(payload: Optional[bytes]) -> Optional[Any]:
+        if payload is None:
             return None
-            
         try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-                item = json.loads(content)
-                
-            if isinstance(item, dict) and (item.get('timeout') == 0 or 
-                                          item.get('timeout') + item.get('update_time', 0) > time.time()):
-                return item.get('data')
+            return json.loads(payload.decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return None
+
+    @classmethod
+    def _read_item(cls, cache_file: str) -> Tuple[Optional[Any], int]:
+        """Read and decode a cache file, returning (item, bytes read)"""
+        try:
+            with open(cache_file, 'rb') as f:
+                payload = f.read()
+        except IOError:
+            return None, 0
+        return cls._decode(payload), len(payload)
+
+    @classmethod
+    def _unwrap(cls, key: str, payload: Optional[bytes], elapsed: float) -> Optional[Any]:
+        """Decode a stored payload and record hit/miss/stale statistics"""
+        item = cls._decode(payload)
+        if item is None:
+            cls._record(key, misses=1, read_seconds=elapsed, max_read_seconds=elapsed)
             return None
-        except (IOError, json.JSONDecodeError):
+        if not cls._is_valid(item):
+            # Entry is stored but expired: counts as a miss for the caller
+            cls._record(key, misses=1, stale_hits=1, bytes_read=len(payload),
+                        read_seconds=elapsed, max_read_seconds=elapsed)
             return None
-    
+        cls._record(key, hits=1, bytes_read=len(payload), read_seconds=elapsed, max_read_seconds=elapsed)
+        return item.get('data')
+
+    @classmethod
+    def get_valid_data_from_file(cls, cache_file: str) -> Optional[Any]:
+        """Retrieve valid data from cache file"""
+        if not os.path.exists(cache_file):
+            return None
+
+        item, _ = cls._read_item(cache_file)
+        if cls._is_valid(item):
+            return item.get('data')
+        return None
+
     @classmethod
     def is_key_exist(cls, key: str) -> bool:
         """Check if cache key exists"""
-        cache_file = os.path.join(cls.CACHE_PATH, f"{key}.cache")
-        return os.path.exists(cache_file)
-    
+        try:
+            return cls.get_backend().exists(key)
+        except IOError:
+            return False
+
     @classmethod
+    @metrics.timed('cache_lookup')
     def get_cache(cls, key: str) -> Optional[Any]:
         """Get cached data by key"""
-        cache_file = os.path.join(cls.CACHE_PATH, f"{key}.cache")
-        return cls.get_valid_data_from_file(cache_file)
-    
+        started = time.perf_counter()
+        try:
+            payload = cls.get_backend().read(key)
+        except IOError:
+            cls._record(key, misses=1, errors=1)
+            return None
+        return cls._unwrap(key, payload, time.perf_counter() - started)
+
+    @classmethod
+    @metrics.timed('cache_lookup')
+    def get_many(cls, keys: List[str]) -> List[Optional[Any]]:
+        """Get several keys at once (a single pipelined round trip on Redis)"""
+        started = time.perf_counter()
+        try:
+            payloads = cls.get_backend().read_many(keys)
+        except IOError:
+            for key in keys:
+                cls._record(key, misses=1, errors=1)
+            return [None] * len(keys)
+        elapsed = (time.perf_counter() - started) / max(len(keys), 1)
+        return [cls._unwrap(key, payload, elapsed) for key, payload in zip(keys, payloads)]
+
     @classmethod
     def set_cache(cls, key: str, data: Any = None, timeout: int = 0) -> None:
         """Set cache data"""
-        if not os.path.exists(cls.CACHE_PATH):
-            os.makedirs(cls.CACHE_PATH)
-            
-        cache_file = os.path.join(cls.CACHE_PATH, f"{key}.cache")
         item = {
             'data': data,
             'key': key,
             'timeout': timeout,
             'update_time': time.time()
         }
-        
+
+        started = time.perf_counter()
+        try:
+            payload = json.dumps(item, ensure_ascii=False).encode('utf-8')
+            cls.get_backend().write(key, payload, timeout)
+        except IOError:
+            cls._record(key, errors=1)
+            return  # Silent fail like in PHP version
+        cls._record(key, writes=1, bytes_written=len(payload),
+                    write_seconds=time.perf_counter() - started)
+
+    @classmethod
+    def delete_cache(cls, key: str) -> bool:
+        """Delete a single cache entry, returns True if it existed"""
+        try:
+            return cls.get_backend().delete(key)
+        except IOError:
+            return False
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Dict[str, float]]:
+        """Snapshot of the counters recorded by this process, grouped by key prefix"""
+        with cls._stats_lock:
+            snapshot = {prefix: dict(counters) for prefix, counters in cls._stats.items()}
+        for counters in snapshot.values():
+            reads = counters['hits'] + counters['misses']
+            counters['hit_ratio'] = round(counters['hits'] / reads, 4) if reads else 0.0
+            counters['avg_read_ms'] = round(counters['read_seconds'] * 1000 / reads, 3) if reads else 0.0
+        return snapshot
+
+    @classmethod
+    def reset_stats(cls) -> None:
+        """Clear all recorded counters"""
+        with cls._stats_lock:
+            cls._stats.clear()
+
+    @classmethod
+    def list_keys(cls, prefix: str = '') -> List[Dict[str, Any]]:
+        """List cache entries whose key starts with prefix, with size and expiry metadata"""
+        try:
+            keys = cls.get_backend().keys(prefix)
+        except IOError:
+            return []
+
+        entries = []
+        for key in keys:
+            info = cls.inspect_key(key, include_data=False)
+            if info is not None:
+                entries.append(info)
+        return entries
+
+    @classmethod
+    def inspect_key(cls, key: str, include_data: bool = True) -> Optional[Dict[str, Any]]:
+        """Return metadata (and optionally the data) of a single cache entry"""
+        try:
+            payload = cls.get_backend().read(key)
+        except IOError:
+            return None
+        if payload is None:
+            return None
+
+        item = cls._decode(payload)
+        info = {
+            'key': key,
+            'prefix': cls.key_prefix(key),
+            'size': len(payload),
+            'timeout': None,
+            'update_time': None,
+            'expires_at': None,
+            'valid': False,
+        }
+        if isinstance(item, dict):
+            timeout = item.get('timeout')
+            update_time = item.get('update_time')
+            info.update({
+                'timeout': timeout,
+                'update_time': update_time,
+                'expires_at': None if not timeout else (update_time or 0) + timeout,
+                'valid': cls._is_valid(item),
+            })
+            if include_data:
+                info['data'] = item.get('data')
+        return info
+
+    @classmethod
+    def invalidate(cls, prefix: str) -> int:
+        """Delete every cache entry whose key starts with prefix, returns the number deleted"""
         try:
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(item, f, ensure_ascii=False)
+            keys = cls.get_backend().keys(prefix)
         except IOError:
-            pass  # Silent fail like in PHP version
\ No newline at end of file
+            return 0
+        return sum(1 for key in keys if cls.delete_cache(key))
+
+
+class CacheNamespace:
+    """Versioned key namespace with O(1) bulk invalidation
+
+    Keys look like ``<name>:v<version>:g<generation>:<parts>``. Bump
+    ``version`` in code when the cached format or processing logic changes;
+    call bump() to invalidate every entry of the namespace at runtime. The
+    generation counter lives in the cache itself (``ns:<name>``) so a bump is
+    seen by every process sharing the backend within GENERATION_TTL seconds.
+    Entries of old generations are never read again; purge() deletes them.
+    """
+
+    GENERATION_TTL = 5
+
+    def __init__(self, name: str, version: int = 1):
+        self.name = name
+        self.version = version
+        self._generation = 0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def meta_key(self) -> str:
+        return f'ns:{self.name}'
+
+    def _stored_generation(self) -> Optional[int]:
+        """Generation kept in the cache, 0 if never bumped, None if it could not be read"""
+        try:
+            payload = W2FileCache.get_backend().read(self.meta_key)
+        except IOError:
+            return None
+        if payload is None:
+            return 0
+        item = W2FileCache._decode(payload)
+        meta = item.get('data') if isinstance(item, dict) else None
+        if not isinstance(meta, dict):
+            return None
+        try:
+            return int(meta.get('generation', 0))
+        except (TypeError, ValueError):
+            return None
+
+    def generation(self) -> int:
+        """Current generation, re-read from the cache at most every GENERATION_TTL seconds
+
+        Generations only grow: a failed or partial read (or a lost ns: key)
+        keeps the last one seen, so invalidated entries are never served again.
+        """
+        now = time.monotonic()
+        if now - self._checked_at >= self.GENERATION_TTL:
+            stored = self._stored_generation()
+            with self._lock:
+                if stored is not None:
+                    self._generation = max(self._generation, stored)
+                self._checked_at = now
+        return self._generation
+
+    @property
+    def current_prefix(self) -> str:
+        return f'{self.name}:v{self.version}:g{self.generation()}:'
+
+    def key(self, *parts: Any) -> str:
+        """Build a key in the current version and generation"""
+        return self.current_prefix + '_'.join(str(part) for part in parts)
+
+    def bump(self) -> int:
+        """Invalidate all entries of this namespace, returns the new generation"""
+        with self._lock:
+            generation = max(self._generation, self._stored_generation() or 0) + 1
+            W2FileCache.set_cache(self.meta_key, {'generation': generation, 'bumped_at': time.time()}, 0)
+            self._generation = generation
+            self._checked_at = time.monotonic()
+        return generation
+
+    def purge(self) -> int:
+        """Delete entries left behind by older versions or generations"""
+        current = self.current_prefix
+        deleted = 0
+        for entry in W2FileCache.list_keys(f'{self.name}:'):
+            if not entry['key'].startswith(current) and W2FileCache.delete_cache(entry['key']):
+                deleted += 1
+        return deleted
+
+    def info(self) -> Dict[str, Any]:
+        return {'name': self.name, 'version': self.version, 'generation': self.generation()}
+
+
+# Cache namespaces; bump a version here when its cached format changes
+WEATHER_CACHE = CacheNamespace('weather', 1)
+HISTORICAL_CACHE = CacheNamespace('historical', 1)
+# v2: events are stored as parsed by clients.ical_engine (timestamps, RRULE kept for expansion)
+CALDAV_CACHE = CacheNamespace('caldav', 2)
+RENDER_CACHE = CacheNamespace('render', 1)
+
+CACHE_NAMESPACES = {ns.name: ns for ns in (WEATHER_CACHE, HISTORICAL_CACHE, CALDAV_CACHE, RENDER_CACHE)}
@@ -0,0 +1,151 @@
+"""
+Startup warm-up
+Pays the first-request costs (font parsing, worker spawn, cache and store connections,
+cold weather and calendar fetches) before the app reports ready on /ready
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import config
+from render_executor import BoundedExecutor
+
+
+class Readiness:
+    """Warm-up progress: each step's duration and error, ready once all have run"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.steps: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def mark_ready(self) -> None:
+        self.finished = time.time()
+        self._ready.set()
+
+    def run_step(self, name: str, func: Callable[[], Any]) -> None:
+        """Run one step; a failing step is recorded but does not hold back readiness"""
+        started = time.perf_counter()
+        error = None
+        try:
+            func()
+        except Exception as e:
+            error = str(e)
+            print(f"Warm-up step {name} failed: {e}")
+        with self._lock:
+            self.steps[name] = {'seconds': round(time.perf_counter() - started, 3), 'error': error}
+
+    def info(self) -> Dict[str, Any]:
+        with self._lock:
+            elapsed = None
+            if self.started is not None:
+                elapsed = round((self.finished or time.time()) - self.started, 3)
+            return {'status': 'ready' if self.ready else 'warming', 'seconds': elapsed, 'steps': dict(self.steps)}
+
+
+def locations() -> List[str]:
+    """Locations to prefetch weather for: CONFIG_USER_LOCATION plus WARMUP_LOCATIONS
+
+    Locations are 'lon,lat' pairs or QWeather ids, so WARMUP_LOCATIONS is ';' separated.
+    """
+    values = [config.CONFIG_USER_LOCATION] + (config.WARMUP_LOCATIONS or '').split(';')
+    return list(dict.fromkeys(value.strip() for value in values if value and value.strip()))
+
+
+def _prepare_cache() -> None:
+    os.makedirs(config.CACHE_PATH, exist_ok=True)
+    from utils import W2FileCache
+
+    W2FileCache.get_backend()
+
+
+def _load_fonts() -> None:
+    """Parse the fonts and draw one empty calendar, so glyph and Pillow plugin setup is done too"""
+    from PIL import Image
+    import fonts
+    from render_farm import RenderJob, render_png
+
+    Image.init()
+    fonts.preload()
+    render_png(RenderJob('calendar', {'daily': []}))
+
+
+def _start_render_workers(executor: Optional[BoundedExecutor]) -> None:
+    """Spawn the render worker processes and the executor threads, each loading the fonts"""
+    import render_farm
+
+    if executor is not None:
+        executor.warm_up()
+    farm = render_farm.get_render_farm()
+    if farm is not None:
+        farm.warm_up()
+
+
+def _open_event_store() -> None:
+    import event_store
+
+    event_store.get_store()
+
+
+def _prefetch_weather() -> None:
+    from dot_calendar import DotCalendar
+    from weather_chart import WeatherChart
+
+    for location in locations():
+        DotCalendar(location=location, qweather_host=config.QWEATHER_HOST,
+                    qweather_key=config.QWEATHER_KEY).qweather_get_daily(location)
+        WeatherChart(location=location, qweather_host=config.QWEATHER_HOST,
+                     qweather_key=config.QWEATHER_KEY).load_weather_data()
+
+
+def _prefetch_calendars() -> None:
+    """First CalDAV sync: opens the client connection pools and fills the event store"""
+    import main as main_mod
+    from calendar_aggregator import parse_sources
+
+    main_mod.get_todolist_from_sources(parse_sources(config.CALENDAR_SOURCE) or ['dingtalk'])
+
+
+def _start_event_sync() -> None:
+    import event_store
+    from calendar_aggregator import parse_sources
+
+    event_store.start_background_sync(parse_sources(config.CALENDAR_SOURCE) or ['dingtalk'])
+
+
+def warm_up(readiness: Readiness, executor: Optional[BoundedExecutor] = None) -> Readiness:
+    """Run every warm-up step in order, then mark ready"""
+    readiness.started = time.time()
+    readiness.run_step('cache', _prepare_cache)
+    readiness.run_step('fonts', _load_fonts)
+    readiness.run_step('render_workers', lambda: _start_render_workers(executor))
+    if config.EVENT_STORE_ENABLED:
+        readiness.run_step('event_store', _open_event_store)
+    if config.WARMUP_PREFETCH:
+        if config.QWEATHER_KEY:
+            readiness.run_step('weather', _prefetch_weather)
+        readiness.run_step('calendars', _prefetch_calendars)
+    if config.EVENT_STORE_ENABLED:
+        # After the prefetch, so the first background sync doesn't race it for the same calendars
+        readiness.run_step('event_sync', _start_event_sync)
+    readiness.mark_ready()
+    print(f"🔥 Warm-up finished in {readiness.finished - readiness.started:.2f}s")
+    return readiness
+
+
+def start_warm_up(readiness: Readiness, executor: Optional[BoundedExecutor] = None) -> threading.Thread:
+    """Warm up in a background thread, so the server accepts /ready probes meanwhile"""
+    thread = threading.Thread(target=warm_up, args=(readiness, executor), name='warm-up', daemon=True)
+    thread.start()
+    return thread
@@ -1,11 +1,26 @@
 import math
 import os
-import requests
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Tuple, Optional
 from PIL import Image, ImageDraw, ImageFont
 
-from utils import W2FileCache
+import metrics
+from fonts import TEXT_FONT, ICON_FONT, get_font
+from utils import W2FileCache, WEATHER_CACHE, HISTORICAL_CACHE
+
+# Forecast lengths served by the QWeather daily API (/v7/weather/{days}d)
+FORECAST_DAYS = (3, 7, 10, 15, 30)
+
+
+def forecast_days(value: Any) -> int:
+    """value as a forecast length the daily API serves, ValueError otherwise"""
+    try:
+        days = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('days must be an integer')
+    if isinstance(value, bool) or days not in FORECAST_DAYS:
+        raise ValueError(f'days must be one of {", ".join(map(str, FORECAST_DAYS))}')
+    return days
 
 
 class WeatherChart:
@@ -45,9 +60,8 @@ class WeatherChart:
         self.qweather_key = qweather_key
         
         # 字体路径
-        self.fonts_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'assets', 'fonts')
-        self.text_font = os.path.join(self.fonts_dir, 'fusion-pixel-12px-monospaced-zh_hans.ttf')
-        self.icon_font = os.path.join(self.fonts_dir, 'qweather-icons.ttf')
+        self.text_font = TEXT_FONT
+        self.icon_font = ICON_FONT
         
         # 初始化数据
         self.weather_data: List[Dict[str, Any]] = []
@@ -124,31 +138,42 @@ class WeatherChart:
 
     def qweather_get_daily(self, location: str, days: str = '15d') -> Dict[str, Any]:
         """从和风天气API获取每日天气预报数据"""
-        cache_key = f'qweather_daily_{location}_{days}'
+        cache_key = WEATHER_CACHE.key('daily', location, days)
         data = W2FileCache.get_cache(cache_key)
         if data is not None:
             return data
 
+        # requests is only imported on a cache miss, so warm runs skip loading it
+        import requests
+
         try:
             url = f'https://{self.qweather_host}/v7/weather/{days}?location={location}&key={self.qweather_key}'
-            response = requests.get(url, timeout=30)
-            data = response.json()
+            with metrics.stage('weather_fetch', **{'qweather.api': f'weather/{days}', 'qweather.location': location}) as span:
+                response = requests.get(url, timeout=30)
+                span.set_attribute('http.status_code', response.status_code)
+                data = response.json()
             W2FileCache.set_cache(cache_key, data, 60 * 30)  # 缓存30分钟
             return data
         except requests.RequestException as e:
+            metrics.upstream_error('qweather', e)
             raise Exception(f"获取天气数据失败: {str(e)}")
 
     def qweather_get_historical(self, location: str, date: str) -> Dict[str, Any]:
         """从和风天气API获取历史天气数据"""
-        cache_key = f'qweather_historical_{location}_{date}'
+        cache_key = HISTORICAL_CACHE.key('api', location, date)
         data = W2FileCache.get_cache(cache_key)
         if data is not None:
             return data
 
+        import requests
+
         try:
             url1 = f'https://{self.qweather_host}/v7/historical/weather?location={location}&date={date}&key={self.qweather_key}'
             try:
-                response1 = requests.get(url1, timeout=30)
+                with metrics.stage('weather_fetch', **{'qweather.api': 'historical/weather',
+                                                       'qweather.location': location}) as span:
+                    response1 = requests.get(url1, timeout=30)
+                    span.set_attribute('http.status_code', response1.status_code)
                 if response1.status_code == 200:
                     data = response1.json()
                     if data.get('code') == '200':
@@ -167,10 +192,14 @@ class WeatherChart:
 
     def _fallback_historical_old_api(self, location: str, date: str) -> Dict[str, Any]:
         """降级方案：尝试使用旧的预报API获取估算的历史数据"""
+        import requests
+
         try:
             url = f'https://{self.qweather_host}/v7/weather/{date}?location={location}&key={self.qweather_key}'
-            response = requests.get(url, timeout=30)
-            data = response.json()
+            with metrics.stage('weather_fetch', **{'qweather.api': f'weather/{date}', 'qweather.location': location}) as span:
+                response = requests.get(url, timeout=30)
+                span.set_attribute('http.status_code', response.status_code)
+                data = response.json()
             
             if data.get('code') == '200' and data.get('daily'):
                 daily_data = data['daily'][0] if data['daily'] else {}
@@ -183,12 +212,13 @@ class WeatherChart:
             else:
                 raise Exception(f"降级API也失败: {data.get('code')}")
         except Exception as e:
+            metrics.upstream_error('qweather', e)
             raise Exception(f"所有历史数据获取方案都失败: {str(e)}")
 
     def save_historical_data_cache(self, date: str, weather_data: Dict[str, Any]):
         """保存今日天气数据作为历史缓存"""
         today = datetime.now().strftime('%Y-%m-%d')
-        cache_key = f'qweather_historical_real_{self.location}_{today}'
+        cache_key = HISTORICAL_CACHE.key('real', self.location, today)
         
         historical_cache = {
             'code': '200',
@@ -206,7 +236,7 @@ class WeatherChart:
             yesterday = datetime.now() - timedelta(days=1)
             yesterday_str = yesterday.strftime('%Y%m%d')
             
-            cache_key = f'qweather_historical_real_{self.location}_{yesterday.strftime("%Y-%m-%d")}'
+            cache_key = HISTORICAL_CACHE.key('real', self.location, yesterday.strftime('%Y-%m-%d'))
             cached_historical = W2FileCache.get_cache(cache_key)
             
             historical_success = False
@@ -299,6 +329,7 @@ class WeatherChart:
         temp_max += 2
         return math.floor(temp_min), math.ceil(temp_max)
 
+    @metrics.timed('draw')
     def create_image(self) -> 'WeatherChart':
         if not self.weather_data:
             raise ValueError("没有天气数据")
@@ -307,11 +338,11 @@ class WeatherChart:
         draw = ImageDraw.Draw(self.image)
         
         try:
-            # title_font = ImageFont.truetype(self.text_font, self.TITLE_FONT_SIZE)
-            label_font = ImageFont.truetype(self.text_font, self.AXIS_LABEL_FONT_SIZE)
-            temp_font = ImageFont.truetype(self.text_font, self.TEMP_FONT_SIZE)
-            date_font = ImageFont.truetype(self.text_font, self.DATE_FONT_SIZE)
-            icon_font = ImageFont.truetype(self.icon_font, self.ICON_FONT_SIZE)
+            # title_font = get_font(self.text_font, self.TITLE_FONT_SIZE)
+            label_font = get_font(self.text_font, self.AXIS_LABEL_FONT_SIZE)
+            temp_font = get_font(self.text_font, self.TEMP_FONT_SIZE)
+            date_font = get_font(self.text_font, self.DATE_FONT_SIZE)
+            icon_font = get_font(self.icon_font, self.ICON_FONT_SIZE)
         except:
             label_font = ImageFont.load_default()
             temp_font = ImageFont.load_default()
@@ -390,7 +421,8 @@ class WeatherChart:
 
     def save_image(self, filename: str = 'weather_chart.png') -> 'WeatherChart':
         if not self.image: raise ValueError("没有生成图像")
-        self.image.save(filename, format='PNG')
+        with metrics.stage('encode'):
+            self.image.save(filename, format='PNG')
         print(f"天气预报走势图已保存到 {filename}")
         return self
 
@@ -398,9 +430,11 @@ class WeatherChart:
         if not self.image: raise ValueError("没有生成图像")
         from io import BytesIO
         buffer = BytesIO()
-        self.image.save(buffer, format='PNG')
+        with metrics.stage('encode'):
+            self.image.save(buffer, format='PNG')
         return buffer.getvalue()
         
+    @metrics.timed('binarize')
     def blackwhite_image(self, image: Image.Image = None) -> Image.Image:
         """Convert image to black and white"""
         tgt = image if image else self.image
@@ -11,6 +11,7 @@ import argparse
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 import config
+import metrics
 from weather_chart import WeatherChart
 
 
@@ -24,6 +25,8 @@ def main():
     parser.add_argument('--no-yesterday', action='store_true', help='不包含昨天数据')
     
     args = parser.parse_args()
+    if config.METRICS_LOG:
+        metrics.enable_event_log(run='weather_chart_cli')
     
     # 检查配置
     if not args.location and not config.CONFIG_USER_LOCATION:
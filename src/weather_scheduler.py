@@ -16,21 +16,24 @@ from pathlib import Path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 import config
-from weather_chart import WeatherChart
-from dot_calendar import DotCalendar
+import metrics
+import tracing
 
-# 设置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('weather_scheduler.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
 
+def configure_logging(log_file='weather_scheduler.log'):
+    """日志输出到文件与终端；在 main() 中调用，导入本模块时不创建日志文件"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_file),
+            logging.StreamHandler()
+        ]
+    )
+
+
 class WeatherScheduler:
     """天气预报走势图定时任务管理器"""
     
@@ -105,6 +108,11 @@ class WeatherScheduler:
             filename = self.config["output_filename"].format(date=date_str)
             output_path = output_dir / filename
             
+            # 绘图相关模块只在生成时导入
+            import render_farm
+            from render_farm import RenderJob
+            from weather_chart import WeatherChart
+
             # 创建天气图表生成器
             chart = WeatherChart(
                 location=config.CONFIG_USER_LOCATION,
@@ -119,10 +127,11 @@ class WeatherScheduler:
                 include_yesterday=self.config['include_yesterday']
             )
             
-            # 生成图表
+            # 生成图表（单次运行直接在本进程绘制，不启动渲染进程池；保留灰度，推送时再二值化）
             logger.info("正在生成图表...")
-            chart.create_image()
-            chart.save_image(str(output_path))
+            png = render_farm.render(RenderJob('weather_chart', chart.weather_data, options={'blackwhite': False}),
+                                     in_process=True)
+            output_path.write_bytes(png)
             
             logger.info(f"图表已保存到: {output_path}")
             return str(output_path)
@@ -159,60 +168,18 @@ class WeatherScheduler:
             else:
                 target_device_id = config.DOT_DEVICE_ID
             
-            # 检查是否需要调整图片尺寸
+            # 检查是否需要调整图片尺寸；推送（并发、重试、超时）统一由 push_service 完成
             resize_for_device = self.config.get("device_push", {}).get("resize_for_device", True)
-            
-            if resize_for_device:
+            size = (296, 152) if resize_for_device else None
+            if size:
                 logger.info("调整图片尺寸以适配设备 (296x152)...")
-                from PIL import Image
-                from device_push import blackwhite_image
-                import base64
-                import requests
-                from io import BytesIO
-                
-                # 加载并调整图片
-                image = Image.open(image_path)
-                resized_image = image.resize((296, 152), Image.Resampling.LANCZOS)
-                
-                # 转换为黑白
-                bw_image = blackwhite_image(resized_image)
-                
-                # 推送到设备
-                img_buffer = BytesIO()
-                bw_image.save(img_buffer, format='PNG')
-                img_buffer.seek(0)
-                image_content = img_buffer.getvalue()
-                
-                # 发送请求
-                url = 'https://dot.mindreset.tech/api/open/image'
-                payload = {
-                    "deviceId": target_device_id,
-                    "image": base64.b64encode(image_content).decode('utf-8'),
-                    "refreshNow": True,
-                    "border": 0,
-                    "ditherType": "NONE",
-                    "link": "https://dot.mindreset.tech"
-                }
-                
-                headers = {
-                    'Authorization': f'Bearer {config.DOT_APP_KEY}',
-                    'Content-Type': 'application/json'
-                }
-                
-                response = requests.post(url, json=payload, headers=headers, timeout=30)
-                
-                if response.status_code == 200:
-                    logger.info(f"设备推送成功 (设备: {target_device_id})")
-                    return True
-                else:
-                    logger.error(f"设备推送失败: {response.status_code} - {response.text}")
-                    return False
+
+            success = push_image_to_device(image_path, target_device_id, config.DOT_APP_KEY, size)
+            if success:
+                logger.info(f"设备推送成功 (设备: {target_device_id})")
             else:
-                # 推送原始尺寸图片
-                success = push_image_to_device(image_path, target_device_id, config.DOT_APP_KEY)
-                if success:
-                    logger.info("设备推送成功")
-                return success
+                logger.error(f"设备推送失败 (设备: {target_device_id})，各设备结果见 device_push_result 日志")
+            return success
             
         except Exception as e:
             logger.error(f"设备推送失败: {e}")
@@ -299,6 +266,7 @@ class WeatherScheduler:
         except Exception as e:
             logger.error(f"发送通知失败: {e}")
     
+    @tracing.traced('weather_scheduler.run')
     def run(self):
         """运行定时任务"""
         if not self.config.get("enabled", True):
@@ -405,6 +373,10 @@ def main():
                        help='输出目录 (默认: ./output)')
     
     args = parser.parse_args()
+    configure_logging()
+    if config.METRICS_LOG:
+        # Stage timings go to the scheduler log as JSON lines
+        metrics.enable_event_log(logger, run='scheduler')
     
     # 创建示例配置文件
     if args.create_sample_config:
@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+
+from redis_standin import RedisStandIn  # noqa: E402
+from utils import W2FileCache  # noqa: E402
+
+
+@pytest.fixture
+def redis_server():
+    """In-process Redis protocol stand-in, yields (server, url)"""
+    server = RedisStandIn()
+    url = server.start()
+    yield server, url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cache_backend():
+    """Restore W2FileCache's backend after a test swaps it"""
+    previous = W2FileCache._backend
+    W2FileCache._backend = None
+    yield W2FileCache
+    W2FileCache.set_backend(previous)
+
+
+@pytest.fixture
+def file_cache(cache_backend, tmp_path):
+    """W2FileCache on an empty directory of its own"""
+    from cache_backends import FileCacheBackend
+
+    cache_backend.set_backend(FileCacheBackend(str(tmp_path)))
+    return cache_backend
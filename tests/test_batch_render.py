@@ -0,0 +1,70 @@
+import io
+import zipfile
+
+import pytest
+
+import batch_render
+from batch_render import BatchError, BatchItem, Profile, parse_profiles
+
+
+def test_profile_ids_default_to_device_id_then_index():
+    profiles = parse_profiles([{'id': 'desk'}, {'device_id': 'DEVICE_B'}, {}])
+    assert [p.id for p in profiles] == ['desk', 'DEVICE_B', '2']
+
+
+@pytest.mark.parametrize('profile_id', ['../../x', 'a/b', 'desk\r\nX-Injected: 1', 'a"b', 'x' * 65, '桌面'])
+def test_unsafe_profile_id_is_rejected(profile_id):
+    with pytest.raises(BatchError, match='id must be'):
+        parse_profiles([{'id': profile_id}])
+
+
+def test_duplicate_profile_id_is_rejected():
+    with pytest.raises(BatchError, match='duplicate profile id'):
+        parse_profiles([{'id': 'desk'}, {'device_id': 'desk'}])
+
+
+@pytest.mark.parametrize('field, value', [('device_id', 123), ('location', [116.41, 39.9]),
+                                          ('calendar_source', {'dingtalk': True}), ('format', 1),
+                                          ('id', {'a': 1}), ('id', True)])
+def test_wrongly_typed_field_is_rejected(field, value):
+    with pytest.raises(BatchError, match=f'{field} must be a string'):
+        parse_profiles([{field: value}])
+
+
+@pytest.mark.parametrize('days', [0, -1, 5, 10000, True, 'many'])
+def test_days_outside_the_forecast_lengths_are_rejected(days):
+    with pytest.raises(BatchError, match='days must be'):
+        parse_profiles([{'days': days}])
+
+
+def test_forecast_lengths_are_accepted():
+    assert [p.days for p in parse_profiles([{'id': 'a', 'days': 7}, {'id': 'b', 'days': '30'}, {'id': 'c'}])] == \
+        [7, 30, 15]
+
+
+def test_archive_entries_are_the_profile_ids():
+    items = [BatchItem(Profile(id=p.id), etag='"e"', image=b'png') for p in parse_profiles([{'id': 'a.b'}, {'id': 'c'}])]
+    with zipfile.ZipFile(io.BytesIO(batch_render.to_zip(items))) as archive:
+        assert archive.namelist() == ['a.b.png', 'c.png', 'manifest.json']
+
+
+def test_multipart_parameters_are_quoted():
+    body = batch_render.to_multipart([BatchItem(Profile(id='desk'), etag='"e"', image=b'png')], 'boundary')
+    assert b'Content-Disposition: attachment; name="desk"; filename="desk.png"\r\n' in body
+    assert batch_render._quote('a"b\\c') == '"a\\"b\\\\c"'
+    with pytest.raises(ValueError):
+        batch_render._quote('a\r\nb')
+
+
+def test_invalid_profiles_get_a_400(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import app
+    import config
+
+    monkeypatch.setattr(config, 'DOT_CALENDAR_TOKEN', 'secret')
+    client = TestClient(app.app)
+    for profile in ({'id': '../x'}, {'device_id': 42}, {'days': 10000}):
+        response = client.post('/generate/batch', json={'token': 'secret', 'profiles': [profile]})
+        assert response.status_code == 400
+        assert response.json()['detail'].startswith('profile 0:')
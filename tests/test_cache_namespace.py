@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from utils import CacheNamespace
+
+
+@pytest.fixture
+def namespace(file_cache):
+    namespace = CacheNamespace('weather', 1)
+    namespace.GENERATION_TTL = 0
+    file_cache.set_cache(namespace.key('daily', 'here'), {'old': True})
+    assert namespace.bump() == 1
+    return namespace
+
+
+def test_failed_generation_read_keeps_the_last_generation(file_cache, namespace, monkeypatch):
+    backend = file_cache.get_backend()
+    read = backend.read
+
+    def failing_read(key):
+        if key == namespace.meta_key:
+            raise IOError('disk went away')
+        return read(key)
+
+    monkeypatch.setattr(backend, 'read', failing_read)
+    assert namespace.generation() == 1
+    assert file_cache.get_cache(namespace.key('daily', 'here')) is None
+
+
+def test_partial_generation_read_keeps_the_last_generation(file_cache, namespace):
+    path = file_cache.get_backend()._file(namespace.meta_key)
+    with open(path, 'rb') as f:
+        payload = f.read()
+    with open(path, 'wb') as f:
+        f.write(payload[:len(payload) // 2])
+
+    assert namespace.generation() == 1
+    assert file_cache.get_cache(namespace.key('daily', 'here')) is None
+    assert namespace.bump() == 2
+
+
+def test_file_writes_replace_entries_whole(file_cache, tmp_path):
+    file_cache.set_cache('entry', {'v': 1})
+    file_cache.set_cache('entry', {'v': 2})
+    assert file_cache.get_cache('entry') == {'v': 2}
+    assert os.listdir(tmp_path) == ['entry.cache']
+    assert file_cache.get_backend().keys() == ['entry']
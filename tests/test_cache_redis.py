@@ -0,0 +1,97 @@
+import time
+
+from cache_backends import RedisCacheBackend
+from utils import CacheNamespace, W2FileCache
+
+
+def test_read_write_delete(redis_server):
+    _, url = redis_server
+    backend = RedisCacheBackend(url)
+    assert backend.read('missing') is None
+    backend.write('a', b'payload')
+    assert backend.read('a') == b'payload'
+    assert backend.exists('a')
+    assert backend.delete('a')
+    assert not backend.delete('a')
+    assert backend.read('a') is None
+    backend.close()
+
+
+def test_keys_are_prefixed_on_the_server(redis_server):
+    server, url = redis_server
+    backend = RedisCacheBackend(url, key_prefix='test:')
+    backend.write('k', b'v')
+    assert list(server.data) == [b'test:k']
+    assert backend.keys() == ['k']
+
+
+def test_ttl_expires_after_stale_grace(redis_server):
+    server, url = redis_server
+    backend = RedisCacheBackend(url, stale_grace=0)
+    backend.write('short', b'v', timeout=1)
+    backend.write('forever', b'v')
+    assert server.expires.get(b'dotcal:short') is not None
+    assert b'dotcal:forever' not in server.expires
+    time.sleep(1.1)
+    assert backend.read('short') is None
+    assert backend.read('forever') == b'v'
+
+
+def test_expired_entry_is_a_miss_while_still_stored(redis_server, cache_backend):
+    _, url = redis_server
+    cache_backend.set_backend(RedisCacheBackend(url))
+    cache_backend.set_cache('qweather_daily_x_30d', {'code': '200'}, 1)
+    assert cache_backend.get_cache('qweather_daily_x_30d') == {'code': '200'}
+    time.sleep(1.1)
+    assert cache_backend.get_cache('qweather_daily_x_30d') is None
+    # Kept for the stale grace period, so stats can report a stale hit
+    assert cache_backend.inspect_key('qweather_daily_x_30d', include_data=False)['valid'] is False
+
+
+def test_read_many_is_one_pipeline(redis_server, cache_backend):
+    server, url = redis_server
+    cache_backend.set_backend(RedisCacheBackend(url))
+    for i in range(3):
+        cache_backend.set_cache(f'k{i}', {'i': i})
+    before = server.commands
+    assert cache_backend.get_many(['k0', 'missing', 'k2']) == [{'i': 0}, None, {'i': 2}]
+    assert server.commands - before == 3
+    assert cache_backend.get_many([]) == []
+
+
+def test_keys_and_invalidate_by_prefix(redis_server, cache_backend):
+    _, url = redis_server
+    cache_backend.set_backend(RedisCacheBackend(url))
+    for key in ('qweather_daily_a', 'qweather_daily_b', 'caldav_x', 'weird*key'):
+        cache_backend.set_cache(key, 1)
+    assert [e['key'] for e in cache_backend.list_keys('qweather_daily')] == ['qweather_daily_a', 'qweather_daily_b']
+    # Glob characters in a prefix are matched literally
+    assert [e['key'] for e in cache_backend.list_keys('weird*')] == ['weird*key']
+    assert cache_backend.invalidate('qweather_daily') == 2
+    assert cache_backend.list_keys('qweather_daily') == []
+    assert cache_backend.get_cache('caldav_x') == 1
+
+
+def test_replicas_share_entries(redis_server, cache_backend):
+    _, url = redis_server
+    cache_backend.set_backend(RedisCacheBackend(url))
+    cache_backend.set_cache('shared', {'v': 1})
+    cache_backend.set_backend(RedisCacheBackend(url))
+    assert cache_backend.get_cache('shared') == {'v': 1}
+
+
+def test_namespace_bump_is_seen_by_other_instances(redis_server, cache_backend):
+    _, url = redis_server
+    cache_backend.set_backend(RedisCacheBackend(url))
+    writer = CacheNamespace('weather', 1)
+    reader = CacheNamespace('weather', 1)
+    reader.GENERATION_TTL = 0
+    cache_backend.set_cache(writer.key('daily', 'here'), {'old': True})
+    assert cache_backend.get_cache(reader.key('daily', 'here')) == {'old': True}
+
+    # Another replica (its own backend connection pool) bumps the namespace
+    cache_backend.set_backend(RedisCacheBackend(url))
+    assert writer.bump() == 1
+    assert reader.generation() == 1
+    assert cache_backend.get_cache(reader.key('daily', 'here')) is None
+    assert W2FileCache.get_cache('ns:weather')['generation'] == 1
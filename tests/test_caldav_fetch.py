@@ -0,0 +1,47 @@
+import threading
+import time
+
+from clients.caldav_utils import fetch_all_calendars
+
+CALENDARS = [{'href': f'/dav/bench/cal{i}/', 'displayname': f'cal{i}'} for i in range(3)]
+
+
+def test_overdue_calendar_is_failed_without_waiting():
+    release = threading.Event()
+
+    def fetch(calendar, cancelled):
+        if calendar['href'] == '/dav/bench/cal1/':
+            release.wait(5)
+        return [{'UID': calendar['displayname']}]
+
+    started = time.perf_counter()
+    events, metrics = fetch_all_calendars(CALENDARS, fetch, max_workers=3, timeout=0.2)
+    elapsed = time.perf_counter() - started
+    release.set()
+
+    assert elapsed < 1
+    assert [e['UID'] for e in events] == ['cal0', 'cal2']
+    assert [m['href'] for m in metrics] == [c['href'] for c in CALENDARS]
+    assert metrics[1]['error'].startswith('timed out') and metrics[1]['events'] == 0
+    assert metrics[0]['error'] is None and metrics[2]['error'] is None
+
+
+def test_queued_calendars_share_the_deadline():
+    def fetch(calendar, cancelled):
+        time.sleep(0.05)
+        return [{'UID': calendar['displayname']}]
+
+    events, metrics = fetch_all_calendars(CALENDARS, fetch, max_workers=1, timeout=1)
+    assert [e['UID'] for e in events] == ['cal0', 'cal1', 'cal2']
+    assert not any(m['error'] for m in metrics)
+
+
+def test_failing_calendar_does_not_fail_the_fetch():
+    def fetch(calendar, cancelled):
+        if calendar['href'] == '/dav/bench/cal0/':
+            raise RuntimeError('boom')
+        return [{'UID': calendar['displayname']}]
+
+    events, metrics = fetch_all_calendars(CALENDARS, fetch, max_workers=3, timeout=1)
+    assert [e['UID'] for e in events] == ['cal1', 'cal2']
+    assert metrics[0]['error'] == 'boom'
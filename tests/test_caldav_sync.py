@@ -0,0 +1,203 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from caldav_standin import SYNC_TOKEN_PREFIX, StandInCalDAVServer, generate_calendar
+from clients.caldav_core import CalDAVClient, CalDAVProfile
+from clients.caldav_utils import fetch_all_calendars
+from utils import W2FileCache
+
+
+@pytest.fixture
+def server():
+    server = StandInCalDAVServer([generate_calendar('cal0', 20)]).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(server, file_cache):
+    client = CalDAVClient(CalDAVProfile(name='standin'), 'bench', 'bench', caldav_url=server.url)
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    """Sync state keys written to the cache"""
+    written = []
+    set_cache = W2FileCache.set_cache
+
+    def record(key, data=None, timeout=0):
+        if ':sync_' in key:
+            written.append(key)
+        set_cache(key, data, timeout)
+
+    monkeypatch.setattr(W2FileCache, 'set_cache', record)
+    return written
+
+
+def sync(client, start=None, end=None):
+    calendar = client.discover_calendars()[0]
+    engine = client.sync_engine
+    events = engine.sync(calendar, False, start, end)
+    return events, engine.last_mode[calendar['href']], W2FileCache.get_cache(engine._state_key(calendar['href']))
+
+
+def test_initial_sync_uses_sync_collection(client):
+    events, mode, state = sync(client)
+    assert len(events) == 20
+    assert mode == 'sync-collection'
+    assert state['sync_supported'] and state['sync_token'].startswith(SYNC_TOKEN_PREFIX)
+
+
+@pytest.mark.parametrize('status', [401, 429, 500, 503])
+def test_transient_error_falls_back_without_disabling_sync(client, server, status):
+    _, _, before = sync(client)
+    server.sync_collection_error = status
+    server.calendars['cal0'].touch(2)
+
+    events, mode, state = sync(client)
+    assert mode == 'etag-diff'
+    assert sum('已修改' in e['SUMMARY'] for e in events) == 2
+    assert state['sync_supported'] and state['sync_token'] == before['sync_token']
+
+    server.sync_collection_error = None
+    assert sync(client)[1] == 'sync-collection'
+
+
+@pytest.mark.parametrize('status', [403, 405, 501])
+def test_refused_report_disables_sync(client, server, status):
+    server.sync_collection_error = status
+    events, mode, state = sync(client)
+    assert len(events) == 20
+    assert mode == 'etag-diff'
+    assert state['sync_supported'] is False
+
+
+def test_invalid_token_triggers_full_resync(client, server):
+    sync(client)
+    key = client.sync_engine._state_key(client.calendar_paths[0]['href'])
+    state = W2FileCache.get_cache(key)
+    state['sync_token'] = f'{SYNC_TOKEN_PREFIX}cal0/999999'
+    W2FileCache.set_cache(key, state, 0)
+    server.calendars['cal0'].delete_event('cal0-0')
+
+    events, mode, state = sync(client)
+    assert len(events) == 19
+    assert mode == 'sync-collection'
+    assert state['sync_supported'] and state['sync_token'] == server.calendars['cal0'].sync_token
+
+
+def test_unchanged_calendar_is_not_rewritten(client, server, writes):
+    sync(client)
+    assert len(writes) == 1
+
+    sync(client)
+    assert len(writes) == 1
+
+    server.calendars['cal0'].touch(1)
+    sync(client)
+    assert len(writes) == 2
+
+
+def test_unchanged_calendar_skips_its_report_after_discovery_is_reused(client, server):
+    client.get_all_events()
+    server.reset_counters()
+
+    assert len(client.get_all_events()) == 20
+    assert client.sync_engine.last_mode[client.calendar_paths[0]['href']] == 'ctag'
+    # Only the ctag PROPFIND on the calendar home
+    assert server.requests == 1
+
+    server.calendars['cal0'].touch(1)
+    assert sum('已修改' in e['SUMMARY'] for e in client.get_all_events()) == 1
+    assert client.sync_engine.last_mode[client.calendar_paths[0]['href']] == 'sync-collection'
+
+
+@pytest.mark.parametrize('incremental_sync', [True, False])
+def test_calendar_added_after_discovery_is_fetched(client, server, incremental_sync):
+    client.discover_calendars()
+    server.calendars['cal1'] = generate_calendar('cal1', 5)
+
+    # A new process finds the discovery in the cache
+    other = CalDAVClient(CalDAVProfile(name='standin'), 'bench', 'bench', caldav_url=server.url,
+                         incremental_sync=incremental_sync)
+    assert len(other.get_all_events()) == 25
+    other.close()
+    assert len(client.discover_calendars()) == 1
+    assert len(client.get_all_events()) == 25
+
+    # The cached discovery was replaced
+    fresh = CalDAVClient(CalDAVProfile(name='standin'), 'bench', 'bench', caldav_url=server.url)
+    assert [c['href'] for c in fresh.discover_calendars()] == [c['href'] for c in client.calendar_paths]
+    assert len(client.calendar_paths) == 2
+    fresh.close()
+
+
+def window(hours_before=2, days_after=2):
+    now = datetime.now()
+    return ((now - timedelta(hours=hours_before)).strftime('%Y-%m-%d %H:%M:%S'),
+            (now + timedelta(days=days_after)).strftime('%Y-%m-%d %H:%M:%S'))
+
+
+@pytest.fixture
+def long_calendar(server):
+    """Three years of history, one event every ~3 days"""
+    server.calendars['cal0'] = generate_calendar('cal0', 400)
+    return server.calendars['cal0']
+
+
+def test_windowed_sync_caches_only_the_window(client, server, long_calendar):
+    start, end = window()
+    _, mode, state = sync(client, start, end)
+    assert mode == 'etag-diff'
+    assert state['window'][0] == start and state['window'][1] > end
+    assert 0 < len(state['resources']) < 10
+    # An initial sync-collection would have listed every resource
+    assert not state['sync_token']
+
+    plain = CalDAVClient(CalDAVProfile(name='standin'), 'bench', 'bench', caldav_url=server.url,
+                         incremental_sync=False)
+    expected = sorted(e['UID'] for e in plain.get_all_events(start, end))
+    plain.close()
+    assert expected and sorted(e['UID'] for e in client.get_all_events(start, end)) == expected
+
+
+def test_windowed_sync_ignores_changes_outside_the_window(client, long_calendar):
+    start, end = window()
+    _, _, before = sync(client, start, end)
+    long_calendar.touch(5)
+    long_calendar.put_event('new', datetime.now(timezone.utc) + timedelta(hours=1), 'new event')
+
+    events, mode, state = sync(client, start, end)
+    assert mode == 'etag-diff'
+    assert set(state['resources']) == set(before['resources']) | {f'{client.calendar_paths[0]["href"]}new.ics'}
+    assert 'new event' in [e['SUMMARY'] for e in events]
+
+
+def test_window_past_the_cached_one_is_listed_again(client, long_calendar):
+    sync(client, *window())
+    _, mode, state = sync(client, *window(days_after=30))
+    assert mode == 'etag-diff'
+    assert state['window'][1] > window(days_after=30)[1]
+
+
+def test_abandoned_sync_leaves_no_state(client, server):
+    calendar = client.discover_calendars()[0]
+    key = client.sync_engine._state_key(calendar['href'])
+    server.latency = 0.3
+    server.reset_counters()
+
+    def fetch(calendar, cancelled):
+        return client.sync_engine.sync(calendar, False, None, None, cancelled)
+
+    events, metrics = fetch_all_calendars([calendar], fetch, max_workers=1, timeout=0.1)
+    assert events == [] and metrics[0]['error'].startswith('timed out')
+
+    # Let the abandoned thread get its sync-collection response: it stops there
+    time.sleep(1)
+    assert server.requests == 1
+    assert W2FileCache.get_cache(key) is None
@@ -0,0 +1,19 @@
+import ast
+import os
+
+import config
+
+
+def test_settings_are_listed_and_typed():
+    stub = os.path.join(os.path.dirname(config.__file__), 'config.pyi')
+    with open(stub, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    typed = [node.target.id for node in tree.body
+             if isinstance(node, ast.AnnAssign) and node.target.id != '__all__']
+    assert typed == config.__all__
+    assert set(config.__all__) <= set(dir(config))
+
+
+def test_every_setting_resolves():
+    for name in config.__all__:
+        getattr(config, name)
@@ -0,0 +1,37 @@
+import pytest
+from fastapi import HTTPException
+
+import encoders
+
+
+@pytest.mark.parametrize('accept, expected', [
+    (None, 'png'),
+    ('*/*', 'png'),
+    ('application/json', 'png'),
+    ('text/html, application/xhtml+xml', 'png'),
+    ('image/gif, */*;q=0.1', 'png'),
+    ('image/webp', 'webp'),
+    ('image/gif, image/bmp;q=0.5', 'bmp'),
+    ('application/x-1bpp-lsb', 'raw-lsb'),
+    ('application/octet-stream', 'raw-msb'),
+])
+def test_negotiate(accept, expected):
+    assert encoders.negotiate(accept).name == expected
+
+
+@pytest.mark.parametrize('accept', ['image/gif', 'image/jpeg, application/json'])
+def test_negotiate_only_unsupported_image_types(accept):
+    assert encoders.negotiate(accept) is None
+
+
+def test_select_encoder_status_codes():
+    import app
+
+    assert app._select_encoder(None, 'application/json').name == 'png'
+    assert app._select_encoder('webp', 'application/json').name == 'webp'
+    with pytest.raises(HTTPException) as unknown_format:
+        app._select_encoder('gif', None)
+    assert unknown_format.value.status_code == 400
+    with pytest.raises(HTTPException) as unsupported:
+        app._select_encoder(None, 'image/gif')
+    assert unsupported.value.status_code == 406
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import config
+import event_store
+from event_store import EventStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = EventStore(str(tmp_path / 'events.sqlite3'))
+    monkeypatch.setattr(event_store, '_store', store)
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def failing_client(monkeypatch):
+    """get_client that fails like an unreachable server, counting the attempts"""
+    calls = []
+
+    def get_client(source):
+        calls.append(source)
+        raise ConnectionError('server unreachable')
+
+    monkeypatch.setattr(event_store, 'get_client', get_client)
+    return calls
+
+
+def window():
+    now = datetime.now()
+    return ((now - timedelta(hours=2)).strftime('%Y-%m-%d %H:%M:%S'),
+            (now + timedelta(days=2)).strftime('%Y-%m-%d %H:%M:%S'))
+
+
+def test_failed_first_sync_is_not_retried_on_every_read(store, failing_client):
+    start, end = window()
+    assert list(event_store.query_events(['icloud'], start, end)) == []
+    assert list(event_store.query_events(['icloud'], start, end)) == []
+    assert failing_client == ['icloud']
+    assert store.sync_state('icloud')['error'] == 'server unreachable'
+
+
+def test_unconfigured_source_is_not_synced_on_every_read(store, monkeypatch):
+    calls = []
+    monkeypatch.setattr(event_store, 'get_client', lambda source: calls.append(source))
+    start, end = window()
+    event_store.query_events(['feishu'], start, end)
+    event_store.query_events(['feishu'], start, end)
+    assert calls == ['feishu']
+
+
+def test_failed_sync_serves_stored_events(store, failing_client, monkeypatch):
+    now = int(datetime.now().timestamp())
+    event = {'UID': 'a', 'SUMMARY': 'stored', 'DTSTART': now + 3600, 'DTEND': now + 7200}
+    store.replace_window('icloud', [event], now - 86400, now + 7 * 86400)
+    monkeypatch.setattr(config, 'EVENT_STORE_MAX_AGE', -1)
+
+    start, end = window()
+    assert [e['SUMMARY'] for e in event_store.query_events(['icloud'], start, end)] == ['stored']
+    assert [e['SUMMARY'] for e in event_store.query_events(['icloud'], start, end)] == ['stored']
+    assert failing_client == ['icloud']
+
+
+def test_retry_after_the_backoff(store, failing_client, monkeypatch):
+    monkeypatch.setattr(config, 'EVENT_SYNC_RETRY_AFTER', -1)
+    start, end = window()
+    event_store.query_events(['icloud'], start, end)
+    event_store.query_events(['icloud'], start, end)
+    assert failing_client == ['icloud', 'icloud']
@@ -0,0 +1,12 @@
+import pytest
+
+from check_import_time import ENTRY_POINTS, measure
+
+
+# Only what gets loaded is asserted; timings vary with the machine, their budgets
+# are checked by scripts/check_import_time.py (with --scale on slower hosts)
+@pytest.mark.parametrize('module', sorted(ENTRY_POINTS))
+def test_entry_point_does_not_load_heavy_modules(module):
+    _, forbidden = ENTRY_POINTS[module]
+    _, loaded = measure(module, forbidden)
+    assert not loaded, f'{module} loads {loaded} at import time'
@@ -0,0 +1,37 @@
+import asyncio
+import threading
+
+import pytest
+
+from render_executor import BoundedExecutor, ExecutorFull
+
+
+def test_cancelled_queued_job_gives_its_slot_back():
+    async def scenario():
+        executor = BoundedExecutor(1, 1)
+        release = threading.Event()
+        running = asyncio.ensure_future(executor.run(release.wait, 5))
+        await asyncio.sleep(0.05)
+        queued = asyncio.ensure_future(executor.run(lambda: 'never'))
+        await asyncio.sleep(0.05)
+        with pytest.raises(ExecutorFull):
+            await executor.run(lambda: 'rejected')
+
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        await asyncio.sleep(0.05)
+        stats = executor.get_stats()
+        assert stats['queued'] == 0 and stats['running'] == 1 and stats['cancelled'] == 1
+
+        # The freed slot admits a new queued job while the first one still runs
+        waiting = asyncio.ensure_future(executor.run(lambda: 'ok'))
+        await asyncio.sleep(0.05)
+        release.set()
+        assert (await running)[0] is True
+        assert (await waiting)[0] == 'ok'
+        stats = executor.get_stats()
+        assert stats['queued'] == 0 and stats['running'] == 0 and stats['completed'] == 2
+        executor.shutdown()
+
+    asyncio.run(scenario())